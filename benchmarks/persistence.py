@@ -0,0 +1,290 @@
+"""Benchmark für Speicher- und Verlaufswege bei wachsender Verlaufsgröße.
+
+Für jede Größe (Standard: 10.000, 100.000 und 1.000.000 Transaktionen) und jedes Format wird ein
+synthetischer Verlauf in einem temporären Verzeichnis erzeugt:
+
+- xml:    deposit_history.xml / withdraw_history.xml älterer Versionen (wird beim Öffnen übernommen)
+- file:   history.jsonl (Journal mit Index-Dateien)
+- sqlite: spardose.db (beim Öffnen aus dem Journal übernommen)
+
+Jeder Fall läuft in einem eigenen Prozess, damit der Speicherbedarf (Spitzenwert des Prozesses)
+vergleichbar bleibt. Gemessen werden erstes Öffnen (samt Übernahme, Index und Statistik) und
+erneutes Öffnen, Kontostand laden,
+Buchungen (Latenz je Buchung und Durchsatz, einzeln gesperrt und gesammelt), die letzten
+Einträge je Typ wie in der History-Anzeige der GUI, eine Seite im Gesamtverlauf, ein
+Monatsbericht sowie die Startzeit von CLI-Aufrufen. Alle Wege kommen ohne GUI aus.
+
+Aufruf:
+    python benchmarks/persistence.py [--sizes 10000,100000] [--formats xml,file,sqlite]
+                                     [--output ergebnisse.json] [--compare alt.json]
+
+Die Ergebnisse werden als JSON geschrieben (Standard: benchmarks/results.json, von git ignoriert). Mit --compare
+wird jeder Messwert dem einer früheren Ergebnisdatei gegenübergestellt.
+"""
+
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows: kein Spitzenwert des Speicherbedarfs
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+FORMATS = ("xml", "file", "sqlite")
+# Anzahl der gemessenen Buchungen bzw. Abfragen je Fall
+OPERATIONS = 500
+CLI_RUNS = 10
+
+
+def synthetic_history(size, seed=1):
+    """Liefert size Einträge mit fortlaufendem Zeitstempel und passendem Kontostand.
+
+    Gerechnet wird wie in der App in ganzen Cent (formatiert mit main.format_cents), damit der
+    Kontostand auch über 1.000.000 Einträge exakt bleibt. Läuft nur im aufrufenden Prozess; die
+    Fälle importieren main.py später aus ihrer eigenen Programmkopie.
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from main import format_cents
+    rng = random.Random(seed)
+    timestamp = datetime(2020, 1, 1)
+    balance = 0
+    for _ in range(size):
+        timestamp += timedelta(seconds=rng.randint(60, 3600))
+        amount = rng.randint(100, 10000)
+        kind = "deposit" if balance < amount or rng.random() < 0.6 else "withdraw"
+        balance = balance + amount if kind == "deposit" else balance - amount
+        yield {
+            "type": kind,
+            "amount": format_cents(amount),
+            "new_balance": format_cents(balance),
+            "timestamp": timestamp.isoformat()
+        }
+
+
+def write_xml(directory, size):
+    """Schreibt den Verlauf im XML-Format älterer Versionen (eine Datei je Typ)."""
+    files = {
+        "deposit": open(os.path.join(directory, "deposit_history.xml"), "w", encoding="utf-8"),
+        "withdraw": open(os.path.join(directory, "withdraw_history.xml"), "w", encoding="utf-8"),
+    }
+    try:
+        for f in files.values():
+            f.write("<History>\n")
+        for record in synthetic_history(size):
+            files[record["type"]].write(
+                f'  <Transaction amount="{record["amount"]}" new_balance="{record["new_balance"]}" '
+                f'timestamp="{record["timestamp"]}" />\n'
+            )
+        for f in files.values():
+            f.write("</History>\n")
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def write_journal(directory, size):
+    """Schreibt den Verlauf als history.jsonl (Index und Snapshot entstehen beim Öffnen)."""
+    with open(os.path.join(directory, "history.jsonl"), "w", encoding="utf-8") as f:
+        for record in synthetic_history(size):
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def prepare(directory, fmt, size):
+    """Legt Programmkopie und synthetischen Verlauf an; gibt die Dauer in Sekunden zurück."""
+    for name in ("main.py", "cli.py"):
+        shutil.copy(os.path.join(ROOT, name), directory)
+    with open(os.path.join(directory, "settings.json"), "w") as f:
+        json.dump({"storage": "sqlite" if fmt == "sqlite" else "file"}, f)
+    start = time.perf_counter()
+    if fmt == "xml":
+        write_xml(directory, size)
+    else:
+        write_journal(directory, size)
+    return time.perf_counter() - start
+
+
+def timed(func, runs):
+    """Führt func runs-mal aus; gibt die Einzelzeiten in Millisekunden zurück."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def summarize(times):
+    ordered = sorted(times)
+    return {
+        "p50_ms": round(statistics.median(ordered), 4),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 4),
+        "ops_per_s": round(len(ordered) / (sum(ordered) / 1000), 1) if sum(ordered) else None,
+    }
+
+
+def run_case(directory):
+    """Misst einen Fall im Programmverzeichnis directory (läuft im Kindprozess)."""
+    sys.path.insert(0, directory)
+    sys.argv = [os.path.join(directory, "main.py")]
+    import main
+
+    result = {}
+    start = time.perf_counter()
+    manager = main.open_accounts()
+    storage = manager.get(main.DEFAULT_ACCOUNT)
+    result["open_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    result["transactions"] = storage.count()
+
+    def cold_load():
+        backend = main.STORAGE_BACKENDS[manager.backend](directory)
+        backend.load_balance()
+        backend.close()
+
+    # Kontostand wie beim Programmstart: erst ohne Snapshot (ganzer Verlauf), dann mit Snapshot
+    result["load_balance_full_ms"] = round(timed(cold_load, 1)[0], 2)
+    storage.checkpoint()
+    result["load_balance"] = summarize(timed(cold_load, 20))
+
+    # Einzeln gesperrte Buchungen, wie GUI und --cli sie ausführen
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT)
+    result["deposit_per_op"] = summarize(timed(lambda: ledger.deposit("1.00"), OPERATIONS))
+    ledger.close()
+
+    # Gesammelte Buchungen mit gehaltener Sperre, wie --pipe, Import und Dienst
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT, hold_lock=True)
+    start = time.perf_counter()
+    for _ in range(OPERATIONS * 10):
+        ledger.deposit("1.00")
+    ledger.flush()
+    elapsed = time.perf_counter() - start
+    result["deposit_batched"] = {"ops_per_s": round(OPERATIONS * 10 / elapsed, 1)}
+
+    # update_history der GUI: die letzten 5 Einträge je Typ
+    result["update_history"] = summarize(timed(
+        lambda: (ledger.history(5, "deposit"), ledger.history(5, "withdraw")), OPERATIONS
+    ))
+    total = storage.count()
+    result["history_page"] = summarize(timed(lambda: storage.page(total // 2, 100), 100))
+    result["report_month"] = summarize(timed(lambda: storage.statistics.report("month"), 20))
+    ledger.close()
+    manager.close()
+
+    # Erneutes Öffnen mit vorhandenem Index, Snapshot und Statistik, wie bei jedem weiteren Start
+    start = time.perf_counter()
+    manager = main.AccountManager(manager.backend, manager.durability)
+    manager.get(main.DEFAULT_ACCOUNT).load_balance()
+    result["reopen_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    manager.close()
+
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    return result
+
+
+def measure_cli(directory):
+    """Misst die Startzeit von CLI-Aufrufen als eigene Prozesse."""
+    result = {}
+    for name, args in (("cli_balance", ["cli.py", "--balance"]), ("cli_deposit", ["cli.py", "--cli", "deposit", "1"])):
+        result[name] = summarize(timed(
+            lambda: subprocess.run([sys.executable] + args, cwd=directory, check=True,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+            CLI_RUNS
+        ))
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(result, prefix=""):
+    """Gibt alle Messwerte eines Falls als (Name, Wert) zurück, z.B. ("deposit_per_op.p50_ms", 0.12)."""
+    for key, value in result.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and value is not None:
+            yield f"{prefix}{key}", value
+
+
+def compare(previous_path, results):
+    """Stellt die Messwerte denen einer früheren Ergebnisdatei gegenüber (Verhältnis neu/alt)."""
+    with open(previous_path) as f:
+        previous = {(c["format"], c["size"]): c for c in json.load(f)["cases"]}
+    print(f"\nVergleich mit {previous_path}:")
+    for case in results["cases"]:
+        old = previous.get((case["format"], case["size"]))
+        if old is None:
+            continue
+        old_values = dict(flatten(old))
+        for name, value in flatten(case):
+            if name in ("size", "transactions") or not old_values.get(name):
+                continue
+            print(f"  {case['format']:<7} {case['size']:>9} {name:<28} {old_values[name]:>12} -> {value:<12} "
+                  f"({value / old_values[name]:.2f}x)")
+
+
+def main():
+    if "--case" in sys.argv:
+        print(json.dumps(run_case(sys.argv[sys.argv.index("--case") + 1])))
+        return
+
+    def option(name, default):
+        return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+    sizes = [int(s) for s in option("--sizes", ",".join(map(str, DEFAULT_SIZES))).split(",")]
+    formats = option("--formats", ",".join(FORMATS)).split(",")
+    output = option("--output", os.path.join(ROOT, "benchmarks", "results.json"))
+
+    results = {
+        "revision": git_revision(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": [],
+    }
+    for size in sizes:
+        for fmt in formats:
+            directory = tempfile.mkdtemp(prefix="spardose-bench-")
+            try:
+                generate_s = prepare(directory, fmt, size)
+                child = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", directory],
+                                       check=True, capture_output=True, text=True)
+                case = {"format": fmt, "size": size, "generate_s": round(generate_s, 2)}
+                case.update(json.loads(child.stdout.splitlines()[-1]))
+                case.update(measure_cli(directory))
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            results["cases"].append(case)
+            print(
+                f"{fmt:<7} {size:>9}  open {case['open_ms']:>9.1f}ms  reopen {case['reopen_ms']:>7.1f}ms  "
+                f"deposit p50 {case['deposit_per_op']['p50_ms']:.3f}ms  "
+                f"batched {case['deposit_batched']['ops_per_s']:>9.0f}/s  "
+                f"history p50 {case['update_history']['p50_ms']:.3f}ms  "
+                f"cli {case['cli_deposit']['p50_ms']:.1f}ms  rss {(case['peak_rss_kb'] or 0) / 1024:.0f}MB",
+                flush=True
+            )
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Ergebnisse: {output}")
+    if "--compare" in sys.argv:
+        compare(option("--compare", None), results)
+
+
+if __name__ == "__main__":
+    main()
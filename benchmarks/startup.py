@@ -0,0 +1,84 @@
+"""Misst die Startzeit der Kommandozeilen-Aufrufe von main.py.
+
+Jeder Befehl wird mehrfach als eigener Prozess gestartet (wie aus cron oder einem Shell-Skript)
+und die Laufzeit von Start bis Ende gemessen. Zum Vergleich läuft ein leerer Python-Aufruf mit.
+Gemessen wird in einer Kopie von main.py und cli.py in einem temporären Verzeichnis, die eigenen Daten
+bleiben unberührt. Zusätzlich wird geprüft, dass die CLI-Wege kein tkinter laden.
+
+Aufruf: python benchmarks/startup.py [--runs N] [--json]
+"""
+
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = [
+    ("python (leer)", ["-c", "pass"]),
+    ("--balance", ["main.py", "--balance"]),
+    ("--cli balance", ["main.py", "--cli", "balance"]),
+    ("--cli deposit 1", ["main.py", "--cli", "deposit", "1"]),
+    ("--accounts", ["main.py", "--accounts"]),
+    ("cli.py --balance", ["cli.py", "--balance"]),
+    ("cli.py --cli balance", ["cli.py", "--cli", "balance"]),
+]
+
+# Module, die ein CLI-Aufruf nicht laden darf
+GUI_MODULES = ("tkinter", "_tkinter")
+
+
+def run(directory, args):
+    """Startet einen Aufruf und gibt die Dauer in Millisekunden zurück."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=directory, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def imported_modules(directory, args):
+    """Gibt die Namen aller Module zurück, die ein Aufruf importiert (über -X importtime)."""
+    result = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=directory, check=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return {line.rsplit("|", 1)[-1].strip() for line in result.stderr.splitlines() if "|" in line}
+
+
+def main():
+    runs = int(sys.argv[sys.argv.index("--runs") + 1]) if "--runs" in sys.argv else 20
+    directory = tempfile.mkdtemp(prefix="spardose-bench-")
+    try:
+        for name in ("main.py", "cli.py"):
+            shutil.copy(os.path.join(ROOT, name), directory)
+        # Ein paar Buchungen, damit Journal und Snapshot existieren
+        for _ in range(10):
+            run(directory, ["main.py", "--cli", "deposit", "5"])
+        results = []
+        for name, args in COMMANDS:
+            times = [run(directory, args) for _ in range(runs)]
+            modules = imported_modules(directory, args) if args[0].endswith(".py") else set()
+            results.append({
+                "command": name,
+                "runs": runs,
+                "median_ms": round(statistics.median(times), 2),
+                "min_ms": round(min(times), 2),
+                "gui_modules": sorted(modules.intersection(GUI_MODULES)),
+            })
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if "--json" in sys.argv:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'Befehl':<20} {'Median':>10} {'Minimum':>10}  GUI-Module")
+    for row in results:
+        print(f"{row['command']:<20} {row['median_ms']:>8.1f}ms {row['min_ms']:>8.1f}ms  "
+              f"{', '.join(row['gui_modules']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+"""Schneller Einstieg für Skripte und cron, z.B. python cli.py --balance oder python cli.py --cli deposit 5.
+
+Nimmt dieselben Optionen wie main.py. main.py wird dabei als Modul geladen und kommt so aus dem
+Bytecode-Cache, statt bei jedem Aufruf neu übersetzt zu werden.
+"""
+
+import main
+
+if __name__ == "__main__":
+    main.main()
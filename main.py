@@ -1,10 +1,29 @@
 import os
 import sys
+import atexit
+import bisect
+import functools
 import json
-import tkinter as tk
-from tkinter import messagebox, simpledialog, Menu
-import xml.etree.ElementTree as ET
-from datetime import datetime
+import operator
+import queue
+import struct
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from itertools import accumulate, compress, islice
+from datetime import date, datetime, timedelta
+
+# tkinter wird erst mit der GUI geladen (load_tkinter), damit CLI-Aufrufe ohne GUI-Module starten.
+# Ebenso werden asyncio, socket, csv, sqlite3 und die XML-Module erst bei Bedarf importiert.
+tk = messagebox = simpledialog = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 # Basisverzeichnis (gleicher Ordner wie das Skript)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -12,98 +31,3055 @@ BALANCE_FILE = os.path.join(BASE_DIR, "spardose.txt")
 SETTINGS_FILE = os.path.join(BASE_DIR, "settings.json")
 DEPOSIT_HISTORY_FILE = os.path.join(BASE_DIR, "deposit_history.xml")
 WITHDRAW_HISTORY_FILE = os.path.join(BASE_DIR, "withdraw_history.xml")
+# Index-Einträge: Byte-Offset (8 Byte) einer Transaktion im Verlaufsprotokoll
+INDEX_ENTRY = struct.Struct("<Q")
+# Haltbarkeitsmodi (Einstellung "durability" bzw. --durability)
+DURABILITY_MODES = ("fsync", "group", "none")
 
 # Standard-Einstellungen für die Anwendung
 DEFAULT_SETTINGS = {
     "language": "de",
     "currency": "€",
     "theme": "light",         # Optionen: "light" oder "dark"
-    "window_mode": "normal"     # Optionen: "normal", "fullscreen", "maximized", "minimized"
+    "window_mode": "normal",    # Optionen: "normal", "fullscreen", "maximized", "minimized"
+    "storage": "file",          # Optionen: "file" (JSONL-Journal) oder "sqlite"
+    "account": "default",       # Zuletzt gewähltes Konto
+    "durability": "group",      # Optionen: "fsync" (jede Transaktion), "group" (gesammelt), "none"
+    "group_commit_ms": 50,      # Abstand der gesammelten fsync-Aufrufe im Modus "group"
+    "rotation": "monthly",      # Optionen: "monthly" (abgeschlossene Monate archivieren) oder "off"
+    "metrics": False,           # Messung der I/O-Pfade (metrics.json), auch mit --metrics
+    "metrics_format": "json",   # Optionen: "json" oder "prometheus" (zusätzlich metrics.prom)
+    "metrics_interval": 60      # Abstand in Sekunden, in dem die Messwerte geschrieben werden
 }
 
+# --- Metrics ---
+
+# Obergrenzen der Latenz-Buckets in Millisekunden (der letzte Bucket nimmt alles darüber auf)
+METRICS_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+METRICS_FILE = os.path.join(BASE_DIR, "metrics.json")
+
+
+class Metrics:
+    """Aufrufzähler, Latenz-Histogramme und gelesene/geschriebene Bytes je I/O-Pfad.
+
+    Nur aktiv, wenn eingeschaltet (Einstellung "metrics" oder --metrics); sonst kostet ein
+    instrumentierter Aufruf eine einzige Abfrage von enabled. Eingeschaltet werden die Werte
+    alle interval Sekunden und beim Beenden in metrics.json aufaddiert (über alle Prozesse
+    hinweg, unter einer Dateisperre) und auf Wunsch zusätzlich als Prometheus-Textdatei
+    geschrieben.
+    """
+
+    def __init__(self, path=METRICS_FILE):
+        self.enabled = False
+        self.path = path
+        self.prometheus = False
+        self.interval = 60.0
+        self.data = {}
+        self.dump_timer = None
+        self.lock = threading.Lock()
+
+    def _entry(self, name):
+        entry = self.data.get(name)
+        if entry is None:
+            entry = self.data[name] = {
+                "count": 0, "sum_ms": 0.0, "buckets": [0] * (len(METRICS_BUCKETS_MS) + 1),
+                "bytes_read": 0, "bytes_written": 0
+            }
+        return entry
+
+    def observe(self, name, elapsed_ms):
+        """Zählt einen Aufruf mit seiner Dauer."""
+        with self.lock:
+            entry = self._entry(name)
+            entry["count"] += 1
+            entry["sum_ms"] += elapsed_ms
+            entry["buckets"][bisect.bisect_left(METRICS_BUCKETS_MS, elapsed_ms)] += 1
+
+    def add_bytes(self, name, read=0, written=0):
+        """Zählt gelesene bzw. geschriebene Bytes eines Pfads."""
+        if not self.enabled:
+            return
+        with self.lock:
+            entry = self._entry(name)
+            entry["bytes_read"] += read
+            entry["bytes_written"] += written
+
+    def timer(self, name):
+        """Kontextmanager, der die Dauer des Blocks unter name misst."""
+        return MetricsTimer(self, name) if self.enabled else NULL_TIMER
+
+    def enable(self, prometheus=False, interval=60.0):
+        """Schaltet die Messung ein und startet das regelmäßige Schreiben."""
+        with self.lock:
+            if self.enabled:
+                return
+            self.enabled = True
+            self.prometheus = prometheus
+            self.interval = interval
+        atexit.register(self.dump)
+        self._schedule()
+
+    def _schedule(self):
+        if self.interval > 0:
+            self.dump_timer = threading.Timer(self.interval, self._periodic_dump)
+            self.dump_timer.daemon = True
+            self.dump_timer.start()
+
+    def _periodic_dump(self):
+        try:
+            self.dump()
+        finally:
+            self._schedule()
+
+    def dump(self):
+        """Addiert die seit dem letzten Aufruf gesammelten Werte in die Metrik-Datei."""
+        with self.lock:
+            delta, self.data = self.data, {}
+        if not delta:
+            return
+        with FileLock(self.path + ".lock"):
+            totals = read_metrics(self.path)
+            for name, entry in delta.items():
+                total = totals.setdefault(name, entry)
+                if total is entry:
+                    continue
+                for key in ("count", "sum_ms", "bytes_read", "bytes_written"):
+                    total[key] = total.get(key, 0) + entry[key]
+                total["buckets"] = [a + b for a, b in zip(total.get("buckets", [0] * len(entry["buckets"])), entry["buckets"])]
+            tmp_file = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(totals, f, indent=1)
+            os.replace(tmp_file, self.path)
+            if self.prometheus:
+                prometheus_file = os.path.splitext(self.path)[0] + ".prom"
+                with open(tmp_file, "w") as f:
+                    f.write(format_prometheus(totals))
+                os.replace(tmp_file, prometheus_file)
+
+
+class MetricsTimer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class NullTimer:
+    """Ersatz für MetricsTimer bei ausgeschalteter Messung."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+metrics = Metrics()
+
+def instrumented(name):
+    """Dekorator: misst jeden Aufruf der Funktion unter name, sofern die Messung eingeschaltet ist."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe(name, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorate
+
+def read_metrics(path=METRICS_FILE):
+    """Liest die aufsummierten Messwerte; ohne Datei ein leeres Dictionary."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def format_prometheus(totals):
+    """Gibt die Messwerte im Textformat von Prometheus zurück (Dauer in Sekunden)."""
+    lines = [
+        "# HELP spardose_io_duration_seconds Dauer der I/O-Pfade.",
+        "# TYPE spardose_io_duration_seconds histogram"
+    ]
+    for name, entry in sorted(totals.items()):
+        cumulative = 0
+        for bound, count in zip(METRICS_BUCKETS_MS + (None,), entry["buckets"]):
+            cumulative += count
+            le = "+Inf" if bound is None else repr(bound / 1000)
+            lines.append(f'spardose_io_duration_seconds_bucket{{path="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'spardose_io_duration_seconds_sum{{path="{name}"}} {entry["sum_ms"] / 1000}')
+        lines.append(f'spardose_io_duration_seconds_count{{path="{name}"}} {entry["count"]}')
+    for kind in ("read", "written"):
+        lines.append(f"# TYPE spardose_io_bytes_{kind}_total counter")
+        for name, entry in sorted(totals.items()):
+            lines.append(f'spardose_io_bytes_{kind}_total{{path="{name}"}} {entry[f"bytes_{kind}"]}')
+    return "\n".join(lines) + "\n"
+
 def load_balance():
-    """Lädt den Kontostand aus der Datei.
-    
-    Gibt 0.0 zurück, falls die Datei nicht existiert oder ein Fehler auftritt.
+    """Lädt den Kontostand aus der aktiven Datenablage."""
+    return open_storage().load_balance()
+
+class SettingsStore:
+    """Hält die Einstellungen im Speicher und schreibt Änderungen gesammelt zurück.
+
+    Die Datei wird beim ersten Zugriff gelesen. Danach genügt ein os.stat (Änderungszeit und
+    Größe), um Änderungen von außen zu erkennen. Schreibzugriffe werden um flush_delay Sekunden
+    verzögert und zusammengefasst; geschrieben wird atomar über eine temporäre Datei.
+    """
+
+    def __init__(self, path, flush_delay=0.5):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.values = None
+        self.signature = None
+        self.dirty = False
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        """Lädt die Datei neu, falls sie noch nicht gelesen oder von außen geändert wurde."""
+        if self.dirty:
+            return
+        signature = self._stat_signature()
+        if self.values is not None and signature == self.signature:
+            return
+        values = DEFAULT_SETTINGS.copy()
+        if signature is not None:
+            try:
+                with metrics.timer("load_settings"), open(self.path, "r") as f:
+                    values.update(json.load(f))
+                metrics.add_bytes("load_settings", read=signature[1])
+            except Exception:
+                values = DEFAULT_SETTINGS.copy()
+        self.values = values
+        self.signature = signature
+
+    def get(self, key, default=None):
+        """Gibt eine Einstellung aus dem Speicher zurück."""
+        with self.lock:
+            self._refresh()
+            return self.values.get(key, default)
+
+    def snapshot(self):
+        """Gibt eine Kopie aller Einstellungen zurück."""
+        with self.lock:
+            self._refresh()
+            return dict(self.values)
+
+    def set(self, key, value):
+        """Ändert eine Einstellung und plant das Zurückschreiben ein."""
+        self.update({key: value})
+
+    def update(self, values):
+        """Übernimmt mehrere Einstellungen und plant das Zurückschreiben ein."""
+        with self.lock:
+            self._refresh()
+            self.values.update(values)
+            self.dirty = True
+            if self.timer is None:
+                self.timer = threading.Timer(self.flush_delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """Schreibt ausstehende Änderungen sofort (atomar) in die Datei."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+            with metrics.timer("save_settings"):
+                tmp_file = self.path + ".tmp"
+                with open(tmp_file, "w") as f:
+                    json.dump(self.values, f)
+                    written = f.tell()
+                os.replace(tmp_file, self.path)
+            metrics.add_bytes("save_settings", written=written)
+            self.signature = self._stat_signature()
+            self.dirty = False
+
+settings_store = SettingsStore(SETTINGS_FILE)
+atexit.register(settings_store.flush)
+
+def load_settings():
+    """Gibt die Anwendungseinstellungen zurück (aus dem Speicher, fehlende Werte mit Standardwerten ergänzt)."""
+    return settings_store.snapshot()
+
+def save_settings(settings):
+    """Übernimmt die Einstellungen; geschrieben wird verzögert und gesammelt über den SettingsStore."""
+    settings_store.update(settings)
+
+# --- Geldbeträge ---
+# Beträge und Kontostände werden als ganze Cent (int) gerechnet, damit sich über lange Verläufe
+# keine Rundungsfehler aufsummieren. In Dateien stehen sie weiterhin als Text mit zwei
+# Nachkommastellen ("12.34").
+
+# Größter zulässiger Betrag bzw. Kontostand in Cent (1 Billion); hält auch Jahressummen vieler
+# Buchungen weit unter der Grenze von SQLite INTEGER und array("q")
+MAX_CENTS = 10 ** 14
+
+def to_cents(value):
+    """Wandelt einen Betrag ("12.34", "12,5", 12.34 oder Decimal) exakt in ganze Cent um.
+
+    Mehr als zwei Nachkommastellen werden kaufmännisch gerundet; ValueError bei ungültigen Werten
+    und Beträgen über MAX_CENTS.
     """
-    if os.path.exists(BALANCE_FILE):
+    text = str(value).strip()
+    # Schneller Weg für gespeicherte Beträge im Format "1234.56"
+    if len(text) > 3 and text[-3] == "." and "_" not in text:
         try:
-            with open(BALANCE_FILE, "r") as f:
-                return float(f.read().strip())
+            cents = int(text[:-3] + text[-2:])
         except ValueError:
-            return 0.0
-    return 0.0
+            pass
+        else:
+            if abs(cents) > MAX_CENTS:
+                raise ValueError(f"amount {value!r} is too large")
+            return cents
+    from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+    try:
+        amount = Decimal(text.replace(",", "."))
+    except InvalidOperation:
+        raise ValueError(f"invalid amount {value!r}") from None
+    if not amount.is_finite():
+        raise ValueError(f"invalid amount {value!r}")
+    if abs(amount) > MAX_CENTS / 100:
+        raise ValueError(f"amount {value!r} is too large")
+    return int((amount * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def format_cents(cents):
+    """Gibt ganze Cent als Betragstext mit zwei Nachkommastellen zurück (z.B. 123456 -> "1234.56")."""
+    sign = "-" if cents < 0 else ""
+    cents = abs(cents)
+    return f"{sign}{cents // 100}.{cents % 100:02d}"
+
+def make_record(kind, amount, new_balance, timestamp=None):
+    """Erzeugt einen Verlaufseintrag mit Betrag, neuem Kontostand (beides in Cent) und Zeitstempel (ISO-Format)."""
+    return {
+        "type": kind,
+        "amount": format_cents(amount),
+        "new_balance": format_cents(new_balance),
+        "timestamp": timestamp or datetime.now().isoformat()
+    }
+
+# --- Hash-Kette ---
+# Jeder gespeicherte Eintrag trägt in "hash" einen Kettenwert über seine Felder und den Kettenwert
+# des Vorgängers. Nach einem Eintrag ohne Kettenwert (ältere Versionen) beginnt die Kette neu.
+CHAIN_GENESIS = "0" * 32
+
+def chain_hash(previous, record):
+    """Gibt den Kettenwert eines Eintrags zurück (BLAKE2b, 16 Byte, hexadezimal).
+
+    Beträge gehen in der Form mit zwei Nachkommastellen ein, damit jede Ablage denselben Wert erhält.
+    """
+    import hashlib
+    data = "|".join((
+        previous, record["type"], format_cents(to_cents(record["amount"])),
+        format_cents(to_cents(record["new_balance"])), record["timestamp"]
+    ))
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+def chain_head(record):
+    """Gibt den Kettenwert nach einem Eintrag zurück (ohne eigenen Kettenwert: Neubeginn der Kette)."""
+    return record.get("hash") or CHAIN_GENESIS
+
+def line_before(f, offset):
+    """Gibt die vollständige Zeile zurück, die in der Binärdatei f direkt vor offset endet (sonst None)."""
+    size = 4096
+    while offset > 0:
+        start = max(0, offset - size)
+        f.seek(start)
+        data = f.read(offset - start)
+        if not data.endswith(b"\n"):
+            return None
+        begin = data.rfind(b"\n", 0, len(data) - 1)
+        if begin != -1 or start == 0:
+            return data[begin + 1:]
+        size *= 2
+    return None
+
+class Journal:
+    """Das Verlaufsprotokoll als Journal für Kontostand und Verlauf.
+
+    Jeder Eintrag enthält Betrag und neuen Kontostand; eine angehängte Zeile ist damit die
+    gemeinsame Bestätigung von Kontostandsänderung und Verlaufseintrag. Der Kontostand ergibt
+    sich aus dem letzten Snapshot plus den danach angehängten Einträgen. Ein beim Absturz
+    abgeschnittener letzter Eintrag wird beim Öffnen entfernt.
+
+    Haltbarkeit (durability): "fsync" ruft nach jedem Schreibzugriff fsync auf, "group" sammelt
+    die fsync-Aufrufe im Abstand von group_commit_ms, "none" überlässt das Schreiben dem Betriebssystem.
+    """
+
+    def __init__(self, path, snapshot_path, index_files, legacy_balance_path=None, snapshot_every=1000):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.legacy_balance_path = legacy_balance_path
+        self.index_files = index_files
+        self.snapshot_every = snapshot_every
+        self.durability = "group"
+        self.group_commit_ms = 50
+        self.file = None
+        self.balance = None
+        self.end = None
+        self.since_snapshot = 0
+        self.sync_timer = None
+        # Kontostand und Kettenwert vor dem ersten Eintrag (nach einer Rotation: Ende des Archivs)
+        self.base = lambda: 0
+        self.base_hash = lambda: CHAIN_GENESIS
+        # Kettenwert des letzten Eintrags; None = beim nächsten Anhängen aus der Datei lesen
+        self.head = None
+        # Inode der Protokolldatei, um ein Ersetzen durch eine Rotation zu erkennen
+        self.identity = None
+        self.lock = threading.RLock()
+
+    def configure(self, durability, group_commit_ms=50):
+        """Setzt den Haltbarkeitsmodus ("fsync", "group" oder "none")."""
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"unknown durability mode {durability!r}")
+        with self.lock:
+            self.durability = durability
+            self.group_commit_ms = group_commit_ms
+
+    def recover(self):
+        """Entfernt einen unvollständigen letzten Eintrag (z.B. nach einem Absturz beim Schreiben)."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                step = min(4096, position)
+                f.seek(position - step)
+                chunk = f.read(step)
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    position = position - step + newline + 1
+                    break
+                position -= step
+            if position != end:
+                f.truncate(position)
+                self.head = None
+
+    def _read_head(self):
+        """Liest den Kettenwert des letzten Eintrags aus dem Protokollende (leer: aus dem Archiv)."""
+        if not os.path.exists(self.path):
+            return self.base_hash()
+        with open(self.path, "rb") as f:
+            line = line_before(f, f.seek(0, os.SEEK_END))
+        if line is None:
+            return self.base_hash()
+        try:
+            return chain_head(json.loads(line))
+        except ValueError:
+            return CHAIN_GENESIS
+
+    def _check_replaced(self):
+        """Verwirft den bekannten Stand, wenn die Protokolldatei inzwischen ersetzt wurde (Rotation)."""
+        try:
+            identity = os.stat(self.path).st_ino
+        except OSError:
+            identity = None
+        if identity == self.identity:
+            return False
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.balance = None
+        self.end = None
+        self.head = None
+        self.since_snapshot = 0
+        self.identity = identity
+        return True
+
+    def _read_snapshot(self):
+        try:
+            with open(self.snapshot_path, "r") as f:
+                data = json.load(f)
+            return to_cents(data["balance"]), int(data["offset"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _replay(self, balance, offset):
+        """Spielt die Einträge ab offset nach; gibt (Kontostand, Anzahl Einträge) zurück."""
+        replayed = 0
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    balance = to_cents(json.loads(line)["new_balance"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                replayed += 1
+            metrics.add_bytes("load_balance", read=f.tell() - offset)
+        return balance, replayed
+
+    def load_balance(self):
+        """Liest den Snapshot und spielt die danach protokollierten Einträge nach.
+
+        Ist der Kontostand schon bekannt, werden nur Einträge nachgespielt, die ein anderer
+        Prozess seitdem angehängt hat. Muss unter der Kontosperre aufgerufen werden, da ein
+        abgeschnittener letzter Eintrag dabei entfernt wird.
+        """
+        with self.lock:
+            self._check_replaced()
+            log_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if self.balance is not None and self.end == log_size:
+                return self.balance
+            self.recover()
+            log_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            # Ein anderer Prozess hat angehängt bzw. das Protokoll wird neu gelesen
+            self.head = None
+            if self.balance is not None and self.end is not None and self.end < log_size:
+                balance, replayed = self._replay(self.balance, self.end)
+                self.balance = balance
+                self.since_snapshot += replayed
+                self.end = log_size
+                return balance
+            snapshot = self._read_snapshot()
+            if snapshot is None and self.legacy_balance_path and os.path.exists(self.legacy_balance_path):
+                # Übernahme aus spardose.txt älterer Versionen: gilt für das aktuelle Protokollende
+                try:
+                    with open(self.legacy_balance_path, "r") as f:
+                        snapshot = (to_cents(f.read()), log_size)
+                except ValueError:
+                    snapshot = None
+                if snapshot is not None:
+                    self._write_snapshot(snapshot[0], log_size)
+                    os.replace(self.legacy_balance_path, self.legacy_balance_path + ".migrated")
+            if snapshot is None or snapshot[1] > log_size:
+                snapshot = (self.base(), 0)
+            balance, offset = snapshot
+            replayed = 0
+            if offset < log_size:
+                balance, replayed = self._replay(balance, offset)
+            self.balance = balance
+            self.since_snapshot = replayed
+            self.end = log_size
+            return balance
+
+    @instrumented("save_balance")
+    def _write_snapshot(self, balance, offset):
+        # Eigene temporäre Datei pro Prozess, damit sich gleichzeitige Snapshots nicht vermischen
+        tmp_file = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"balance": format_cents(balance), "offset": offset}, f)
+            metrics.add_bytes("save_balance", written=f.tell())
+            if self.durability != "none":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_file, self.snapshot_path)
+
+    def snapshot(self, balance=None):
+        """Schreibt einen Snapshot des Kontostands für das aktuelle Protokollende."""
+        with self.lock:
+            if self._check_replaced() and balance is None:
+                return
+            if balance is None:
+                balance = self.balance
+            if balance is None:
+                return
+            self.sync()
+            # Der Kontostand gilt für das zuletzt gelesene bzw. geschriebene Protokollende, nicht
+            # für Einträge, die ein anderer Prozess inzwischen angehängt hat
+            offset = self.end
+            if offset is None:
+                offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            self._write_snapshot(balance, offset)
+            self.balance = balance
+            self.since_snapshot = 0
+
+    @instrumented("journal_append")
+    def append(self, records):
+        """Hängt mehrere Einträge mit einem einzigen Schreibzugriff an und erweitert die Index-Dateien.
+
+        Jeder Eintrag erhält dabei seinen Kettenwert ("hash").
+        """
+        if not records:
+            return
+        with self.lock:
+            self._check_replaced()
+            if self.file is None:
+                self.recover()
+                self.file = open(self.path, "ab")
+                self.identity = os.fstat(self.file.fileno()).st_ino
+            offset = self.file.seek(0, os.SEEK_END)
+            head = self.head if self.head is not None else self._read_head()
+            lines = []
+            offsets = {kind: [] for kind in self.index_files}
+            for record in records:
+                record["hash"] = head = chain_hash(head, record)
+                line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+                offsets[record["type"]].append(offset)
+                lines.append(line)
+                offset += len(line)
+            data = b"".join(lines)
+            self.file.write(data)
+            self.file.flush()
+            metrics.add_bytes("journal_append", written=len(data))
+            self.end = offset
+            if self.durability == "fsync":
+                os.fsync(self.file.fileno())
+            elif self.durability == "group" and self.sync_timer is None:
+                self.sync_timer = threading.Timer(self.group_commit_ms / 1000, self.sync)
+                self.sync_timer.daemon = True
+                self.sync_timer.start()
+            for kind, kind_offsets in offsets.items():
+                if kind_offsets:
+                    with open(self.index_files[kind], "ab") as f:
+                        f.write(b"".join(INDEX_ENTRY.pack(o) for o in kind_offsets))
+            self.balance = to_cents(records[-1]["new_balance"])
+            self.head = head
+            self.since_snapshot += len(records)
+            if self.since_snapshot >= self.snapshot_every:
+                self.snapshot()
+
+    def sync(self):
+        """Schreibt gepufferte Einträge mit fsync dauerhaft auf die Platte."""
+        with self.lock:
+            if self.sync_timer is not None:
+                self.sync_timer.cancel()
+                self.sync_timer = None
+            if self.file is not None and self.durability != "none":
+                os.fsync(self.file.fileno())
+
+    def close(self):
+        """Schreibt einen abschließenden Snapshot und schließt das Protokoll."""
+        with self.lock:
+            if self.since_snapshot:
+                self.snapshot()
+            self.sync()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+# Schlüssel archivierter Einträge in scan()/read(): (Segmentnummer << 40) | Eintragsnummer im Segment
+ARCHIVE_KEY_SHIFT = 40
+ARCHIVE_INDEX_MASK = (1 << ARCHIVE_KEY_SHIFT) - 1
+
+def matches_filter(record, min_amount=None, max_amount=None, start=None, end=None):
+    """Prüft einen Eintrag gegen Betragsbereich (in Cent) und Datumsbereich (ISO-Daten, jeweils einschließlich)."""
+    try:
+        amount = to_cents(record["amount"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    if min_amount is not None and amount < min_amount:
+        return False
+    if max_amount is not None and amount > max_amount:
+        return False
+    day = (record.get("timestamp") or "")[:10]
+    if start is not None and day < start:
+        return False
+    if end is not None and day > end:
+        return False
+    return True
+
+def iter_xml_history(path, kind):
+    """Liest eine XML-Verlaufsdatei älterer Versionen schrittweise (iterparse) bei gleichbleibendem Speicherbedarf.
+
+    Jedes Element wird nach dem Lesen sofort freigegeben. Eine beschädigte Datei wird bis zur
+    Fehlerstelle gelesen.
+    """
+    if not os.path.exists(path):
+        return
+    import xml.etree.ElementTree as ET
+    try:
+        context = ET.iterparse(path, events=("start", "end"))
+        _, root = next(context)
+        for event, element in context:
+            if event == "end" and element.tag == "Transaction":
+                yield {
+                    "type": kind,
+                    "amount": element.get("amount"),
+                    "new_balance": element.get("new_balance"),
+                    "timestamp": element.get("timestamp")
+                }
+                root.clear()
+    except (ET.ParseError, StopIteration):
+        return
+
+def record_time(record):
+    """Sortierschlüssel für die zeitliche Reihenfolge (Einträge ohne Zeitstempel zuerst)."""
+    return record.get("timestamp") or ""
+
+def merge_xml_history(xml_files):
+    """Führt die XML-Verläufe (je Typ eine Datei, {Typ: Pfad}) zu einer Zeitleiste nach Zeitstempel zusammen."""
+    import heapq
+    return heapq.merge(
+        *(iter_xml_history(path, kind) for kind, path in xml_files.items()),
+        key=record_time
+    )
+
+class StorageBackend:
+    """Schnittstelle für die Ablage von Kontostand und Transaktionsverlauf.
+
+    GUI, CLI, Skriptsteuerung und Import greifen nur über diese Methoden auf die Daten zu.
+    Einträge sind Dictionaries wie von make_record() erzeugt.
+    """
+
+    def open(self):
+        """Bereitet die Ablage vor (Migration, Reparatur, Indizes)."""
+
+    def configure(self, durability, group_commit_ms=50):
+        """Setzt den Haltbarkeitsmodus ("fsync", "group" oder "none")."""
+
+    def load_balance(self):
+        """Gibt den aktuellen Kontostand in Cent zurück."""
+        raise NotImplementedError
+
+    def append(self, records):
+        """Speichert mehrere Einträge gemeinsam."""
+        raise NotImplementedError
+
+    def tail(self, kind, n=5):
+        """Gibt die neuesten n Einträge (optional nur eines Typs) zurück, älteste zuerst."""
+        raise NotImplementedError
+
+    def iter_transactions(self, kind=None):
+        """Liefert alle Einträge (optional nur eines Typs) in Speicherreihenfolge."""
+        raise NotImplementedError
+
+    def timeline(self, start=None, end=None):
+        """Liefert die Einträge eines Zeitraums (ISO-Daten, jeweils einschließlich) in zeitlicher Reihenfolge.
+
+        Bei gleichem Zeitstempel bleibt die Buchungsreihenfolge erhalten.
+        """
+        yield from sorted(
+            (record for record in self.iter_transactions() if matches_filter(record, start=start, end=end)),
+            key=record_time
+        )
+
+    def count(self):
+        """Gibt die Anzahl der gespeicherten Transaktionen zurück."""
+        return sum(1 for _ in self.iter_transactions())
+
+    def page(self, start, n):
+        """Gibt die Einträge an den Positionen start bis start+n-1 des Verlaufs zurück (älteste zuerst)."""
+        return list(islice(self.iter_transactions(), start, start + n))
+
+    def scan(self, min_amount=None, max_amount=None, start=None, end=None, first=None, cancel=None):
+        """Liefert die Schlüssel aller Einträge, die zum Filter passen (siehe matches_filter), in Speicherreihenfolge.
+
+        Die Schlüssel werden mit read() wieder in Einträge umgewandelt. Mit first beginnt die Suche
+        bei diesem Schlüssel (einschließlich); ist das Event cancel gesetzt, endet sie vorzeitig.
+        """
+        for position, record in enumerate(islice(self.iter_transactions(), first, None), first or 0):
+            if cancel is not None and cancel.is_set():
+                return
+            if matches_filter(record, min_amount, max_amount, start, end):
+                yield position
+
+    def read(self, keys):
+        """Gibt die Einträge zu Schlüsseln aus scan() zurück."""
+        wanted = set(keys)
+        found = {position: record for position, record in enumerate(self.iter_transactions()) if position in wanted}
+        return [found[key] for key in keys if key in found]
+
+    def totals(self):
+        """Gibt Anzahl und Summe der Beträge (in Cent) je Typ zurück: {"deposit": (Anzahl, Summe), ...}."""
+        columns = LedgerColumns()
+        columns.extend(self.iter_transactions())
+        return columns.totals()
+
+    def checkpoint(self, balance=None):
+        """Hält den aktuellen Kontostand fest, damit der nächste Start schneller geht."""
+
+    def rotate(self, now=None):
+        """Verschiebt abgeschlossene Zeiträume ins Archiv; gibt die Anzahl verschobener Einträge zurück."""
+        return 0
+
+    def archive_segments(self):
+        """Gibt die Archivsegmente mit ihren Checkpoints zurück (älteste zuerst)."""
+        return []
+
+    def verify_plan(self, state=None):
+        """Teilt den Verlauf für verify_history() in Abschnitte, die ein anderer Prozess prüfen kann.
+
+        Gibt {"tasks": [(Quelle, Kettenwert davor, Kontostand davor), ...], "ends": [(Kettenwert,
+        Kontostand) am Ende jedes Abschnitts laut Ablage], "skipped": bereits geprüfte Einträge,
+        "errors": [...], "state": Prüfstand ohne Kettenwert und Kontostand am Ende} zurück, ohne
+        Aufteilung None (dann wird im eigenen Prozess über iter_transactions geprüft).
+        """
+        return None
+
+    def close(self):
+        """Schreibt ausstehende Daten und gibt die Ablage frei."""
+
+
+class FileStorage(StorageBackend):
+    """Ablage in Dateien: JSONL-Journal mit Offset-Index je Typ und Kontostands-Snapshot."""
+
+    def __init__(self, directory=BASE_DIR):
+        self.directory = directory
+        # Append-only Verlaufsprotokoll (eine JSON-Zeile pro Transaktion), ersetzt die XML-Verläufe
+        self.history_file = os.path.join(directory, "history.jsonl")
+        # Index-Dateien mit den Byte-Offsets (8 Byte je Eintrag) aller Transaktionen eines Typs im Protokoll
+        self.index_files = {
+            "deposit": os.path.join(directory, "history.deposit.idx"),
+            "withdraw": os.path.join(directory, "history.withdraw.idx")
+        }
+        # Snapshot des Kontostands samt Position im Protokoll, bis zu der er gilt
+        self.snapshot_file = os.path.join(directory, "snapshot.json")
+        # Dateien älterer Versionen, die beim ersten Start übernommen werden
+        self.balance_file = os.path.join(directory, "spardose.txt")
+        self.xml_files = {
+            "deposit": os.path.join(directory, "deposit_history.xml"),
+            "withdraw": os.path.join(directory, "withdraw_history.xml")
+        }
+        # Komprimierte Segmente abgeschlossener Monate samt Manifest (Reihenfolge, Checkpoints)
+        self.archive_dir = os.path.join(directory, "archive")
+        self.manifest_file = os.path.join(self.archive_dir, "manifest.json")
+        self.manifest = {"generation": 0, "segments": []}
+        self.manifest_signature = None
+        # Je Typ (None: alle) die zuletzt entpackten neuesten Archiveinträge: (Manifest-Signatur, n, Einträge)
+        self.archive_tail = {}
+        self.journal = Journal(self.history_file, self.snapshot_file, self.index_files, self.balance_file)
+        self.journal.base = self.archived_balance
+        self.journal.base_hash = self.archived_hash
+
+    def open(self):
+        """Übernimmt alte XML-Verläufe, schließt eine unterbrochene Rotation ab, repariert ein
+        abgeschnittenes Protokollende und gleicht die Indizes ab."""
+        self.migrate_xml_history()
+        self.finish_rotation()
+        self.journal.recover()
+        self.sync_index()
+
+    def configure(self, durability, group_commit_ms=50):
+        self.journal.configure(durability, group_commit_ms)
+
+    def load_balance(self):
+        return self.journal.load_balance()
+
+    def append(self, records):
+        self.journal.append(records)
+
+    def checkpoint(self, balance=None):
+        self.journal.snapshot(balance)
+
+    def close(self):
+        self.journal.close()
+
+    def iter_transactions(self, kind=None):
+        """Liest die Transaktionen zeilenweise, erst aus dem Archiv, dann aus dem Verlaufsprotokoll.
+
+        Unvollständige oder beschädigte Zeilen (z.B. nach einem Absturz) werden übersprungen.
+        """
+        for segment in self._manifest()["segments"]:
+            for record in self._iter_segment(segment):
+                if kind is None or record.get("type") == kind:
+                    yield record
+        yield from self._iter_active(kind)
+
+    def timeline(self, start=None, end=None):
+        """Liefert die Einträge eines Zeitraums zeitlich geordnet, bei gleichem Zeitstempel in Buchungsreihenfolge.
+
+        Archivsegmente außerhalb des Zeitraums werden gar nicht erst entpackt. Das Archiv wird
+        Monat für Monat sortiert (ein Monat kann auf mehrere Segmente verteilt sein), das aktive
+        Protokoll in zwei Durchläufen: Einträge, die älter sind als ein zuvor gebuchter (z.B.
+        rückdatierte Importe), werden im ersten gesammelt und sortiert, der geordnete Rest im
+        zweiten gestreamt. Alles zusammen wird per heapq.merge zusammengeführt.
+        """
+        import heapq
+        return heapq.merge(self._archive_timeline(start, end), self._active_timeline(start, end), key=record_time)
+
+    def _archive_timeline(self, start, end):
+        periods = {}
+        for segment in self._manifest()["segments"]:
+            if (start and segment["period"] < start[:7]) or (end and segment["period"] > end[:7]):
+                continue
+            periods.setdefault(segment["period"], []).append(segment)
+        for period in sorted(periods):
+            records = [
+                record for segment in periods[period] for record in self._iter_segment(segment)
+                if matches_filter(record, start=start, end=end)
+            ]
+            records.sort(key=record_time)
+            yield from records
+
+    def _active_timeline(self, start, end):
+        import heapq
+        late, late_positions = [], set()
+        latest = None
+        count = 0
+        for position, record in enumerate(self._iter_active()):
+            count += 1
+            timestamp = record_time(record)
+            if latest is not None and timestamp < latest:
+                late_positions.add(position)
+                if matches_filter(record, start=start, end=end):
+                    late.append(record)
+            else:
+                latest = timestamp
+        late.sort(key=record_time)
+        # Später angehängte Einträge sind im ersten Durchlauf nicht geprüft worden und bleiben außen vor
+        ordered = (
+            record for position, record in enumerate(islice(self._iter_active(), count))
+            if position not in late_positions and matches_filter(record, start=start, end=end)
+        )
+        yield from heapq.merge(ordered, late, key=record_time)
+
+    def _iter_active(self, kind=None):
+        if not os.path.exists(self.history_file):
+            return
+        with open(self.history_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if kind is None or record.get("type") == kind:
+                    yield record
+
+    def _iter_segment(self, segment):
+        """Liest ein Archivsegment per Streaming-Dekompression (ohne den Checkpoint am Ende)."""
+        import gzip
+        with gzip.open(os.path.join(self.archive_dir, segment["file"]), "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("type") != "checkpoint":
+                    yield record
+
+    def count(self):
+        """Zählt die Einträge über das Manifest und die Größe der Index-Dateien, ohne etwas zu entpacken."""
+        return self.archived_count() + sum(
+            os.path.getsize(path) // INDEX_ENTRY.size
+            for path in self.index_files.values() if os.path.exists(path)
+        )
+
+    def _merged_offsets(self, start, n):
+        """Gibt die Protokoll-Offsets der Positionen start bis start+n-1 über beide Typen hinweg zurück.
+
+        Die Index-Dateien sind aufsteigend sortiert; per binärer Suche wird bestimmt, wie viele
+        Einzahlungen unter den ersten start Einträgen liegen, danach werden nur n Einträge je
+        Index gelesen und zusammengeführt.
+        """
+        size = INDEX_ENTRY.size
+        with open(self.index_files["deposit"], "rb") as a, open(self.index_files["withdraw"], "rb") as b:
+            count_a = a.seek(0, os.SEEK_END) // size
+            count_b = b.seek(0, os.SEEK_END) // size
+
+            def entry(f, i):
+                f.seek(i * size)
+                return INDEX_ENTRY.unpack(f.read(size))[0]
+
+            low, high = max(0, start - count_b), min(start, count_a)
+            while low < high:
+                i = (low + high) // 2
+                if entry(a, i) < entry(b, start - i - 1):
+                    low = i + 1
+                else:
+                    high = i
+            i, j = low, start - low
+            a.seek(i * size)
+            offsets_a = [o for (o,) in INDEX_ENTRY.iter_unpack(a.read(min(n, count_a - i) * size))]
+            b.seek(j * size)
+            offsets_b = [o for (o,) in INDEX_ENTRY.iter_unpack(b.read(min(n, count_b - j) * size))]
+        return sorted(offsets_a + offsets_b)[:n]
+
+    def page(self, start, n):
+        """Springt über die Index-Dateien direkt an die gesuchte Position, unabhängig von der Verlaufslänge.
+
+        Positionen im Archiv werden über die Anzahl je Segment gefunden; nur das betroffene
+        Segment wird entpackt.
+        """
+        if n <= 0 or start < 0:
+            return []
+        records = []
+        position = 0
+        for segment in self._manifest()["segments"]:
+            if len(records) >= n:
+                break
+            end = position + segment["count"]
+            if start < end:
+                skip = max(0, start - position)
+                records.extend(islice(self._iter_segment(segment), skip, skip + n - len(records)))
+            position = end
+        remaining = n - len(records)
+        if remaining <= 0 or not os.path.exists(self.history_file):
+            return records
+        active_start = max(0, start - position)
+        if not all(os.path.exists(path) for path in self.index_files.values()):
+            records.extend(islice(self._iter_active(), active_start, active_start + remaining))
+        else:
+            offsets = self._merged_offsets(active_start, remaining)
+            found = self._read_active(offsets)
+            records.extend(found[offset] for offset in offsets if offset in found)
+        return records
+
+    def scan(self, min_amount=None, max_amount=None, start=None, end=None, first=None, cancel=None):
+        """Liefert die Byte-Offsets der passenden Einträge im Protokoll.
+
+        Treffer im Archiv erhalten den Schlüssel (Segmentnummer << ARCHIVE_KEY_SHIFT) | Eintragsnummer.
+        """
+        segments = self._manifest()["segments"]
+        number, index, position = 1, 0, 0
+        if first is not None:
+            if first >> ARCHIVE_KEY_SHIFT:
+                number, index = first >> ARCHIVE_KEY_SHIFT, first & ARCHIVE_INDEX_MASK
+            else:
+                number, position = len(segments) + 1, first
+        for number, segment in enumerate(segments[number - 1:], number):
+            for index, record in enumerate(islice(self._iter_segment(segment), index, None), index):
+                if cancel is not None and cancel.is_set():
+                    return
+                if matches_filter(record, min_amount, max_amount, start, end):
+                    yield (number << ARCHIVE_KEY_SHIFT) | index
+            index = 0
+        if not os.path.exists(self.history_file):
+            return
+        with open(self.history_file, "rb") as f:
+            f.seek(position)
+            for line in f:
+                if cancel is not None and cancel.is_set():
+                    return
+                offset, position = position, position + len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if matches_filter(record, min_amount, max_amount, start, end):
+                    yield offset
+
+    def read(self, keys):
+        """Liest die Einträge zu Schlüsseln aus scan() (Byte-Offsets bzw. Archiv-Schlüssel)."""
+        keys = list(keys)
+        wanted = {}
+        for key in keys:
+            if key >> ARCHIVE_KEY_SHIFT:
+                wanted.setdefault(key >> ARCHIVE_KEY_SHIFT, set()).add(key & ARCHIVE_INDEX_MASK)
+        found = self._read_active([key for key in keys if not key >> ARCHIVE_KEY_SHIFT])
+        segments = self._manifest()["segments"]
+        for number, indexes in wanted.items():
+            if number > len(segments):
+                continue
+            last = max(indexes)
+            for index, record in enumerate(self._iter_segment(segments[number - 1])):
+                if index in indexes:
+                    found[(number << ARCHIVE_KEY_SHIFT) | index] = record
+                if index >= last:
+                    break
+        return [found[key] for key in keys if key in found]
+
+    def _read_active(self, offsets):
+        """Liest die Einträge an den angegebenen Byte-Offsets; gibt {Offset: Eintrag} zurück."""
+        found = {}
+        if not offsets:
+            return found
+        read = 0
+        with open(self.history_file, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                line = f.readline()
+                read += len(line)
+                try:
+                    found[offset] = json.loads(line)
+                except ValueError:
+                    continue
+        metrics.add_bytes("read_history", read=read)
+        return found
+
+    def _read_index_tail(self, kind, n):
+        """Liefert die letzten n Offsets aus der Index-Datei des angegebenen Typs."""
+        path = self.index_files[kind]
+        if n <= 0 or not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            count = f.seek(0, os.SEEK_END) // INDEX_ENTRY.size
+            start = max(0, count - n)
+            f.seek(start * INDEX_ENTRY.size)
+            data = f.read((count - start) * INDEX_ENTRY.size)
+        return [offset for (offset,) in INDEX_ENTRY.iter_unpack(data)]
+
+    def tail(self, kind, n=5):
+        """Gibt die neuesten n Transaktionen zurück (älteste zuerst).
+
+        Über den Index wird direkt an die passenden Stellen im Protokoll gesprungen,
+        der Rest der Datei wird nicht gelesen. Mit kind=None werden Ein- und Auszahlungen
+        gemeinsam in Protokollreihenfolge betrachtet.
+        """
+        if n <= 0:
+            return []
+        kinds = self.index_files if kind is None else [kind]
+        offsets = sorted(offset for k in kinds for offset in self._read_index_tail(k, n))[-n:]
+        records = self.read(offsets)
+        if len(records) < n:
+            records = self._archive_tail(kind, n - len(records)) + records
+        return records
+
+    def _archive_tail(self, kind, n):
+        """Gibt die neuesten n archivierten Einträge (eines Typs) zurück, älteste zuerst.
+
+        Reicht der laufende Monat für tail() nicht, werden die jüngsten Segmente entpackt. Das
+        Ergebnis bleibt gespeichert, bis sich das Manifest ändert; so wird am Monatsanfang nicht
+        bei jeder Anzeige erneut dekomprimiert.
+        """
+        segments = self._manifest()["segments"]
+        if not segments:
+            return []
+        cached = self.archive_tail.get(kind)
+        # Wiederverwendbar, wenn genug Einträge entpackt wurden oder das Archiv schon erschöpft war
+        if cached is not None and cached[0] == self.manifest_signature and (cached[1] >= n or len(cached[2]) < cached[1]):
+            return cached[2][-n:]
+        records = []
+        for segment in reversed(segments):
+            if len(records) >= n:
+                break
+            older = deque(
+                (r for r in self._iter_segment(segment) if kind is None or r.get("type") == kind),
+                maxlen=n - len(records)
+            )
+            records = list(older) + records
+        self.archive_tail[kind] = (self.manifest_signature, n, records)
+        return list(records)
+
+    def sync_index(self):
+        """Bringt die Index-Dateien auf den Stand des Protokolls.
+
+        Es wird nur der Teil des Protokolls gelesen, der hinter dem zuletzt indizierten Eintrag liegt
+        (z.B. nach der Migration oder einem Absturz zwischen Protokoll- und Index-Schreibzugriff).
+        Passt der Index nicht zum Protokoll oder fehlt eine Index-Datei, wird er komplett neu aufgebaut.
+        """
+        log_size = os.path.getsize(self.history_file) if os.path.exists(self.history_file) else 0
+        complete = all(os.path.exists(path) for path in self.index_files.values())
+        last_offsets = []
+        for kind, path in self.index_files.items():
+            if not complete:
+                break
+            with open(path, "r+b") as f:
+                size = f.seek(0, os.SEEK_END)
+                if size % INDEX_ENTRY.size:
+                    size -= size % INDEX_ENTRY.size
+                    f.truncate(size)
+                if size:
+                    f.seek(size - INDEX_ENTRY.size)
+                    last_offsets.append(INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))[0])
+        position = 0
+        if last_offsets and max(last_offsets) < log_size:
+            with open(self.history_file, "rb") as f:
+                f.seek(max(last_offsets))
+                line = f.readline()
+                if line.endswith(b"\n"):
+                    position = f.tell()
+        if position == 0:
+            for path in self.index_files.values():
+                open(path, "wb").close()
+        if position >= log_size:
+            return
+        new_offsets = {kind: [] for kind in self.index_files}
+        with open(self.history_file, "rb") as f:
+            f.seek(position)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    kind = json.loads(line).get("type")
+                except ValueError:
+                    kind = None
+                if kind in new_offsets:
+                    new_offsets[kind].append(position)
+                position += len(line)
+        for kind, offsets in new_offsets.items():
+            with open(self.index_files[kind], "ab") as f:
+                f.write(b"".join(INDEX_ENTRY.pack(offset) for offset in offsets))
+
+    def _manifest(self):
+        """Gibt archive/manifest.json zurück (zwischengespeichert, neu gelesen wenn sich die Datei ändert)."""
+        try:
+            st = os.stat(self.manifest_file)
+        except OSError:
+            return {"generation": 0, "segments": []}
+        signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if signature != self.manifest_signature:
+            with open(self.manifest_file, "r") as f:
+                self.manifest = json.load(f)
+            self.manifest_signature = signature
+        return self.manifest
+
+    def _write_manifest(self, manifest):
+        tmp_file = f"{self.manifest_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.manifest_file)
+
+    def archive_segments(self):
+        return list(self._manifest()["segments"])
+
+    def archived_count(self):
+        return sum(segment["count"] for segment in self._manifest()["segments"])
+
+    def archived_balance(self):
+        """Kontostand am Ende des Archivs in Cent (laut Checkpoint des letzten Segments)."""
+        segments = self._manifest()["segments"]
+        return to_cents(segments[-1]["closing_balance"]) if segments else 0
+
+    def archived_hash(self):
+        """Kettenwert des letzten archivierten Eintrags."""
+        segments = self._manifest()["segments"]
+        return (segments[-1].get("last_hash") or CHAIN_GENESIS) if segments else CHAIN_GENESIS
+
+    def rotate(self, now=None):
+        """Verschiebt die Einträge abgeschlossener Monate vom Anfang des Protokolls in komprimierte Segmente.
+
+        Je Monat entsteht ein Segment archive/JJJJ-MM.jsonl.gz, dessen letzte Zeile ein Checkpoint
+        mit Summen, Anzahl, Kontostand und Kettenwert am Ende des Zeitraums ist (auch im Manifest). Das aktive
+        Protokoll behält nur die Einträge ab dem laufenden Monat. Muss unter der Kontosperre
+        laufen; umgeschaltet wird mit dem Schreiben des Manifests, eine unterbrochene Rotation
+        wird beim nächsten Öffnen abgeschlossen oder verworfen.
+        Gibt die Anzahl der archivierten Einträge zurück.
+        """
+        if not os.path.exists(self.history_file):
+            return 0
+        import gzip
+        import shutil
+        current = (now or datetime.now()).strftime("%Y-%m")
+        manifest = self._manifest()
+        generation = manifest["generation"] + 1
+        names = {segment["file"] for segment in manifest["segments"]}
+        segments = []
+        segment = raw = writer = None
+
+        def finish_segment():
+            # Beträge stehen wie im Protokoll als Text mit zwei Nachkommastellen
+            for key in ("deposits", "withdrawals", "closing_balance"):
+                segment[key] = format_cents(segment[key])
+            checkpoint = dict(segment, type="checkpoint")
+            del checkpoint["file"]
+            writer.write((json.dumps(checkpoint, separators=(",", ":")) + "\n").encode("utf-8"))
+            writer.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+            raw.close()
+
+        boundary = 0
+        with open(self.history_file, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    period = record["timestamp"][:7]
+                    amount = to_cents(record["amount"])
+                    closing_balance = to_cents(record["new_balance"])
+                except (ValueError, KeyError, TypeError):
+                    break
+                if len(period) < 7 or period >= current or not line.endswith(b"\n"):
+                    break
+                if segment is None or period != segment["period"]:
+                    if segment is not None:
+                        finish_segment()
+                    name, suffix = f"{period}.jsonl.gz", 1
+                    while name in names:
+                        name, suffix = f"{period}.{suffix}.jsonl.gz", suffix + 1
+                    names.add(name)
+                    segment = {
+                        "file": name, "period": period, "count": 0,
+                        "deposits": 0, "deposit_count": 0, "withdrawals": 0, "withdraw_count": 0,
+                        "closing_balance": 0, "last_hash": CHAIN_GENESIS
+                    }
+                    segments.append(segment)
+                    os.makedirs(self.archive_dir, exist_ok=True)
+                    raw = open(os.path.join(self.archive_dir, name), "wb")
+                    writer = gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0)
+                writer.write(line)
+                segment["count"] += 1
+                if record.get("type") == "deposit":
+                    segment["deposits"] += amount
+                    segment["deposit_count"] += 1
+                else:
+                    segment["withdrawals"] += amount
+                    segment["withdraw_count"] += 1
+                segment["closing_balance"] = closing_balance
+                segment["last_hash"] = chain_head(record)
+                boundary += len(line)
+            if segment is not None:
+                finish_segment()
+            if not boundary:
+                return 0
+            # Der Rest (ab dem laufenden Monat) wird die neue aktive Datei
+            rotating = f"{self.history_file}.rotation-{generation}"
+            with open(rotating, "wb") as out:
+                f.seek(boundary)
+                shutil.copyfileobj(f, out)
+                out.flush()
+                os.fsync(out.fileno())
+        self._write_manifest({"generation": generation, "segments": manifest["segments"] + segments})
+        self._complete_rotation(rotating)
+        return sum(segment["count"] for segment in segments)
+
+    def _complete_rotation(self, rotating):
+        """Ersetzt das Protokoll durch den nicht archivierten Rest; Index und Snapshot werden neu angelegt."""
+        self.journal.sync()
+        for path in (self.snapshot_file, *self.index_files.values()):
+            if os.path.exists(path):
+                os.remove(path)
+        os.replace(rotating, self.history_file)
+        self.sync_index()
+        self.journal.load_balance()
+        self.journal.snapshot()
+
+    def finish_rotation(self):
+        """Schließt eine unterbrochene Rotation ab (Manifest schon geschrieben) oder verwirft sie."""
+        manifest = self._manifest()
+        prefix = os.path.basename(self.history_file) + ".rotation-"
+        for name in os.listdir(self.directory):
+            if not name.startswith(prefix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                generation = int(name[len(prefix):])
+            except ValueError:
+                continue
+            if generation <= manifest["generation"]:
+                self._complete_rotation(path)
+            else:
+                os.remove(path)
+        # Segmente, die nicht im Manifest stehen, stammen aus einer abgebrochenen Rotation
+        if os.path.isdir(self.archive_dir):
+            known = {segment["file"] for segment in manifest["segments"]}
+            for name in os.listdir(self.archive_dir):
+                if name.endswith(".jsonl.gz") and name not in known:
+                    os.remove(os.path.join(self.archive_dir, name))
+
+    def verify_plan(self, state=None):
+        """Je Archivsegment ein Abschnitt, das Protokoll in Byte-Bereichen von VERIFY_CHUNK_BYTES.
+
+        Mit state werden unveränderte, schon geprüfte Segmente und der geprüfte Anfang des
+        Protokolls übersprungen, sofern Kettenwert und Kontostand an dessen Ende noch stimmen.
+        Zusätzlich wird der Snapshot mit dem Verlauf abgeglichen.
+        """
+        state = state if state and state.get("backend") == "file" else {}
+        verified = state.get("segments", {})
+        plan = {"tasks": [], "ends": [], "skipped": 0, "errors": [], "state": {"backend": "file", "segments": {}}}
+        head, balance = CHAIN_GENESIS, 0
+        for segment in self._manifest()["segments"]:
+            last_hash = segment.get("last_hash") or CHAIN_GENESIS
+            closing_balance = to_cents(segment["closing_balance"])
+            if verified.get(segment["file"]) == [last_hash, segment["count"]]:
+                plan["skipped"] += segment["count"]
+            else:
+                plan["tasks"].append((("segment", os.path.join(self.archive_dir, segment["file"])), head, balance))
+                plan["ends"].append((last_hash, closing_balance))
+            plan["state"]["segments"][segment["file"]] = [last_hash, segment["count"]]
+            head, balance = last_hash, closing_balance
+        if not os.path.exists(self.history_file):
+            return plan
+
+        def position_after(f, offset):
+            line = line_before(f, offset)
+            try:
+                record = json.loads(line)
+                return chain_head(record), to_cents(record["new_balance"])
+            except (TypeError, KeyError, ValueError):
+                return CHAIN_GENESIS, None
+
+        with open(self.history_file, "rb") as f:
+            identity = os.fstat(f.fileno()).st_ino
+            # Nur vollständige Zeilen prüfen; ein gerade geschriebener Eintrag kommt beim nächsten Mal dran
+            end = f.seek(0, os.SEEK_END)
+            while end > 0 and line_before(f, end) is None:
+                end -= 1
+            start = 0
+            offset = state.get("offset", 0)
+            if state.get("identity") == identity and 0 < offset <= end:
+                if position_after(f, offset) == (state["hash"], state["balance"]):
+                    start = offset
+                    head, balance = state["hash"], state["balance"]
+                    plan["skipped"] += state["active_count"]
+                else:
+                    plan["errors"].append((f"{os.path.basename(self.history_file)}@{offset}",
+                                           "history changed before the last verified position"))
+            snapshot = self.journal._read_snapshot()
+            if snapshot is not None and 0 < snapshot[1] <= end:
+                stored = position_after(f, snapshot[1])[1]
+                if stored != snapshot[0]:
+                    plan["errors"].append((os.path.basename(self.snapshot_file),
+                                           f"snapshot balance {format_cents(snapshot[0])} does not match the history"))
+            position = start
+            while position < end:
+                boundary = min(position + VERIFY_CHUNK_BYTES, end)
+                if boundary < end:
+                    f.seek(boundary)
+                    f.readline()
+                    boundary = f.tell()
+                plan["tasks"].append((("file", self.history_file, position, boundary), head, balance))
+                head, balance = position_after(f, boundary)
+                plan["ends"].append((head, balance))
+                position = boundary
+        plan["state"].update(identity=identity, offset=end)
+        return plan
+
+    def migrate_xml_history(self):
+        """Übernimmt einmalig die alten XML-Verläufe in das Verlaufsprotokoll.
+
+        Läuft nur, solange noch kein Protokoll existiert. Die XML-Dateien bleiben unverändert liegen.
+        """
+        if os.path.exists(self.history_file) or os.path.exists(self.manifest_file):
+            return 0
+        if not any(os.path.exists(path) for path in self.xml_files.values()):
+            return 0
+        count = 0
+        tmp_file = self.history_file + ".tmp"
+        head = CHAIN_GENESIS
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            for record in merge_xml_history(self.xml_files):
+                try:
+                    record["hash"] = head = chain_hash(head, record)
+                except (TypeError, ValueError):
+                    head = CHAIN_GENESIS
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                count += 1
+        if not count:
+            os.remove(tmp_file)
+            return 0
+        os.replace(tmp_file, self.history_file)
+        return count
+
+
+class SqliteStorage(StorageBackend):
+    """Ablage in einer SQLite-Datenbank (WAL-Modus, Indizes auf Zeitstempel und Typ).
+
+    Kontostand, die letzten Einträge und Summen sind Index-Abfragen statt Datei-Durchläufe.
+    Beim ersten Öffnen wird ein vorhandener Datei-Verlauf im selben Verzeichnis übernommen.
+    Beträge und Kontostände stehen als ganze Cent in der Datenbank (ab user_version 1), jede
+    Zeile trägt ihren Kettenwert (ab user_version 2).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            type TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            new_balance INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            hash TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions (timestamp);
+        CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions (type, id);
+    """
+    INSERT = "INSERT INTO transactions (type, amount, new_balance, timestamp, hash) VALUES (?, ?, ?, ?, ?)"
+    SELECT = "SELECT type, amount, new_balance, timestamp, hash FROM transactions"
+    SYNCHRONOUS = {"fsync": "FULL", "group": "NORMAL", "none": "OFF"}
+
+    def __init__(self, directory=BASE_DIR):
+        self.directory = directory
+        self.path = os.path.join(directory, "spardose.db")
+        self.connection = None
+        self.synchronous = "NORMAL"
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def _to_record(row):
+        kind, amount, new_balance, timestamp, chain = row
+        record = {
+            "type": kind,
+            "amount": format_cents(int(amount)),
+            "new_balance": format_cents(int(new_balance)),
+            "timestamp": timestamp
+        }
+        if chain:
+            record["hash"] = chain
+        return record
+
+    def _db(self):
+        """Gibt die Datenbankverbindung zurück und baut sie bei Bedarf (wieder) auf."""
+        if self.connection is None:
+            import sqlite3
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(f"PRAGMA synchronous={self.synchronous}")
+        return self.connection
+
+    def open(self):
+        with self.lock:
+            self._db().executescript(self.SCHEMA)
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            if version < 2:
+                with self.connection:
+                    if version < 1:
+                        # Datenbanken älterer Versionen speichern Beträge als Gleitkommazahl in Euro
+                        self.connection.execute(
+                            "UPDATE transactions SET amount = CAST(ROUND(amount * 100) AS INTEGER), "
+                            "new_balance = CAST(ROUND(new_balance * 100) AS INTEGER)"
+                        )
+                    columns = [row[1] for row in self.connection.execute("PRAGMA table_info(transactions)")]
+                    if "hash" not in columns:
+                        self.connection.execute("ALTER TABLE transactions ADD COLUMN hash TEXT")
+                    self.connection.execute("PRAGMA user_version = 2")
+            if self.connection.execute("SELECT 1 FROM transactions LIMIT 1").fetchone() is None:
+                legacy = FileStorage(self.directory)
+                legacy.migrate_xml_history()
+                batch = []
+                for record in legacy.iter_transactions():
+                    batch.append(record)
+                    if len(batch) >= IMPORT_BATCH_SIZE:
+                        self.append(batch)
+                        batch = []
+                self.append(batch)
+
+    def configure(self, durability, group_commit_ms=50):
+        if durability not in self.SYNCHRONOUS:
+            raise ValueError(f"unknown durability mode {durability!r}")
+        with self.lock:
+            self.synchronous = self.SYNCHRONOUS[durability]
+            self._db().execute(f"PRAGMA synchronous={self.synchronous}")
+
+    def load_balance(self):
+        with self.lock:
+            row = self._db().execute("SELECT new_balance FROM transactions ORDER BY id DESC LIMIT 1").fetchone()
+        return int(row[0]) if row else 0
+
+    def append(self, records):
+        if not records:
+            return
+        with self.lock, self._db():
+            row = self.connection.execute("SELECT hash FROM transactions ORDER BY id DESC LIMIT 1").fetchone()
+            head = (row[0] if row else None) or CHAIN_GENESIS
+            for record in records:
+                record["hash"] = head = chain_hash(head, record)
+            self.connection.executemany(self.INSERT, (
+                (r["type"], to_cents(r["amount"]), to_cents(r["new_balance"]), r["timestamp"], r["hash"])
+                for r in records
+            ))
+
+    def tail(self, kind, n=5):
+        if n <= 0:
+            return []
+        with self.lock:
+            if kind is None:
+                rows = self._db().execute(self.SELECT + " ORDER BY id DESC LIMIT ?", (n,)).fetchall()
+            else:
+                rows = self._db().execute(
+                    self.SELECT + " WHERE type = ? ORDER BY id DESC LIMIT ?", (kind, n)
+                ).fetchall()
+        return [self._to_record(row) for row in reversed(rows)]
+
+    def iter_transactions(self, kind=None):
+        with self.lock:
+            if kind is None:
+                cursor = self._db().execute(self.SELECT + " ORDER BY id")
+            else:
+                cursor = self._db().execute(self.SELECT + " WHERE type = ? ORDER BY id", (kind,))
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for row in rows:
+                yield self._to_record(row)
+
+    def timeline(self, start=None, end=None):
+        """Liest über den Index auf dem Zeitstempel, sortiert und schon auf den Zeitraum beschränkt."""
+        query, params = self.SELECT + " WHERE 1", []
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND timestamp <= ?"
+            params.append(end + "~")
+        with self.lock:
+            cursor = self._db().execute(query + " ORDER BY timestamp, id", params)
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for row in rows:
+                yield self._to_record(row)
+
+    def count(self):
+        with self.lock:
+            return self._db().execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def page(self, start, n):
+        if n <= 0 or start < 0:
+            return []
+        with self.lock:
+            rows = self._db().execute(self.SELECT + " ORDER BY id LIMIT ? OFFSET ?", (n, start)).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def scan(self, min_amount=None, max_amount=None, start=None, end=None, first=None, cancel=None):
+        """Filtert in der Datenbank und liefert die Zeilen-IDs der passenden Einträge."""
+        query, params = "SELECT id FROM transactions WHERE 1", []
+        if first is not None:
+            query += " AND id >= ?"
+            params.append(first)
+        if min_amount is not None:
+            query += " AND amount >= ?"
+            params.append(min_amount)
+        if max_amount is not None:
+            query += " AND amount <= ?"
+            params.append(max_amount)
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            # "~" sortiert hinter allen Zeichen eines ISO-Zeitstempels, erfasst also den ganzen Tag
+            query += " AND timestamp <= ?"
+            params.append(end + "~")
+        with self.lock:
+            cursor = self._db().execute(query + " ORDER BY id", params)
+        while cancel is None or not cancel.is_set():
+            with self.lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for (row_id,) in rows:
+                yield row_id
+
+    def read(self, keys):
+        keys = list(keys)
+        if not keys:
+            return []
+        with self.lock:
+            rows = self._db().execute(
+                "SELECT id, type, amount, new_balance, timestamp, hash FROM transactions WHERE id IN "
+                f"({','.join('?' * len(keys))})", keys
+            ).fetchall()
+        found = {row[0]: self._to_record(row[1:]) for row in rows}
+        return [found[key] for key in keys if key in found]
+
+    def verify_plan(self, state=None):
+        """Abschnitte aus je VERIFY_CHUNK_ROWS Zeilen; mit state nur die Zeilen nach der zuletzt geprüften."""
+        state = state if state and state.get("backend") == "sqlite" else {}
+        plan = {"tasks": [], "ends": [], "skipped": 0, "errors": [], "state": {"backend": "sqlite"}}
+        head, balance, last_id = CHAIN_GENESIS, 0, 0
+        with self.lock:
+            db = self._db()
+            if state.get("last_id"):
+                row = db.execute(
+                    "SELECT hash, new_balance FROM transactions WHERE id = ?", (state["last_id"],)
+                ).fetchone()
+                if row is not None and ((row[0] or CHAIN_GENESIS), int(row[1])) == (state["hash"], state["balance"]):
+                    head, balance, last_id = state["hash"], state["balance"], state["last_id"]
+                    plan["skipped"] = state["count"]
+                else:
+                    plan["errors"].append((f"id {state['last_id']}", "history changed before the last verified position"))
+            while True:
+                row = db.execute(
+                    "SELECT id, hash, new_balance FROM transactions WHERE id > ? ORDER BY id LIMIT 1 OFFSET ?",
+                    (last_id, VERIFY_CHUNK_ROWS - 1)
+                ).fetchone() or db.execute(
+                    "SELECT id, hash, new_balance FROM transactions WHERE id > ? ORDER BY id DESC LIMIT 1", (last_id,)
+                ).fetchone()
+                if row is None:
+                    break
+                plan["tasks"].append((("sqlite", self.path, last_id, row[0]), head, balance))
+                last_id, head, balance = row[0], row[1] or CHAIN_GENESIS, int(row[2])
+                plan["ends"].append((head, balance))
+        plan["state"]["last_id"] = last_id
+        return plan
+
+    def totals(self):
+        result = {"deposit": (0, 0), "withdraw": (0, 0)}
+        with self.lock:
+            for kind, count, total in self._db().execute(
+                "SELECT type, COUNT(*), SUM(amount) FROM transactions GROUP BY type"
+            ):
+                result[kind] = (count, int(total or 0))
+        return result
+
+    def close(self):
+        """Schließt die Verbindung; ein späterer Zugriff baut sie wieder auf."""
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+STORAGE_BACKENDS = {"file": FileStorage, "sqlite": SqliteStorage}
+
+# Länge des Zeitstempel-Präfixes (ISO-Format) je Auswertungszeitraum
+STATISTICS_LEVELS = {"day": 10, "month": 7, "year": 4}
+
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+def to_micros(moment):
+    """Gibt einen Zeitpunkt (Ortszeit wie im Eintrag) als Mikrosekunden seit 0001-01-01 zurück."""
+    return (moment.replace(tzinfo=None) - datetime.min) // ONE_MICROSECOND
+
+def opening_balance(kind, amount, new_balance):
+    """Gibt den Kontostand vor einem Eintrag zurück (Beträge in Cent)."""
+    return new_balance - amount if kind == "deposit" else new_balance + amount
+
+class LedgerColumns:
+    """Verlauf im Speicher als Spalten in typisierten Arrays statt als Liste von Dictionaries.
+
+    timestamps enthält Mikrosekunden seit 0001-01-01 (siehe to_micros), deposits 1 für
+    Einzahlungen und 0 für Auszahlungen, amounts und balances ganze Cent (Betrag und neuer
+    Kontostand). Summen, laufende Kontostände und Bereichssummen laufen als Array-Operationen
+    (sum, itertools.compress und accumulate, Präfixsummen mit bisect) statt als Python-Schleifen
+    über Einträge. Bereichsabfragen sortieren die Spalten einmalig stabil nach Zeitstempel.
+    opening ist der Kontostand vor dem ersten übernommenen Eintrag (in Buchungsreihenfolge).
+    """
+
+    def __init__(self):
+        self.timestamps = array("q")
+        self.deposits = array("b")
+        self.amounts = array("q")
+        self.balances = array("q")
+        self.opening = 0
+        self.prefix = None
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def extend(self, records):
+        """Hängt Einträge an; gibt die Anzahl der gelesenen Einträge zurück.
+
+        Einträge ohne gültigen Zeitstempel oder Betrag werden mitgezählt, aber nicht übernommen.
+        """
+        count = 0
+        for record in records:
+            count += 1
+            try:
+                timestamp = to_micros(datetime.fromisoformat(record["timestamp"]))
+                amount = to_cents(record["amount"])
+                balance = to_cents(record["new_balance"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not self.amounts:
+                self.opening = opening_balance(record["type"], amount, balance)
+            self.timestamps.append(timestamp)
+            self.deposits.append(record.get("type") == "deposit")
+            self.amounts.append(amount)
+            self.balances.append(balance)
+        self.prefix = None
+        return count
+
+    def totals(self):
+        """Gibt Anzahl und Summe (in Cent) je Typ zurück: {"deposit": (Anzahl, Summe), ...}."""
+        deposit_count = sum(self.deposits)
+        deposits = sum(compress(self.amounts, self.deposits))
+        return {
+            "deposit": (deposit_count, deposits),
+            "withdraw": (len(self.amounts) - deposit_count, sum(self.amounts) - deposits)
+        }
+
+    def deltas(self):
+        """Gibt die Kontostandsänderung je Eintrag zurück (Einzahlung +Betrag, Auszahlung -Betrag)."""
+        deposit_amounts = array("q", map(operator.mul, self.amounts, self.deposits))
+        return array("q", map(operator.sub, map(operator.add, deposit_amounts, deposit_amounts), self.amounts))
+
+    def running_balances(self, opening=0):
+        """Gibt den laufenden Kontostand nach jedem Eintrag zurück, ausgehend von opening."""
+        return array("q", islice(accumulate(self.deltas(), initial=opening), 1, None))
+
+    def _sort(self):
+        timestamps = self.timestamps
+        if all(map(operator.le, timestamps, islice(timestamps, 1, None))):
+            return
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        for name in ("timestamps", "deposits", "amounts", "balances"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, map(column.__getitem__, order)))
+
+    def _prefixes(self):
+        """Präfixsummen über Anzahl der Einzahlungen, Einzahlungsbeträge und alle Beträge."""
+        if self.prefix is None:
+            self._sort()
+            self.prefix = (
+                array("q", accumulate(self.deposits, initial=0)),
+                array("q", accumulate(map(operator.mul, self.amounts, self.deposits), initial=0)),
+                array("q", accumulate(self.amounts, initial=0))
+            )
+        return self.prefix
+
+    def _range_totals(self, i, j):
+        counts, deposit_sums, sums = self._prefixes()
+        deposit_count = counts[j] - counts[i]
+        deposits = deposit_sums[j] - deposit_sums[i]
+        return deposit_count, deposits, (j - i) - deposit_count, (sums[j] - sums[i]) - deposits
+
+    def range_totals(self, start=None, end=None):
+        """Gibt (Anzahl Einzahlungen, Summe, Anzahl Auszahlungen, Summe) für start <= Zeitpunkt < end zurück."""
+        self._prefixes()
+        i = 0 if start is None else bisect.bisect_left(self.timestamps, to_micros(start))
+        j = len(self.timestamps) if end is None else bisect.bisect_left(self.timestamps, to_micros(end))
+        return self._range_totals(i, max(i, j))
+
+    def periods(self, level):
+        """Liefert je Tag, Monat oder Jahr (Zeitraum, Anzahl Einzahlungen, Summe, Anzahl Auszahlungen,
+        Summe, Kontostand am Ende), in zeitlicher Reihenfolge.
+
+        Der Kontostand am Ende ist opening plus alle Ein- und Auszahlungen bis zum Ende des
+        Zeitraums, auch wenn rückdatierte Einträge erst später gebucht wurden.
+        """
+        length = STATISTICS_LEVELS[level]
+        _, deposit_sums, sums = self._prefixes()
+        timestamps = self.timestamps
+        i, n = 0, len(timestamps)
+        while i < n:
+            day = (datetime.min + timedelta(microseconds=timestamps[i])).date()
+            try:
+                if level == "day":
+                    boundary = day + timedelta(days=1)
+                elif level == "month":
+                    boundary = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+                else:
+                    boundary = date(day.year + 1, 1, 1)
+                j = bisect.bisect_left(timestamps, to_micros(datetime.combine(boundary, datetime.min.time())), i)
+            except OverflowError:
+                j = n
+            yield (day.isoformat()[:length], *self._range_totals(i, j), self.opening + 2 * deposit_sums[j] - sums[j])
+            i = j
+
+class Statistics:
+    """Laufend mitgeführte Auswertungen eines Kontos in stats.db.
+
+    Pro Tag, Monat und Jahr stehen Anzahl und Summe der Ein- und Auszahlungen bereit, dazu der
+    Kontostand am Ende jedes Tages. Jeder Schreibzugriff auf das Konto aktualisiert nur die
+    betroffenen Zeilen, Berichte lesen die fertigen Summen statt den Verlauf zu durchlaufen.
+    Die Anzahl der erfassten Transaktionen wird mitgeschrieben, so lassen sich nach einem
+    Absturz fehlende Einträge nachholen. Alle Beträge sind ganze Cent.
+
+    Die Tagesend-Kontostände folgen dem Datum, nicht der Buchungsreihenfolge: Ein rückdatierter
+    Eintrag verschiebt den Stand seines Tages und aller späteren Tage, so dass das Ergebnis
+    unabhängig von der Reihenfolge der Buchungen dem von rebuild() entspricht.
+    """
+
+    # Ältere stats.db (Beträge als Gleitkommazahl, Tagesend-Kontostände in Buchungsreihenfolge)
+    # werden verworfen und neu aufgebaut
+    VERSION = 2
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rollups (
+            level TEXT NOT NULL,
+            period TEXT NOT NULL,
+            type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (level, period, type)
+        );
+        CREATE TABLE IF NOT EXISTS closing_balances (day TEXT PRIMARY KEY, balance INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('transactions', 0);
+    """
+    UPSERT_ROLLUP = (
+        "INSERT INTO rollups (level, period, type, count, total) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (level, period, type) DO UPDATE SET "
+        "count = count + excluded.count, total = total + excluded.total"
+    )
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "stats.db")
+        self.connection = None
+        self.lock = threading.RLock()
+
+    def _db(self):
+        if self.connection is None:
+            import sqlite3
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            if self.connection.execute("PRAGMA user_version").fetchone()[0] < self.VERSION:
+                self.connection.executescript(
+                    "DROP TABLE IF EXISTS rollups; DROP TABLE IF EXISTS closing_balances; DROP TABLE IF EXISTS meta;"
+                )
+                self.connection.execute(f"PRAGMA user_version = {self.VERSION}")
+            self.connection.executescript(self.SCHEMA)
+        return self.connection
+
+    @staticmethod
+    def aggregate(records):
+        """Fasst Einträge zu Summen je Zeitraum und Typ sowie Kontostandsänderungen je Tag zusammen.
+
+        Gibt (Summen, Änderungen je Tag, Anzahl, Kontostand vor dem ersten Eintrag) zurück;
+        ValueError bei unbekanntem Typ oder ungültigem Betrag bzw. Kontostand.
+        """
+        rollups = {}
+        changes = {}
+        count = 0
+        opening = None
+        for record in records:
+            count += 1
+            if record.get("type") not in ("deposit", "withdraw"):
+                raise ValueError(f"invalid transaction type {record.get('type')!r}")
+            amount = to_cents(record["amount"])
+            balance = to_cents(record["new_balance"])
+            timestamp = record.get("timestamp") or ""
+            if len(timestamp) < 10:
+                continue
+            for level, length in STATISTICS_LEVELS.items():
+                entry = rollups.setdefault((level, timestamp[:length], record["type"]), [0, 0])
+                entry[0] += 1
+                entry[1] += amount
+            if opening is None:
+                opening = opening_balance(record["type"], amount, balance)
+            day = timestamp[:10]
+            changes[day] = changes.get(day, 0) + (amount if record["type"] == "deposit" else -amount)
+        return rollups, changes, count, opening
+
+    def _write(self, db, rollups, count, opening):
+        db.executemany(
+            self.UPSERT_ROLLUP,
+            [(level, period, kind, c, total) for (level, period, kind), (c, total) in rollups.items()]
+        )
+        db.execute("UPDATE meta SET value = value + ? WHERE key = 'transactions'", (count,))
+        if opening is not None:
+            db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('opening', ?)", (opening,))
+
+    def _shift_closing(self, db, changes):
+        """Verschiebt die Tagesend-Kontostände ab jedem Tag um dessen Änderung (Tage aufsteigend)."""
+        row = db.execute("SELECT value FROM meta WHERE key = 'opening'").fetchone()
+        opening = row[0] if row else 0
+        for day in sorted(changes):
+            if db.execute("SELECT 1 FROM closing_balances WHERE day = ?", (day,)).fetchone() is None:
+                # Neuer Tag: beginnt mit dem Stand am Ende des vorigen Tages
+                previous = db.execute(
+                    "SELECT balance FROM closing_balances WHERE day < ? ORDER BY day DESC LIMIT 1", (day,)
+                ).fetchone()
+                db.execute(
+                    "INSERT INTO closing_balances (day, balance) VALUES (?, ?)",
+                    (day, previous[0] if previous else opening)
+                )
+            # Für den laufenden Tag ist das genau eine Zeile, rückdatierte Einträge verschieben auch die Folgetage
+            db.execute("UPDATE closing_balances SET balance = balance + ? WHERE day >= ?", (changes[day], day))
+
+    def add(self, records, aggregate=None):
+        """Nimmt neu angehängte Einträge in die Auswertungen auf (aggregate: bereits berechnete Summen)."""
+        if aggregate is None:
+            aggregate = self.aggregate(records)
+        rollups, changes, count, opening = aggregate
+        with self.lock:
+            db = self._db()
+            with db:
+                self._write(db, rollups, count, opening)
+                self._shift_closing(db, changes)
+
+    def count(self):
+        """Gibt die Anzahl der erfassten Transaktionen zurück."""
+        with self.lock:
+            return self._db().execute("SELECT value FROM meta WHERE key = 'transactions'").fetchone()[0]
+
+    def rebuild(self, storage):
+        """Berechnet alle Auswertungen mit einem Durchlauf über den Verlauf neu; gibt die Anzahl zurück.
+
+        Der Verlauf wird dazu einmal in LedgerColumns geladen, die Summen je Zeitraum sind dann
+        Bereichssummen über die Spalten.
+        """
+        columns = LedgerColumns()
+        count = columns.extend(storage.iter_transactions())
+        rollups = {}
+        closing = {}
+        for level in STATISTICS_LEVELS:
+            for period, deposit_count, deposits, withdraw_count, withdrawals, balance in columns.periods(level):
+                if deposit_count:
+                    rollups[(level, period, "deposit")] = (deposit_count, deposits)
+                if withdraw_count:
+                    rollups[(level, period, "withdraw")] = (withdraw_count, withdrawals)
+                if level == "day":
+                    closing[period] = balance
+        with self.lock:
+            db = self._db()
+            with db:
+                db.execute("DELETE FROM rollups")
+                db.execute("DELETE FROM closing_balances")
+                db.execute("DELETE FROM meta WHERE key = 'opening'")
+                db.execute("UPDATE meta SET value = 0 WHERE key = 'transactions'")
+                self._write(db, rollups, count, columns.opening if len(columns) else None)
+                db.executemany("INSERT INTO closing_balances (day, balance) VALUES (?, ?)", closing.items())
+        return count
+
+    def catch_up(self, storage):
+        """Holt Einträge nach, die im Verlauf, aber noch nicht in den Auswertungen stehen."""
+        counted, stored = self.count(), storage.count()
+        if counted == stored:
+            return
+        if counted > stored:
+            self.rebuild(storage)
+            return
+        transactions = storage.iter_transactions()
+        for _ in range(counted):
+            next(transactions, None)
+        self.add(transactions)
+
+    def report(self, level, period=None):
+        """Gibt je Zeitraum Summen, Anzahl, Durchschnitte und Kontostand am Ende zurück (Beträge in Cent).
+
+        level ist "day", "month" oder "year"; mit period (z.B. "2024-05") nur diesen Zeitraum.
+        """
+        if level not in STATISTICS_LEVELS:
+            raise ValueError(f"unknown statistics level {level!r}")
+        query = "SELECT period, type, count, total FROM rollups WHERE level = ?"
+        params = [level]
+        if period is not None:
+            query += " AND period = ?"
+            params.append(period)
+        rows = OrderedDict()
+        with self.lock:
+            db = self._db()
+            for key, kind, count, total in db.execute(query + " ORDER BY period", params):
+                row = rows.setdefault(key, {
+                    "period": key, "deposits": 0, "deposit_count": 0,
+                    "withdrawals": 0, "withdraw_count": 0
+                })
+                if kind == "deposit":
+                    row["deposits"], row["deposit_count"] = total, count
+                elif kind == "withdraw":
+                    row["withdrawals"], row["withdraw_count"] = total, count
+            for row in rows.values():
+                row["net"] = row["deposits"] - row["withdrawals"]
+                row["average_deposit"] = round(row["deposits"] / row["deposit_count"]) if row["deposit_count"] else 0
+                row["average_withdraw"] = round(row["withdrawals"] / row["withdraw_count"]) if row["withdraw_count"] else 0
+                # "~" sortiert hinter Ziffern und "-", erfasst also alle Tage des Zeitraums
+                closing = db.execute(
+                    "SELECT balance FROM closing_balances WHERE day <= ? ORDER BY day DESC LIMIT 1",
+                    (row["period"] + "~",)
+                ).fetchone()
+                row["closing_balance"] = closing[0] if closing else 0
+        return list(rows.values())
+
+    def balance_curve(self, start=None, end=None):
+        """Gibt (Tag, Kontostand am Tagesende in Cent) für alle Tage mit Buchungen zurück, optional eingegrenzt."""
+        with self.lock:
+            return self._db().execute(
+                "SELECT day, balance FROM closing_balances WHERE day >= ? AND day <= ? ORDER BY day",
+                (start or "", (end or "9999") + "~")
+            ).fetchall()
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+DEFAULT_ACCOUNT = "default"
+LOCK_TIMEOUT = 10.0
+
+
+class LedgerBusyError(RuntimeError):
+    """Das Konto ist von einem anderen Prozess gesperrt."""
+
+
+class FileLock:
+    """Prozessübergreifende exklusive Sperre über eine Sperrdatei (fcntl bzw. msvcrt unter Windows).
+
+    Innerhalb eines Prozesses wird die Sperre nur gezählt: Hält der Prozess sie bereits,
+    kehrt acquire() sofort zurück. Den Zugriff zwischen Threads regelt der Aufrufer.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def _try_lock(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+
+    def _unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def acquire(self, timeout=LOCK_TIMEOUT):
+        """Wartet höchstens timeout Sekunden auf die Sperre, sonst LedgerBusyError."""
+        with self.lock:
+            if self.count == 0:
+                self.file = open(self.path, "a+b")
+                deadline = time.monotonic() + timeout
+                while True:
+                    try:
+                        self._try_lock()
+                        break
+                    except OSError:
+                        if time.monotonic() >= deadline:
+                            self.file.close()
+                            self.file = None
+                            raise LedgerBusyError(
+                                "account is locked by another process (use --daemon to share it)"
+                            )
+                        time.sleep(0.05)
+            self.count += 1
+        return self
+
+    def release(self):
+        with self.lock:
+            self.count -= 1
+            if self.count == 0:
+                self._unlock()
+                self.file.close()
+                self.file = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+
+class AccountStorage(StorageBackend):
+    """Datenablage eines benannten Kontos; hält nach jedem Schreibzugriff Kontenübersicht und Auswertungen aktuell.
+
+    Maßgeblich ist allein der Verlauf: Einträge werden vor dem Schreiben geprüft, Auswertungen
+    und Kontenübersicht erst danach nachgeführt. Scheitert das, bleibt die Buchung gültig; die
+    Auswertungen werden beim nächsten Schreibzugriff bzw. Öffnen nachgeholt, die Übersicht mit
+    dem nächsten Kontostand überschrieben.
+    """
+
+    def __init__(self, manager, name, backend, statistics):
+        self.manager = manager
+        self.name = name
+        self.backend = backend
+        self.statistics = statistics
+        self.statistics_behind = False
+
+    def open(self):
+        self.backend.open()
+        self._catch_up_statistics()
+
+    def _catch_up_statistics(self):
+        try:
+            self.statistics.catch_up(self.backend)
+        except Exception as e:
+            self._statistics_failed(e)
+        else:
+            self.statistics_behind = False
+
+    def _statistics_failed(self, error):
+        self.statistics_behind = True
+        print(f"Statistics of {self.name} are behind and will be caught up later: {error}", file=sys.stderr)
+
+    def configure(self, durability, group_commit_ms=50):
+        self.backend.configure(durability, group_commit_ms)
+
+    @instrumented("load_balance")
+    def load_balance(self):
+        return self.backend.load_balance()
+
+    def append(self, records):
+        if not records:
+            return
+        # Prüft alle Einträge, bevor etwas geschrieben wird
+        aggregate = self.statistics.aggregate(records)
+        balance = to_cents(records[-1]["new_balance"])
+        self.backend.append(records)
+        if self.statistics_behind:
+            self._catch_up_statistics()
+        else:
+            try:
+                self.statistics.add(records, aggregate)
+            except Exception as e:
+                self._statistics_failed(e)
+        try:
+            self.manager.update_summary(self.name, balance)
+        except Exception as e:
+            print(f"Account overview entry of {self.name} could not be updated: {e}", file=sys.stderr)
+
+    def tail(self, kind, n=5):
+        return self.backend.tail(kind, n)
+
+    def iter_transactions(self, kind=None):
+        return self.backend.iter_transactions(kind)
+
+    def timeline(self, start=None, end=None):
+        return self.backend.timeline(start, end)
+
+    def count(self):
+        return self.backend.count()
+
+    def page(self, start, n):
+        return self.backend.page(start, n)
+
+    def scan(self, min_amount=None, max_amount=None, start=None, end=None, first=None, cancel=None):
+        return self.backend.scan(min_amount, max_amount, start, end, first, cancel)
+
+    def read(self, keys):
+        return self.backend.read(keys)
+
+    def totals(self):
+        return self.backend.totals()
+
+    def checkpoint(self, balance=None):
+        self.backend.checkpoint(balance)
+
+    def rotate(self, now=None):
+        return self.backend.rotate(now)
+
+    def archive_segments(self):
+        return self.backend.archive_segments()
+
+    def verify_plan(self, state=None):
+        return self.backend.verify_plan(state)
+
+    def close(self):
+        self.backend.close()
+        self.statistics.close()
+
+
+def account_name(name):
+    """Gibt den Kontonamen ohne Leerraum am Rand zurück; leere Namen sowie "." und ".." ergeben ValueError.
+
+    Alle Zugriffe auf ein Konto (Verzeichnis, Sperre, Daueraufträge) gehen über diesen Namen, damit
+    " kid" und "kid" dasselbe Konto sind.
+    """
+    normalized = name.strip() if isinstance(name, str) else ""
+    if not normalized or normalized in (".", ".."):
+        raise ValueError(f"invalid account name {name!r}")
+    return normalized
+
+class AccountManager:
+    """Verwaltet beliebig viele benannte Konten (z.B. eine Spardose pro Kind oder Sparziel).
+
+    Jedes Konto hat ein eigenes Verzeichnis unter accounts/<2 Zeichen Hash>/<Name>, das Konto
+    "default" nutzt weiterhin das Programmverzeichnis. Konten werden erst beim ersten Zugriff
+    (unter der Kontosperre) geöffnet; höchstens max_open bleiben offen, das am längsten
+    unbenutzte wird geschlossen und bei Bedarf wieder geöffnet.
+    Die Kontostände aller Konten stehen zusätzlich in der Übersicht accounts/summary.db, sodass
+    Auflisten und Summieren kein Konto öffnen muss. Mit rotation="monthly" werden beim Öffnen
+    abgeschlossene Monate ins Archiv des Kontos verschoben.
+    """
+
+    def __init__(self, backend="file", durability="group", group_commit_ms=50,
+                 directory=os.path.join(BASE_DIR, "accounts"), max_open=64, rotation="monthly"):
+        if backend not in STORAGE_BACKENDS:
+            raise ValueError(f"unknown storage backend {backend!r}")
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"unknown durability mode {durability!r}")
+        self.backend = backend
+        self.durability = durability
+        self.group_commit_ms = group_commit_ms
+        self.directory = directory
+        self.max_open = max_open
+        self.rotation = rotation
+        self.open_accounts = OrderedDict()
+        self.file_locks = {}
+        self.summary = None
+        self.lock = threading.RLock()
+
+    def account_directory(self, name):
+        """Gibt das Verzeichnis eines Kontos zurück (verteilt auf Unterordner nach Hash des Namens).
+
+        Der Name wird mit account_name() vereinheitlicht; "." und ".." würde quote() nicht umschreiben.
+        """
+        name = account_name(name)
+        if name == DEFAULT_ACCOUNT:
+            return BASE_DIR
+        import hashlib
+        from urllib.parse import quote
+        shard = hashlib.sha1(name.encode("utf-8")).hexdigest()[:2]
+        return os.path.join(self.directory, shard, quote(name, safe=""))
+
+    def file_lock(self, name):
+        """Gibt die Dateisperre eines Kontos zurück (eine Instanz je Konto und Prozess)."""
+        name = account_name(name)
+        with self.lock:
+            lock = self.file_locks.get(name)
+            if lock is None:
+                directory = self.account_directory(name)
+                os.makedirs(directory, exist_ok=True)
+                lock = self.file_locks[name] = FileLock(os.path.join(directory, "ledger.lock"))
+            return lock
+
+    def _summary(self):
+        if self.summary is None:
+            import sqlite3
+            os.makedirs(self.directory, exist_ok=True)
+            self.summary = sqlite3.connect(os.path.join(self.directory, "summary.db"), check_same_thread=False)
+            self.summary.execute("PRAGMA journal_mode=WAL")
+            self.summary.execute("PRAGMA synchronous=NORMAL")
+            self.summary.execute(
+                "CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, balance INTEGER NOT NULL, updated TEXT NOT NULL)"
+            )
+            if self.summary.execute("PRAGMA user_version").fetchone()[0] < 1:
+                # Ältere Übersichten speichern Kontostände als Gleitkommazahl in Euro
+                with self.summary:
+                    self.summary.execute("UPDATE accounts SET balance = CAST(ROUND(balance * 100) AS INTEGER)")
+                    self.summary.execute("PRAGMA user_version = 1")
+        return self.summary
+
+    def update_summary(self, name, balance):
+        """Trägt den aktuellen Kontostand (in Cent) eines Kontos in die Übersicht ein."""
+        with self.lock:
+            summary = self._summary()
+            with summary:
+                summary.execute(
+                    "INSERT INTO accounts (name, balance, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET balance = excluded.balance, updated = excluded.updated",
+                    (name, balance, datetime.now().isoformat())
+                )
+
+    def get(self, name):
+        """Gibt die (bei Bedarf geöffnete) Datenablage eines Kontos zurück."""
+        name = account_name(name)
+        with self.lock:
+            account = self.open_accounts.get(name)
+            if account is not None:
+                self.open_accounts.move_to_end(name)
+                return account
+            directory = self.account_directory(name)
+            account = AccountStorage(self, name, STORAGE_BACKENDS[self.backend](directory), Statistics(directory))
+            with self.file_lock(name):
+                account.open()
+                account.configure(self.durability, self.group_commit_ms)
+                if self.rotation == "monthly":
+                    account.rotate()
+                # Gleicht die Übersicht ab, falls ein Absturz sie hinter dem Konto zurückgelassen hat
+                self.update_summary(name, account.load_balance())
+            self.open_accounts[name] = account
+            while len(self.open_accounts) > self.max_open:
+                _, oldest = self.open_accounts.popitem(last=False)
+                oldest.close()
+            return account
+
+    def balances(self):
+        """Gibt (Name, Kontostand in Cent) aller Konten laut Übersicht zurück, nach Namen sortiert."""
+        with self.lock:
+            rows = self._summary().execute("SELECT name, balance FROM accounts ORDER BY name").fetchall()
+        return [(name, int(balance)) for name, balance in rows]
+
+    def total(self):
+        """Gibt die Summe aller Kontostände (in Cent) laut Übersicht zurück."""
+        with self.lock:
+            return int(self._summary().execute("SELECT COALESCE(SUM(balance), 0) FROM accounts").fetchone()[0])
+
+    def close(self):
+        """Schließt alle offenen Konten und die Übersicht."""
+        with self.lock:
+            while self.open_accounts:
+                _, account = self.open_accounts.popitem(last=False)
+                account.close()
+            if self.summary is not None:
+                self.summary.close()
+                self.summary = None
+
+
+accounts = None
+storage = None
+
+def open_accounts():
+    """Gibt die Kontenverwaltung zurück und legt sie beim ersten Aufruf an.
+
+    Die Ablage kommt aus der Einstellung "storage" ("file" oder "sqlite", überschreibbar mit
+    --storage), der Haltbarkeitsmodus aus "durability" (überschreibbar mit --durability).
+    """
+    global accounts
+    if accounts is None:
+        accounts = AccountManager(
+            get_option("--storage", settings_store.get("storage", "file")),
+            get_option("--durability", settings_store.get("durability", "group")),
+            settings_store.get("group_commit_ms", 50),
+            rotation=settings_store.get("rotation", "monthly")
+        )
+        atexit.register(accounts.close)
+    return accounts
+
+def open_storage(account=None):
+    """Gibt die Datenablage des aktiven Kontos zurück und öffnet sie beim ersten Aufruf.
+
+    Ohne Angabe gilt das Konto aus --account bzw. der Einstellung "account". Mit einem
+    Kontonamen wird dieses Konto zum aktiven Konto.
+    """
+    global storage
+    if account is not None:
+        storage = open_accounts().get(account)
+    elif storage is None:
+        storage = open_accounts().get(current_account())
+    return storage
+
+def open_statistics(name=None):
+    """Gibt die Auswertungen eines Kontos zum Lesen zurück.
+
+    Aktuell gehalten werden sie von dem Prozess, der bucht (auch vom Dienst).
+    """
+    return Statistics(open_accounts().account_directory(name or current_account()))
+
+def open_history(name=None):
+    """Gibt die Ablage eines Kontos nur zum Lesen zurück (ohne Kontosperre, auch während der Dienst läuft)."""
+    manager = open_accounts()
+    return STORAGE_BACKENDS[manager.backend](manager.account_directory(name or current_account()))
+
+class InsufficientFundsError(ValueError):
+    """Eine Auszahlung übersteigt den Kontostand."""
+
+
+def parse_amount(value):
+    """Wandelt eine Betragseingabe (auch mit Komma) in einen positiven Betrag in Cent um, sonst ValueError."""
+    amount = to_cents(value)
+    if amount <= 0:
+        raise ValueError(f"invalid amount {value!r}")
+    return amount
+
+
+class Ledger:
+    """Bucht Ein- und Auszahlungen auf ein Konto; der Schreibweg für GUI, CLI, Import und Dienst.
+
+    Mit hold_lock=False sperrt jede Buchung das Konto nur kurz (Dateisperre), liest den
+    Kontostand neu ein und schreibt sofort. So können mehrere Prozesse gleichzeitig buchen,
+    ohne sich gegenseitig Änderungen zu überschreiben.
+
+    Mit hold_lock=True hält der Ledger die Sperre für seine ganze Lebensdauer. Buchungen werden
+    dann im Speicher gesammelt und erst mit flush() gemeinsam geschrieben.
+
+    Mit buffered=True werden Buchungen ebenso gesammelt, die Sperre wird aber erst mit der
+    ersten Buchung genommen und mit flush() wieder freigegeben. Andere Prozesse warten dann
+    höchstens bis zum nächsten flush().
+    """
+
+    def __init__(self, name, hold_lock=False, buffered=False, lock_timeout=LOCK_TIMEOUT):
+        manager = open_accounts()
+        self.name = name = account_name(name)
+        self.hold_lock = hold_lock
+        self.buffered = buffered
+        self.file_lock = manager.file_lock(name)
+        if hold_lock:
+            self.file_lock.acquire(lock_timeout)
+        self.storage = manager.get(name)
+        self.balance = self.storage.load_balance()
+        self.pending = []
+        self.lock = threading.RLock()
+        self.schedule_file = schedule_file(name)
+
+    def _apply(self, kind, amount, timestamp=None):
+        if kind == "deposit":
+            new_balance = self.balance + amount
+            if new_balance > MAX_CENTS:
+                raise ValueError("balance would exceed the largest supported amount")
+        elif kind == "withdraw":
+            if amount > self.balance:
+                raise InsufficientFundsError("not enough money in the piggy bank")
+            new_balance = self.balance - amount
+        else:
+            raise ValueError(f"unknown type {kind!r}")
+        record = make_record(kind, amount, new_balance, timestamp)
+        self.balance = new_balance
+        self.pending.append(record)
+        return record
+
+    def post(self, kind, amount, timestamp=None):
+        """Bucht eine Ein- oder Auszahlung und gibt den Verlaufseintrag zurück."""
+        with metrics.timer(f"record_{kind}_transaction"):
+            return self._post(kind, amount, timestamp)
+
+    def _post(self, kind, amount, timestamp):
+        amount = parse_amount(amount)
+        with self.lock:
+            if self.buffered and not self.hold_lock:
+                self.file_lock.acquire()
+                self.hold_lock = True
+                self.balance = self.storage.load_balance()
+            if self.hold_lock:
+                return self._apply(kind, amount, timestamp)
+            with self.file_lock:
+                self.balance = self.storage.load_balance()
+                record = self._apply(kind, amount, timestamp)
+                self._flush()
+                return record
+
+    def deposit(self, amount):
+        return self.post("deposit", amount)
+
+    def withdraw(self, amount):
+        return self.post("withdraw", amount)
+
+    def current_balance(self):
+        """Gibt den aktuellen Kontostand zurück (ohne gehaltene Sperre frisch eingelesen)."""
+        with self.lock:
+            if not self.hold_lock:
+                with self.file_lock:
+                    self.balance = self.storage.load_balance()
+            return self.balance
+
+    def history(self, n, kind=None):
+        """Gibt die letzten n Transaktionen (optional nur eines Typs) zurück."""
+        self.flush()
+        return self.storage.tail(kind, n)
+
+    @contextmanager
+    def batch(self):
+        """Sammelt die Buchungen im with-Block und schreibt sie am Ende mit einem Schreibzugriff.
+
+        Ohne gehaltene Sperre ist das Konto für die Dauer des Blocks gesperrt; bricht der Block
+        mit einem Fehler ab, werden seine Buchungen verworfen.
+        """
+        with self.lock:
+            if self.hold_lock:
+                yield self
+                self._flush()
+                return
+            with self.file_lock:
+                self.balance = self.storage.load_balance()
+                self.hold_lock = True
+                try:
+                    yield self
+                except BaseException:
+                    self.pending = []
+                    self.balance = self.storage.load_balance()
+                    raise
+                finally:
+                    self.hold_lock = False
+                self._flush()
+
+    def schedules(self):
+        """Gibt die Daueraufträge des Kontos samt nächstem Termin ("next") zurück."""
+        return [
+            dict(s, next=schedule_occurrence(s, s["done"]).isoformat())
+            for s in load_schedules(self.schedule_file)["schedules"]
+        ]
+
+    def add_schedule(self, kind, amount, unit, interval=1, start=None):
+        """Legt einen Dauerauftrag an und gibt seine Nummer zurück."""
+        schedule = make_schedule(kind, amount, unit, interval, start)
+        with self.batch():
+            state = load_schedules(self.schedule_file)
+            schedule["id"] = max((s["id"] for s in state["schedules"]), default=0) + 1
+            state["schedules"].append(schedule)
+            save_schedules(self.schedule_file, state)
+        return schedule["id"]
+
+    def remove_schedule(self, schedule_id):
+        """Löscht einen Dauerauftrag; ValueError, wenn es ihn nicht gibt."""
+        with self.batch():
+            state = load_schedules(self.schedule_file)
+            remaining = [s for s in state["schedules"] if s["id"] != schedule_id]
+            if len(remaining) == len(state["schedules"]):
+                raise ValueError(f"no standing order {schedule_id}")
+            state["schedules"] = remaining
+            save_schedules(self.schedule_file, state)
+
+    def apply_schedules(self, now=None):
+        """Bucht alle bis now fälligen Termine der Daueraufträge mit einem Schreibzugriff.
+
+        Nach längerer Pause werden alle verpassten Termine in zeitlicher Reihenfolge nachgeholt,
+        jeweils mit dem Zeitstempel ihres Termins. Auszahlungen ohne genügend Guthaben werden
+        ausgelassen. Gibt (gebuchte, ausgelassene Termine) zurück.
+
+        Der Stand der Aufträge wird erst nach den Buchungen geschrieben, zusammen mit der Anzahl
+        der Einträge im Verlauf ("position"). Bricht das Programm dazwischen ab, erkennt der
+        nächste Aufruf die schon gebuchten Termine an den Einträgen dahinter und bucht sie nicht
+        noch einmal.
+        """
+        now = now or datetime.now()
+        applied = skipped = 0
+        with self.batch():
+            state = load_schedules(self.schedule_file)
+            schedules = state["schedules"]
+            if not any(schedule_occurrence(s, s["done"]) <= now for s in schedules):
+                return applied, skipped
+            if state["position"] is None:
+                # Erster Lauf (oder Datei älterer Versionen): Ausgangspunkt vor dem Buchen festhalten
+                state["position"] = self.storage.count()
+                save_schedules(self.schedule_file, state)
+            self._recover_schedules(state, now)
+            for moment, schedule in due_occurrences(schedules, now):
+                try:
+                    self._apply(schedule["type"], to_cents(schedule["amount"]), moment.isoformat())
+                    applied += 1
+                except InsufficientFundsError:
+                    schedule["skipped"] = schedule.get("skipped", 0) + 1
+                    skipped += 1
+                schedule["done"] += 1
+            self._flush()
+            state["position"] = self.storage.count()
+            save_schedules(self.schedule_file, state)
+        return applied, skipped
+
+    def _recover_schedules(self, state, now):
+        """Übernimmt Termine, die nach "position" schon im Verlauf stehen, als erledigt.
+
+        Dazwischen liegende Termine ohne Eintrag wurden ausgelassen.
+        """
+        position, count = state["position"], self.storage.count()
+        if position is None or position >= count:
+            return
+        booked = {
+            (record.get("type"), record.get("amount"), record.get("timestamp"))
+            for record in self.storage.page(position, count - position)
+        }
+        for schedule in state["schedules"]:
+            n, found = schedule["done"], []
+            moment = schedule_occurrence(schedule, n)
+            while moment <= now:
+                if (schedule["type"], schedule["amount"], moment.isoformat()) in booked:
+                    found.append(n)
+                n += 1
+                moment = schedule_occurrence(schedule, n)
+            if found:
+                schedule["skipped"] = schedule.get("skipped", 0) + found[-1] + 1 - schedule["done"] - len(found)
+                schedule["done"] = found[-1] + 1
+
+    def _flush(self):
+        if not self.pending:
+            return
+        try:
+            self.storage.append(self.pending)
+        except Exception:
+            # Nicht geschriebene Buchungen verwerfen und wieder vom gespeicherten Stand ausgehen
+            self.pending = []
+            self.balance = self.storage.load_balance()
+            raise
+        self.pending = []
+
+    def flush(self):
+        """Schreibt alle gesammelten Buchungen gemeinsam; mit buffered=True wird danach die Sperre frei."""
+        with self.lock:
+            try:
+                self._flush()
+            finally:
+                if self.buffered and self.hold_lock:
+                    self.hold_lock = False
+                    self.file_lock.release()
+
+    def close(self):
+        """Schreibt offene Buchungen und gibt eine gehaltene Sperre frei."""
+        with self.lock:
+            try:
+                self._flush()
+            finally:
+                if self.hold_lock:
+                    self.hold_lock = False
+                    self.file_lock.release()
+
+
+def current_account():
+    """Gibt den Namen des Kontos aus --account bzw. der Einstellung "account" zurück."""
+    return get_option("--account", settings_store.get("account", DEFAULT_ACCOUNT))
+
+def connect_ledger(name=None, hold_lock=False, buffered=False):
+    """Gibt den Buchungsweg für ein Konto zurück.
+
+    Läuft der Dienst (--daemon), wird über ihn gebucht; sonst lokal mit Dateisperren.
+    """
+    name = name or current_account()
+    connection = connect_daemon()
+    if connection is not None:
+        return RemoteLedger(name, connection)
+    return Ledger(name, hold_lock, buffered)
+
+# --- Daueraufträge ---
+
+SCHEDULE_FILE = "schedules.json"
+SCHEDULE_UNITS = ("day", "week", "month")
+# Spätestens nach so vielen Sekunden liest der Zeitgeber die Aufträge neu ein, damit Aufträge,
+# die ein anderer Prozess anlegt, ohne Neustart greifen (und nach Ruhezustand oder Zeitumstellung)
+SCHEDULE_POLL_SECONDS = 60
+
+def schedule_file(name):
+    """Gibt den Pfad der Daueraufträge eines Kontos zurück."""
+    return os.path.join(open_accounts().account_directory(name), SCHEDULE_FILE)
+
+def load_schedules(path):
+    """Liest die Daueraufträge eines Kontos als {"position": ..., "schedules": [...]}.
+
+    position ist die Anzahl der Einträge im Verlauf beim letzten Buchen der Aufträge (siehe
+    Ledger.apply_schedules), ohne Datei oder bei einer Datei älterer Versionen (nur die Liste) None.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {"position": None, "schedules": []}
+    if isinstance(state, list):
+        return {"position": None, "schedules": state}
+    return state
+
+def save_schedules(path, state):
+    """Schreibt die Daueraufträge atomar über eine temporäre Datei."""
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_file, path)
+
+def make_schedule(kind, amount, unit, interval=1, start=None):
+    """Prüft die Angaben eines Dauerauftrags und gibt ihn (noch ohne Nummer) zurück.
+
+    Der Auftrag bucht amount alle interval Tage, Wochen oder Monate, erstmals zu start
+    (Datum oder Zeitpunkt, Standard: heute 0 Uhr). "done" zählt die erledigten Termine.
+    """
+    if kind not in ("deposit", "withdraw"):
+        raise ValueError(f"unknown type {kind!r}")
+    if unit not in SCHEDULE_UNITS:
+        raise ValueError(f"unknown interval {unit!r} (day, week or month)")
+    interval = int(interval)
+    if interval <= 0:
+        raise ValueError(f"invalid interval {interval}")
+    if start is None:
+        start = datetime.combine(date.today(), datetime.min.time())
+    elif isinstance(start, str):
+        start = datetime.fromisoformat(start)
+    return {
+        "type": kind, "amount": format_cents(parse_amount(amount)), "unit": unit, "interval": interval,
+        "start": start.isoformat(), "done": 0, "skipped": 0
+    }
+
+def schedule_occurrence(schedule, n):
+    """Gibt den Zeitpunkt des n-ten Termins (ab 0) zurück.
+
+    Monatliche Aufträge bleiben beim Tag des ersten Termins; in kürzeren Monaten fällt der
+    Termin auf den Monatsletzten.
+    """
+    start = datetime.fromisoformat(schedule["start"])
+    steps = n * schedule["interval"]
+    if schedule["unit"] == "day":
+        return start + timedelta(days=steps)
+    if schedule["unit"] == "week":
+        return start + timedelta(weeks=steps)
+    import calendar
+    year, month = divmod(start.month - 1 + steps, 12)
+    year += start.year
+    return start.replace(year=year, month=month + 1, day=min(start.day, calendar.monthrange(year, month + 1)[1]))
+
+def due_occurrences(schedules, now):
+    """Liefert alle bis now fälligen Termine aller Aufträge als (Zeitpunkt, Auftrag), zeitlich geordnet.
+
+    Ein Heap hält je Auftrag nur den nächsten Termin; der Aufrufer zählt "done" des gelieferten
+    Auftrags hoch, bevor der nächste Termin berechnet wird.
+    """
+    import heapq
+    heap = [(schedule_occurrence(s, s["done"]), s["id"]) for s in schedules]
+    heap = [entry for entry in heap if entry[0] <= now]
+    heapq.heapify(heap)
+    by_id = {s["id"]: s for s in schedules}
+    while heap:
+        moment, schedule_id = heap[0]
+        schedule = by_id[schedule_id]
+        yield moment, schedule
+        following = schedule_occurrence(schedule, schedule["done"])
+        if following <= now:
+            heapq.heapreplace(heap, (following, schedule_id))
+        else:
+            heapq.heappop(heap)
+
+def next_schedule_due(name):
+    """Gibt den nächsten Termin aller Daueraufträge eines Kontos zurück, ohne Aufträge None."""
+    schedules = load_schedules(schedule_file(name))["schedules"]
+    return min((schedule_occurrence(s, s["done"]) for s in schedules), default=None)
+
+
+class ScheduleTimer:
+    """Weckt zum nächsten Termin der Daueraufträge mehrerer Konten (Heap nach Fälligkeit).
+
+    call_later(Sekunden, Funktion) plant einen Weckruf ein und gibt ein Handle zurück, cancel(Handle)
+    hebt ihn auf; in der GUI über master.after, im Dienst über die asyncio-Ereignisschleife.
+    Eingeplant ist immer nur ein Weckruf für den frühesten Termin, höchstens SCHEDULE_POLL_SECONDS
+    entfernt. on_due(Konto) wird für jedes Konto mit fälligen Terminen aufgerufen; nach dem Buchen
+    meldet der Aufrufer den nächsten Termin mit refresh(Konto).
+    """
+
+    def __init__(self, call_later, cancel, on_due):
+        self.call_later = call_later
+        self.cancel = cancel
+        self.on_due = on_due
+        self.heap = []
+        # Nächster Termin je beobachtetem Konto; ältere Heap-Einträge gelten als erledigt
+        self.due = {}
+        self.handle = None
+
+    def watch(self, name):
+        """Beobachtet die Daueraufträge eines Kontos; fällige Termine werden sofort gemeldet."""
+        self.refresh(name)
+
+    def unwatch(self, name):
+        self.due.pop(name, None)
+
+    def refresh(self, name):
+        """Liest den nächsten Termin eines Kontos neu ein und plant den Weckruf neu."""
+        self._update(name)
+        self._arm()
+
+    def _update(self, name):
+        import heapq
+        try:
+            due = next_schedule_due(name)
+        except (OSError, ValueError, KeyError, TypeError):
+            # Unlesbare Aufträge nicht buchen; beim nächsten Einlesen wird es erneut versucht
+            due = None
+        if name not in self.due or self.due[name] != due:
+            self.due[name] = due
+            if due is not None:
+                heapq.heappush(self.heap, (due, name))
+
+    def _arm(self):
+        import heapq
+        while self.heap and self.due.get(self.heap[0][1], 0) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        if self.handle is not None:
+            self.cancel(self.handle)
+        delay = SCHEDULE_POLL_SECONDS
+        if self.heap:
+            delay = min(delay, max(0.0, (self.heap[0][0] - datetime.now()).total_seconds()))
+        self.handle = self.call_later(delay, self._wake)
+
+    def _wake(self):
+        import heapq
+        self.handle = None
+        for name in list(self.due):
+            self._update(name)
+        now = datetime.now()
+        while self.heap and self.heap[0][0] <= now:
+            due, name = heapq.heappop(self.heap)
+            if self.due.get(name) == due:
+                # Bis zum refresh() nach dem Buchen nicht erneut melden
+                self.due[name] = None
+                self.on_due(name)
+        self._arm()
+
+    def close(self):
+        if self.handle is not None:
+            self.cancel(self.handle)
+            self.handle = None
+
+def read_transactions(kind=None):
+    """Liefert die Transaktionen (optional nur eines Typs) aus der aktiven Datenablage."""
+    return open_storage().iter_transactions(kind)
+
+def tail_transactions(kind, n=5):
+    """Gibt die neuesten n Transaktionen (optional nur eines Typs) zurück, älteste zuerst."""
+    return open_storage().tail(kind, n)
+
+def export_history_xml(deposit_path=None, withdraw_path=None):
+    """Schreibt den Verlauf im alten XML-Format (eine Datei für Einzahlungen, eine für Auszahlungen).
+
+    Ohne Pfadangaben landen die Dateien im Verzeichnis des aktiven Kontos. Sie werden zeilenweise
+    erzeugt, ohne den ganzen Verlauf im Speicher aufzubauen.
+    """
+    directory = open_accounts().account_directory(open_storage().name)
+    deposit_path = deposit_path or os.path.join(directory, "deposit_history.xml")
+    withdraw_path = withdraw_path or os.path.join(directory, "withdraw_history.xml")
+    from xml.sax.saxutils import quoteattr
+    for kind, path, tag in (("deposit", deposit_path, "Deposits"), ("withdraw", withdraw_path, "Withdrawals")):
+        tmp_file = path + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(f"<?xml version='1.0' encoding='utf-8'?>\n<{tag}>")
+            for t in read_transactions(kind):
+                f.write(
+                    f"<Transaction amount={quoteattr(t['amount'])} "
+                    f"new_balance={quoteattr(t['new_balance'])} "
+                    f"timestamp={quoteattr(t['timestamp'])} />"
+                )
+            f.write(f"</{tag}>")
+        os.replace(tmp_file, path)
+
+EXPORT_FORMATS = ("csv", "jsonl")
+EXPORT_COLUMNS = ("type", "amount", "new_balance", "timestamp")
+
+def export_history(records, out, fmt="csv"):
+    """Schreibt Einträge als CSV (mit Kopfzeile) oder JSONL nach out; gibt die Anzahl zurück.
+
+    Die Einträge werden einzeln durchgereicht, der Speicherbedarf hängt also nicht von der
+    Verlaufslänge ab. Beide Formate lassen sich mit --import wieder einlesen.
+    """
+    count = 0
+    if fmt == "csv":
+        import csv
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(EXPORT_COLUMNS)
+        for record in records:
+            writer.writerow([record.get(column) for column in EXPORT_COLUMNS])
+            count += 1
+    elif fmt == "jsonl":
+        for record in records:
+            out.write(json.dumps({column: record.get(column) for column in EXPORT_COLUMNS},
+                                 separators=(",", ":")) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"unknown export format {fmt!r}")
+    return count
 
-def save_balance(balance):
-    """Speichert den aktuellen Kontostand in der Datei."""
-    with open(BALANCE_FILE, "w") as f:
-        f.write(str(balance))
+# --- Integritätsprüfung ---
 
-def load_settings():
-    """Lädt die Anwendungseinstellungen aus einer JSON-Datei und ergänzt fehlende Werte mit Standardwerten."""
-    if os.path.exists(SETTINGS_FILE):
+# Größe der Abschnitte, die je ein Prozess prüft (Protokoll in Byte, SQLite in Zeilen)
+VERIFY_CHUNK_BYTES = 4 * 1024 * 1024
+VERIFY_CHUNK_ROWS = 50000
+# Höchstens so viele Fehler werden je Abschnitt gemeldet
+VERIFY_MAX_ERRORS = 100
+VERIFY_FILE = "verify.json"
+
+def iter_verify_source(source):
+    """Liest einen Abschnitt aus verify_plan(): (Position, Eintrag bzw. None bei unlesbarer Zeile)."""
+    if source[0] == "file":
+        _, path, start, end = source
+        name = os.path.basename(path)
+        with open(path, "rb") as f:
+            f.seek(start)
+            position = start
+            while position < end:
+                line = f.readline()
+                if not line:
+                    return
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield f"{name}@{position}", record
+                position += len(line)
+    elif source[0] == "segment":
+        import gzip
+        name = os.path.join(os.path.basename(os.path.dirname(source[1])), os.path.basename(source[1]))
+        with gzip.open(source[1], "rb") as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield f"{name}:{line_no}", record
+    elif source[0] == "sqlite":
+        import sqlite3
+        _, path, after, last = source
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
         try:
-            with open(SETTINGS_FILE, "r") as f:
-                settings = json.load(f)
-            for key in DEFAULT_SETTINGS:
-                if key not in settings:
-                    settings[key] = DEFAULT_SETTINGS[key]
-            return settings
-        except Exception:
-            return DEFAULT_SETTINGS.copy()
+            for row in connection.execute(
+                "SELECT id, type, amount, new_balance, timestamp, hash FROM transactions "
+                "WHERE id > ? AND id <= ? ORDER BY id", (after, last)
+            ):
+                yield f"id {row[0]}", SqliteStorage._to_record(row[1:])
+        finally:
+            connection.close()
     else:
-        return DEFAULT_SETTINGS.copy()
+        raise ValueError(f"unknown verification source {source[0]!r}")
 
-def save_settings(settings):
-    """Speichert die aktuellen Einstellungen in einer JSON-Datei."""
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump(settings, f)
+def verify_records(records, head=CHAIN_GENESIS, balance=0):
+    """Prüft Einträge in Speicherreihenfolge gegen Hash-Kette und Kontostand des Vorgängers.
 
-def record_deposit_transaction(amount, new_balance):
-    """Speichert eine Einzahlungstransaktion in der XML-Datei.
-    
-    Die Transaktion wird mit Betrag, neuem Kontostand und Zeitstempel (ISO-Format) gespeichert.
+    records liefert (Position, Eintrag). Jeder Eintrag muss den Kettenwert aus seinem Vorgänger
+    tragen und sein neuer Kontostand aus dem vorigen plus bzw. minus Betrag folgen. Ist balance
+    None, wird der erste Kontostand übernommen. Prüfpunkte am Ende eines Archivsegments werden
+    mit den Summen des Segments verglichen.
+    Gibt {"count", "unchained", "errors", "head", "balance"} zurück.
     """
-    timestamp = datetime.now().isoformat()
-    if os.path.exists(DEPOSIT_HISTORY_FILE):
-        try:
-            tree = ET.parse(DEPOSIT_HISTORY_FILE)
-            root = tree.getroot()
-        except ET.ParseError:
-            root = ET.Element("Deposits")
-            tree = ET.ElementTree(root)
-    else:
-        root = ET.Element("Deposits")
-        tree = ET.ElementTree(root)
-    transaction = ET.Element("Transaction")
-    transaction.set("amount", f"{amount:.2f}")
-    transaction.set("new_balance", f"{new_balance:.2f}")
-    transaction.set("timestamp", timestamp)
-    root.append(transaction)
-    tree.write(DEPOSIT_HISTORY_FILE, encoding="utf-8", xml_declaration=True)
-
-def record_withdraw_transaction(amount, new_balance):
-    """Speichert eine Auszahlungstransaktion in der XML-Datei.
-    
-    Die Transaktion wird mit Betrag, neuem Kontostand und Zeitstempel (ISO-Format) gespeichert.
-    """
-    timestamp = datetime.now().isoformat()
-    if os.path.exists(WITHDRAW_HISTORY_FILE):
+    errors = []
+    count = unchained = 0
+    totals = {"deposits": 0, "deposit_count": 0, "withdrawals": 0, "withdraw_count": 0}
+
+    def error(position, message):
+        if len(errors) < VERIFY_MAX_ERRORS:
+            errors.append((position, message))
+
+    for position, record in records:
+        if not isinstance(record, dict):
+            error(position, "unreadable record")
+            continue
+        kind = record.get("type")
+        if kind == "checkpoint":
+            expected = dict(totals, count=count, closing_balance=balance, last_hash=head)
+            for key, value in expected.items():
+                stored = record.get(key)
+                if key in ("deposits", "withdrawals", "closing_balance") and stored is not None:
+                    try:
+                        stored = to_cents(stored)
+                    except ValueError:
+                        pass
+                if stored is not None and stored != value:
+                    error(position, f"checkpoint {key} does not match the segment")
+            continue
+        count += 1
         try:
-            tree = ET.parse(WITHDRAW_HISTORY_FILE)
-            root = tree.getroot()
-        except ET.ParseError:
-            root = ET.Element("Withdrawals")
-            tree = ET.ElementTree(root)
+            amount = to_cents(record["amount"])
+            new_balance = to_cents(record["new_balance"])
+        except (KeyError, TypeError, ValueError):
+            error(position, "invalid amount or balance")
+            continue
+        if kind not in ("deposit", "withdraw"):
+            error(position, f"unknown type {kind!r}")
+        elif balance is not None:
+            expected_balance = balance + amount if kind == "deposit" else balance - amount
+            if new_balance != expected_balance:
+                error(position, f"balance {format_cents(new_balance)} does not follow from "
+                                f"{format_cents(balance)} {'+' if kind == 'deposit' else '-'} {format_cents(amount)}")
+        if new_balance < 0:
+            error(position, "negative balance")
+        if kind == "deposit":
+            totals["deposits"] += amount
+            totals["deposit_count"] += 1
+        elif kind == "withdraw":
+            totals["withdrawals"] += amount
+            totals["withdraw_count"] += 1
+        balance = new_balance
+        stored = record.get("hash")
+        if stored is None:
+            unchained += 1
+        else:
+            try:
+                if chain_hash(head, record) != stored:
+                    error(position, "hash does not match the chain")
+            except (KeyError, TypeError, ValueError):
+                error(position, "hash does not match the chain")
+        head = chain_head(record)
+    return {"count": count, "unchained": unchained, "errors": errors, "head": head, "balance": balance}
+
+def verify_chunk(task):
+    """Prüft einen Abschnitt (Quelle, Kettenwert davor, Kontostand davor); läuft in den Prozessen des Pools."""
+    source, head, balance = task
+    return verify_records(iter_verify_source(source), head, balance)
+
+def verify_history(backend, state=None, processes=None):
+    """Prüft Hash-Kette und Kontostände des gesamten Verlaufs einer Ablage.
+
+    Der Verlauf wird in Abschnitte geteilt (siehe verify_plan), die ein Prozess-Pool parallel
+    prüft. Jeder Abschnitt beginnt mit Kettenwert und Kontostand des Eintrags davor; danach
+    wird geprüft, dass er mit Kettenwert und Kontostand endet, mit denen der nächste Abschnitt
+    bzw. das nächste Archivsegment beginnt. Mit state (dem
+    Prüfstand einer früheren fehlerfreien Prüfung) werden nur neue Einträge geprüft.
+
+    Gibt {"count", "checked", "chunks", "processes", "unchained", "errors", "head", "balance",
+    "state"} zurück; count umfasst auch die schon früher geprüften Einträge.
+    """
+    plan = backend.verify_plan(state)
+    if plan is None:
+        result = verify_records(enumerate(backend.iter_transactions(), 1))
+        return dict(result, checked=result["count"], chunks=1, processes=1, state=None)
+    tasks = plan["tasks"]
+    processes = max(1, min(processes or os.cpu_count() or 1, len(tasks)))
+    if processes > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(verify_chunk, tasks))
     else:
-        root = ET.Element("Withdrawals")
-        tree = ET.ElementTree(root)
-    transaction = ET.Element("Transaction")
-    transaction.set("amount", f"{amount:.2f}")
-    transaction.set("new_balance", f"{new_balance:.2f}")
-    transaction.set("timestamp", timestamp)
-    root.append(transaction)
-    tree.write(WITHDRAW_HISTORY_FILE, encoding="utf-8", xml_declaration=True)
+        results = [verify_chunk(task) for task in tasks]
+    errors = list(plan["errors"])
+    for task, result, end in zip(tasks, results, plan["ends"]):
+        errors.extend(result["errors"])
+        if (result["head"], result["balance"]) != end:
+            errors.append((describe_verify_source(task[0]), "does not end where the following section begins"))
+    head, balance = (results[-1]["head"], results[-1]["balance"]) if results else (
+        (state or {}).get("hash", CHAIN_GENESIS), (state or {}).get("balance", 0)
+    )
+    checked = sum(result["count"] for result in results)
+    new_state = dict(plan["state"], hash=head, balance=balance, count=plan["skipped"] + checked)
+    if new_state.get("backend") == "file":
+        # Einträge im Protokoll (ohne Archiv), damit eine spätere Prüfung hinter offset weitermachen kann
+        archived = sum(count for _, count in new_state["segments"].values())
+        new_state["active_count"] = new_state["count"] - archived
+    return {
+        "count": new_state["count"], "checked": checked, "chunks": len(tasks), "processes": processes,
+        "unchained": sum(result["unchained"] for result in results), "errors": errors,
+        "head": head, "balance": balance, "state": new_state
+    }
+
+def describe_verify_source(source):
+    if source[0] == "file":
+        return f"{os.path.basename(source[1])}@{source[2]}"
+    if source[0] == "segment":
+        return os.path.basename(source[1])
+    return f"id {source[2] + 1}"
 
 # Übersetzungswörterbuch für Deutsch und Englisch
 translations = {
@@ -125,7 +3101,26 @@ translations = {
         'maximized': 'Maximiert',
         'minimized': 'Minimiert',
         'deposit_history': 'Einzahlungen',
-        'withdraw_history': 'Auszahlungen'
+        'withdraw_history': 'Auszahlungen',
+        'error_save': 'Fehler beim Speichern:',
+        'account': 'Konto',
+        'switch_account': 'Konto wechseln',
+        'account_prompt': 'Name des Kontos:',
+        'statistics': 'Statistik',
+        'this_month': 'Dieser Monat',
+        'this_year': 'Dieses Jahr',
+        'average': 'Ø',
+        'full_history': 'Gesamter Verlauf',
+        'amount_from': 'Betrag von',
+        'amount_to': 'Betrag bis',
+        'date_from': 'Datum von',
+        'date_to': 'Datum bis',
+        'apply_filter': 'Filtern',
+        'entries': 'Einträge',
+        'searching': 'Suche läuft… Treffer:',
+        'error_load': 'Fehler beim Laden:',
+        'schedules': 'Daueraufträge',
+        'schedules_skipped': '{} Auszahlungen aus Daueraufträgen wurden mangels Guthaben ausgelassen.'
     },
     'en': {
         'settings': 'Settings',
@@ -145,30 +3140,437 @@ translations = {
         'maximized': 'Maximized',
         'minimized': 'Minimized',
         'deposit_history': 'Deposits',
-        'withdraw_history': 'Withdrawals'
+        'withdraw_history': 'Withdrawals',
+        'error_save': 'Error while saving:',
+        'account': 'Account',
+        'switch_account': 'Switch Account',
+        'account_prompt': 'Account name:',
+        'statistics': 'Statistics',
+        'this_month': 'This month',
+        'this_year': 'This year',
+        'average': 'avg.',
+        'full_history': 'Full History',
+        'amount_from': 'Amount from',
+        'amount_to': 'Amount to',
+        'date_from': 'Date from',
+        'date_to': 'Date to',
+        'apply_filter': 'Filter',
+        'entries': 'entries',
+        'searching': 'Searching… matches:',
+        'error_load': 'Error while loading:',
+        'schedules': 'Standing orders',
+        'schedules_skipped': '{} withdrawals from standing orders were skipped (not enough money).'
     }
 }
 
+# --- Write-behind worker ---
+
+class PersistenceWorker:
+    """Führt Buchungen und andere Schreibzugriffe in einem Hintergrund-Thread aus.
+
+    Aufträge landen in einer begrenzten Warteschlange und werden von genau einem Thread in
+    Eingangsreihenfolge abgearbeitet. Ergebnisse und Fehler werden in einer zweiten
+    Warteschlange gesammelt und über poll() im aufrufenden Thread ausgeliefert.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.jobs = queue.Queue(maxsize)
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, func, on_done=None, on_error=None):
+        """Reiht einen Auftrag ein (blockiert, wenn die Warteschlange voll ist)."""
+        self.jobs.put((func, on_done, on_error))
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            func, on_done, on_error = job
+            try:
+                result = func()
+            except Exception as e:
+                if on_error:
+                    self.results.put((on_error, e))
+            else:
+                if on_done:
+                    self.results.put((on_done, result))
+            self.jobs.task_done()
+
+    def poll(self):
+        """Führt die Rückmeldungen erledigter Aufträge im aufrufenden Thread aus."""
+        while True:
+            try:
+                callback, value = self.results.get_nowait()
+            except queue.Empty:
+                return
+            callback(value)
+
+    def flush(self):
+        """Wartet, bis alle eingereihten Aufträge erledigt sind."""
+        self.jobs.join()
+
+    def close(self, wait=True):
+        """Erledigt alle ausstehenden Aufträge und beendet den Hintergrund-Thread.
+
+        Mit wait=False kehrt close() sofort zurück, der Thread endet nach dem letzten Auftrag.
+        """
+        self.jobs.put(None)
+        if wait:
+            self.thread.join()
+
 # --- GUI Mode ---
 
+class HistoryBrowser:
+    """Fenster mit dem gesamten Verlauf eines Kontos (Ein- und Auszahlungen gemeinsam, neueste zuerst).
+
+    Die Liste ist virtuell: Angezeigt werden nur die sichtbaren Zeilen, gelesen wird seitenweise
+    im Hintergrund über den Index der Ablage, höchstens CACHE_PAGES Seiten bleiben im Speicher.
+    Mit einem Filter (Betrag und Datum von/bis) wird der Verlauf einmal im Hintergrund
+    durchsucht. Dabei wird nur der Schlüssel jedes PAGE_SIZE-ten Treffers gemerkt; eine Seite
+    sucht ab diesen Marken erneut. Neues Laden und Schließen brechen laufende Suchen über ein
+    Event ab, ohne auf den Hintergrund-Thread zu warten.
+    """
+
+    PAGE_SIZE = 100
+    CACHE_PAGES = 8
+    VISIBLE_ROWS = 25
+
+    def __init__(self, app):
+        self.app = app
+        self.storage = open_history(app.ledger.name)
+        self.reader = PersistenceWorker()
+        # Geladene Seiten (Seitennummer -> Einträge), die am längsten ungenutzte fliegt zuerst raus
+        self.pages = OrderedDict()
+        self.requested = set()
+        # Filter und Schlüssel jedes PAGE_SIZE-ten Treffers (ältester zuerst) bei aktivem Filter, sonst None
+        self.criteria = None
+        self.marks = None
+        self.total = 0
+        self.first = 0
+        # Wird bei jedem neuen Laden erhöht; Ergebnisse älterer Aufträge werden verworfen
+        self.generation = 0
+        # Bricht die Aufträge des aktuellen Ladens ab (wird beim nächsten Laden ersetzt)
+        self.cancel = threading.Event()
+        self.scanning = False
+        self.scanned = 0
+        self.closed = False
+        self.setup_ui()
+        self.reload()
+        self.poll()
+
+    def setup_ui(self):
+        get_text = self.app.get_text
+        self.window = tk.Toplevel(self.app.master)
+        self.window.title(f"{get_text('full_history')} - {self.app.ledger.name}")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        # Filterzeile: Betrag von/bis, Datum von/bis (JJJJ-MM-TT)
+        self.filter_frame = tk.Frame(self.window)
+        self.filter_frame.pack(fill="x", padx=10, pady=(10, 5))
+        self.filter_entries = {}
+        for column, key in enumerate(('amount_from', 'amount_to', 'date_from', 'date_to')):
+            tk.Label(self.filter_frame, text=get_text(key)).grid(row=0, column=column, sticky="w", padx=2)
+            entry = tk.Entry(self.filter_frame, width=12)
+            entry.grid(row=1, column=column, padx=2)
+            entry.bind("<Return>", lambda event: self.apply_filter())
+            self.filter_entries[key] = entry
+        tk.Button(self.filter_frame, text=get_text('apply_filter'), command=self.apply_filter).grid(
+            row=1, column=4, padx=(8, 0)
+        )
+
+        # Liste mit eigener Scrollbar: Die Listbox enthält immer nur die sichtbaren Zeilen
+        self.list_frame = tk.Frame(self.window)
+        self.list_frame.pack(fill="both", expand=True, padx=10)
+        self.listbox = tk.Listbox(self.list_frame, height=self.VISIBLE_ROWS, width=60, font=("Courier", 11))
+        self.listbox.pack(side="left", fill="both", expand=True)
+        self.scrollbar = tk.Scrollbar(self.list_frame, orient="vertical", command=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.listbox.bind(sequence, self.on_wheel)
+
+        self.status_label = tk.Label(self.window, anchor="w")
+        self.status_label.pack(fill="x", padx=10, pady=(5, 10))
+
+        if self.app.theme == 'dark':
+            bg_color, fg_color = "#2e2e2e", "#ffffff"
+        else:
+            bg_color, fg_color = "#ffffff", "#000000"
+        self.window.configure(bg=bg_color)
+        for frame in (self.filter_frame, self.list_frame):
+            frame.configure(bg=bg_color)
+            for widget in frame.winfo_children():
+                if isinstance(widget, (tk.Label, tk.Listbox)):
+                    widget.configure(bg=bg_color, fg=fg_color)
+        self.status_label.configure(bg=bg_color, fg=fg_color)
+
+    def reset(self):
+        """Verwirft Seiten und laufende Aufträge für ein neues Laden."""
+        self.generation += 1
+        self.cancel.set()
+        self.cancel = threading.Event()
+        self.pages.clear()
+        self.requested.clear()
+        self.criteria = None
+        self.marks = None
+        self.total = 0
+        self.first = 0
+        return self.generation
+
+    def reload(self):
+        """Zeigt den ungefilterten Verlauf; nur die Anzahl der Einträge wird vorab gelesen."""
+        generation = self.reset()
+        self.scanning = False
+        self.reader.submit(self.storage.count, on_done=lambda total: self.on_count(generation, total),
+                           on_error=self.on_error)
+        self.render()
+
+    def apply_filter(self):
+        """Liest die Filterfelder und durchsucht den Verlauf im Hintergrund."""
+        values = {key: entry.get().strip() for key, entry in self.filter_entries.items()}
+        try:
+            min_amount = to_cents(values['amount_from']) if values['amount_from'] else None
+            max_amount = to_cents(values['amount_to']) if values['amount_to'] else None
+            for key in ('date_from', 'date_to'):
+                if values[key]:
+                    values[key] = datetime.fromisoformat(values[key]).date().isoformat()
+        except ValueError:
+            messagebox.showerror(self.app.get_text('full_history'), self.app.get_text('error_invalid'),
+                                 parent=self.window)
+            return
+        criteria = (min_amount, max_amount, values['date_from'] or None, values['date_to'] or None)
+        if criteria == (None, None, None, None):
+            self.reload()
+            return
+        generation = self.reset()
+        self.scanning = True
+        self.scanned = 0
+        cancel = self.cancel
+        self.reader.submit(lambda: self.scan(criteria, cancel),
+                           on_done=lambda marks: self.on_scan(generation, criteria, marks), on_error=self.on_error)
+        self.render()
+
+    def scan(self, criteria, cancel):
+        """Zählt die Treffer und merkt sich jeden PAGE_SIZE-ten Schlüssel (läuft im Hintergrund).
+
+        Gibt die Marken zurück, bei Abbruch None.
+        """
+        marks = array("Q")
+        count = 0
+        for key in self.storage.scan(*criteria, cancel=cancel):
+            if count % self.PAGE_SIZE == 0:
+                marks.append(key)
+            count += 1
+            self.scanned = count
+        if cancel.is_set():
+            return None
+        return marks, count
+
+    def on_count(self, generation, total):
+        if generation == self.generation:
+            self.total = total
+            self.render()
+
+    def on_scan(self, generation, criteria, result):
+        if generation == self.generation and result is not None:
+            self.scanning = False
+            self.criteria = criteria
+            self.marks, self.total = result
+            self.render()
+
+    def on_error(self, error):
+        self.scanning = False
+        self.status_label.config(text=f"{self.app.get_text('error_load')} {error}")
+
+    def on_page_error(self, generation, number, error):
+        """Meldet eine fehlgeschlagene Seite; das nächste render() fordert sie erneut an."""
+        if generation != self.generation:
+            return
+        self.requested.discard(number)
+        self.status_label.config(text=f"{self.app.get_text('error_load')} {error}")
+
+    def load_page(self, number, criteria, marks, total, first, cancel):
+        """Liest eine Seite (läuft im Hintergrund).
+
+        Alle Angaben stammen vom Zeitpunkt der Anforderung; Seiten weit entfernt von first entfallen.
+        """
+        if cancel.is_set() or abs(number * self.PAGE_SIZE - first) > self.CACHE_PAGES * self.PAGE_SIZE:
+            return None
+        # Seite 0 enthält die neuesten Einträge
+        end = total - number * self.PAGE_SIZE
+        start = max(0, end - self.PAGE_SIZE)
+        if marks is None:
+            records = self.storage.page(start, end - start)
+        else:
+            # Ab der Marke vor start weitersuchen; die Seite reicht höchstens in den nächsten Abschnitt
+            mark = start // self.PAGE_SIZE
+            matches = self.storage.scan(*criteria, first=marks[mark], cancel=cancel)
+            try:
+                keys = list(islice(matches, start - mark * self.PAGE_SIZE, end - mark * self.PAGE_SIZE))
+            finally:
+                matches.close()
+            records = self.storage.read(keys)
+        records.reverse()
+        return records
+
+    def request_page(self, number):
+        if number in self.pages or number in self.requested:
+            return
+        self.requested.add(number)
+        generation, criteria, marks, total, cancel = self.generation, self.criteria, self.marks, self.total, self.cancel
+        first = self.first
+        self.reader.submit(lambda: self.load_page(number, criteria, marks, total, first, cancel),
+                           on_done=lambda records: self.on_page(generation, number, records),
+                           on_error=lambda error: self.on_page_error(generation, number, error))
+
+    def on_page(self, generation, number, records):
+        if generation != self.generation:
+            return
+        self.requested.discard(number)
+        if records is None:
+            self.render()
+            return
+        self.pages[number] = records
+        while len(self.pages) > self.CACHE_PAGES:
+            self.pages.popitem(last=False)
+        self.render()
+
+    def format_record(self, record):
+        currency = self.app.currency
+        sign = "+" if record.get("type") == "deposit" else "-"
+        timestamp = (record.get("timestamp") or "")[:16].replace("T", " ")
+        return f"{timestamp:<16}  {sign}{record['amount']:>10}{currency}  → {record['new_balance']}{currency}"
+
+    def render(self):
+        """Füllt die Listbox mit den sichtbaren Zeilen; fehlende Seiten werden angefordert."""
+        self.first = max(0, min(self.first, self.total - self.VISIBLE_ROWS))
+        last = min(self.first + self.VISIBLE_ROWS, self.total)
+        items = []
+        for row in range(self.first, last):
+            number, index = divmod(row, self.PAGE_SIZE)
+            page = self.pages.get(number)
+            if page is None or index >= len(page):
+                items.append("…")
+                self.request_page(number)
+            else:
+                self.pages.move_to_end(number)
+                items.append(self.format_record(page[index]))
+        # Die folgende Seite schon vorab lesen, damit Weiterscrollen nicht stockt
+        if last < self.total:
+            self.request_page(last // self.PAGE_SIZE)
+        self.listbox.delete(0, tk.END)
+        for item in items:
+            self.listbox.insert(tk.END, item)
+        if self.total:
+            self.scrollbar.set(self.first / self.total, last / self.total)
+        else:
+            self.scrollbar.set(0, 1)
+        self.update_status()
+
+    def update_status(self):
+        if self.scanning:
+            text = f"{self.app.get_text('searching')} {self.scanned}"
+        else:
+            text = f"{self.total} {self.app.get_text('entries')}"
+        self.status_label.config(text=text)
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.first = int(float(amount) * self.total)
+        elif action == "scroll":
+            step = self.VISIBLE_ROWS if unit == "pages" else 1
+            self.first += int(amount) * step
+        self.render()
+
+    def on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.first -= 3
+        else:
+            self.first += 3
+        self.render()
+        return "break"
+
+    def poll(self):
+        if self.closed:
+            return
+        self.reader.poll()
+        if self.scanning:
+            self.update_status()
+        self.window.after(50, self.poll)
+
+    def close(self):
+        """Bricht laufende Suchen ab und schließt das Fenster, ohne auf den Hintergrund-Thread zu warten."""
+        self.closed = True
+        self.generation += 1
+        self.cancel.set()
+        # Die Ablage schließt der Hintergrund-Thread selbst, sobald der abgebrochene Auftrag endet
+        self.reader.submit(self.storage.close)
+        self.reader.close(wait=False)
+        self.window.destroy()
+
 class PiggyBankApp:
     def __init__(self, master):
         """Initialisiert die GUI-Anwendung, lädt Einstellungen und Kontostand, baut das Layout auf und aktualisiert den Transaktionsverlauf."""
         self.master = master
-        self.settings = load_settings()
+        self.settings = settings_store
         self.language = self.settings.get("language", "de")
         self.currency = self.settings.get("currency", "€")
         self.theme = self.settings.get("theme", "light")
         self.window_mode = self.settings.get("window_mode", "normal")
-        self.balance = load_balance()
+        # Bucht über den Dienst (--daemon), falls er läuft, sonst lokal mit Dateisperren
+        self.ledger = connect_ledger()
+        self.balance = self.ledger.current_balance()
+        # Zuletzt angezeigte Transaktionen je Typ; None markiert einen Ladefehler
+        self.recent = {"deposit": deque(maxlen=5), "withdraw": deque(maxlen=5)}
+        # Bucht im Hintergrund, damit die Oberfläche nie auf Platte oder Dienst wartet
+        self.worker = PersistenceWorker()
         self.setup_ui()
         self.apply_theme()
         self.apply_window_mode()
         self.update_history()
+        self.poll_worker()
+        # Daueraufträge bucht der Dienst, falls er läuft; sonst die GUI, solange sie offen ist
+        self.schedule_timer = None
+        self.watch_schedules()
+
+    def watch_schedules(self):
+        """Startet den Zeitgeber für die Daueraufträge des aktiven Kontos; verpasste Termine werden sofort nachgeholt."""
+        if not isinstance(self.ledger, Ledger):
+            return
+        if self.schedule_timer is None:
+            self.schedule_timer = ScheduleTimer(
+                lambda delay, callback: self.master.after(int(delay * 1000), callback),
+                self.master.after_cancel, self.apply_schedules
+            )
+        self.schedule_timer.watch(self.ledger.name)
+
+    def apply_schedules(self, name):
+        """Bucht die fälligen Daueraufträge im Hintergrund-Thread (alle verpassten Termine gemeinsam)."""
+        ledger = self.ledger
+        if ledger.name != name:
+            return
+        self.worker.submit(
+            ledger.apply_schedules,
+            on_done=lambda result: self.on_schedules_done(name, result),
+            on_error=self.on_persist_error
+        )
+
+    def on_schedules_done(self, name, result):
+        """Zeigt Kontostand und History nach gebuchten Daueraufträgen neu an und plant den nächsten Termin."""
+        applied, skipped = result
+        if name == self.ledger.name:
+            if applied:
+                self.update_history()
+            if skipped:
+                messagebox.showwarning(self.get_text('schedules'), self.get_text('schedules_skipped').format(skipped))
+            self.schedule_timer.refresh(name)
 
     def setup_ui(self):
         """Erstellt das GUI-Layout mit Menüs, Eingabefeldern, Buttons und einem History-Panel für Transaktionen."""
-        self.master.title(self.get_text('title'))
+        self.update_title()
         
         # Erstellen der Menüleiste mit übersetzten Labels
         self.menu = tk.Menu(self.master)
@@ -195,6 +3597,14 @@ class PiggyBankApp:
         self.window_menu.add_command(label=self.get_text('maximized'), command=lambda: self.set_window_mode('maximized'))
         self.window_menu.add_command(label=self.get_text('minimized'), command=lambda: self.set_window_mode('minimized'))
         
+        # Kontomenü zum Wechseln zwischen mehreren Spardosen
+        self.account_menu = tk.Menu(self.menu, tearoff=0)
+        self.menu.add_cascade(label=self.get_text('account'), menu=self.account_menu)
+        self.account_menu_index = self.menu.index("end")
+        self.account_menu.add_command(label=self.get_text('switch_account'), command=self.switch_account)
+        self.account_menu.add_command(label=self.get_text('statistics'), command=self.show_statistics)
+        self.account_menu.add_command(label=self.get_text('full_history'), command=self.show_full_history)
+        
         # Haupt-Frame für Widgets
         self.main_frame = tk.Frame(self.master)
         self.main_frame.pack(expand=True, padx=20, pady=20)
@@ -202,7 +3612,7 @@ class PiggyBankApp:
         # Anzeige des aktuellen Kontostands
         self.balance_label = tk.Label(
             self.main_frame, 
-            text=self.get_text('current_balance') + f" {self.balance:.2f}{self.currency}", 
+            text=self.get_text('current_balance') + f" {format_cents(self.balance)}{self.currency}", 
             font=("Arial", 16)
         )
         self.balance_label.grid(row=0, column=0, columnspan=2, pady=(0, 10), sticky="ew")
@@ -270,95 +3680,199 @@ class PiggyBankApp:
         y = (screen_height - height) // 2
         self.master.geometry(f"{width}x{height}+{x}+{y}")
 
+    def update_title(self):
+        """Setzt den Fenstertitel; bei einem anderen als dem Standardkonto mit Kontonamen."""
+        title = self.get_text('title')
+        if self.ledger.name != DEFAULT_ACCOUNT:
+            title += f" – {self.ledger.name}"
+        self.master.title(title)
+
+    def switch_account(self):
+        """Fragt nach einem Kontonamen und öffnet das Konto im Hintergrund-Thread.
+
+        Bereits eingereihte Buchungen laufen vorher noch auf das alte Konto.
+        """
+        name = simpledialog.askstring(self.get_text('account'), self.get_text('account_prompt'))
+        if not name or not name.strip():
+            return
+        try:
+            name = account_name(name)
+        except ValueError:
+            messagebox.showerror("Error", self.get_text('error_invalid'))
+            return
+        self.worker.submit(lambda: connect_ledger(name), on_done=self.on_account_switched,
+                           on_error=self.on_switch_error)
+
+    def on_account_switched(self, ledger):
+        """Zeigt das neue Konto an; das alte wird nach den letzten Aufträgen im Hintergrund geschlossen."""
+        old = self.ledger
+        if self.schedule_timer is not None:
+            self.schedule_timer.unwatch(old.name)
+        self.ledger = ledger
+        self.worker.submit(old.close, on_error=self.on_persist_error)
+        self.watch_schedules()
+        self.settings.set('account', ledger.name)
+        self.update_title()
+        self.update_history()
+
+    def on_switch_error(self, error):
+        if isinstance(error, LedgerBusyError):
+            messagebox.showerror("Error", str(error))
+        else:
+            self.on_persist_error(error)
+
+    def show_statistics(self):
+        """Zeigt Ein- und Auszahlungen des laufenden Monats und Jahres aus den vorberechneten Auswertungen.
+
+        Gelesen wird im Hintergrund-Thread nach den bereits eingereihten Buchungen.
+        """
+        name = self.ledger.name
+        self.worker.submit(lambda: self.load_statistics(name), on_done=self.on_statistics_loaded,
+                           on_error=self.on_persist_error)
+
+    @staticmethod
+    def load_statistics(name):
+        """Liest die Auswertung des laufenden Monats und Jahres (läuft im Hintergrund-Thread)."""
+        statistics = open_statistics(name)
+        today = datetime.now().isoformat()
+        try:
+            return [
+                (key, statistics.report(level, period))
+                for key, level, period in (('this_month', 'month', today[:7]), ('this_year', 'year', today[:4]))
+            ]
+        finally:
+            statistics.close()
+
+    def on_statistics_loaded(self, reports):
+        lines = []
+        for key, rows in reports:
+            row = rows[0] if rows else {"deposits": 0, "deposit_count": 0, "average_deposit": 0,
+                                        "withdrawals": 0, "withdraw_count": 0, "average_withdraw": 0}
+            lines.append(f"{self.get_text(key)}:")
+            lines.append(
+                f"  {self.get_text('deposit_history')}: {format_cents(row['deposits'])}{self.currency} "
+                f"({row['deposit_count']}×, {self.get_text('average')} {format_cents(row['average_deposit'])}{self.currency})"
+            )
+            lines.append(
+                f"  {self.get_text('withdraw_history')}: {format_cents(row['withdrawals'])}{self.currency} "
+                f"({row['withdraw_count']}×, {self.get_text('average')} {format_cents(row['average_withdraw'])}{self.currency})"
+            )
+        messagebox.showinfo(self.get_text('statistics'), "\n".join(lines))
+
+    def show_full_history(self):
+        """Öffnet den gesamten Verlauf des aktiven Kontos in einem eigenen Fenster, sobald die eingereihten Buchungen geschrieben sind."""
+        self.worker.submit(lambda: None, on_done=lambda _: HistoryBrowser(self))
+
     def get_text(self, key):
         """Gibt den übersetzten Text für den angegebenen Schlüssel zurück."""
         return translations[self.language][key]
 
     def update_history(self):
-        """Lädt die letzten 5 Transaktionen aus den XML-Dateien und zeigt sie in den Listboxen an.
-        
-        Es werden nur Betrag und neuer Kontostand (ohne Zeit) angezeigt.
-        """
-        # Einzahlungen
-        deposit_transactions = []
-        if os.path.exists(DEPOSIT_HISTORY_FILE):
+        """Liest Kontostand und die letzten 5 Transaktionen je Typ im Hintergrund-Thread und zeigt sie danach an."""
+        ledger = self.ledger
+        sizes = {kind: entries.maxlen for kind, entries in self.recent.items()}
+        self.worker.submit(lambda: self.load_view(ledger, sizes),
+                           on_done=lambda view: self.on_view_loaded(ledger, view), on_error=self.on_persist_error)
+
+    @staticmethod
+    @instrumented("update_history")
+    def load_view(ledger, sizes):
+        """Gibt (Kontostand, {Typ: letzte Transaktionen oder None bei Ladefehler}) zurück (im Hintergrund-Thread)."""
+        recent = {}
+        for kind, n in sizes.items():
             try:
-                tree = ET.parse(DEPOSIT_HISTORY_FILE)
-                root = tree.getroot()
-                transactions = list(root)
-                last_transactions = transactions[-5:]
-                for t in last_transactions:
-                    amount = t.get("amount")
-                    new_balance = t.get("new_balance")
-                    deposit_transactions.append(f"{amount}{self.currency} → {new_balance}{self.currency}")
+                recent[kind] = ledger.history(n, kind)
             except Exception:
-                deposit_transactions.append("Fehler beim Laden")
-        else:
-            deposit_transactions.append("Keine Einzahlungen")
-        self.deposit_listbox.delete(0, tk.END)
-        for item in deposit_transactions:
-            self.deposit_listbox.insert(tk.END, item)
+                recent[kind] = None
+        return ledger.current_balance(), recent
+
+    def on_view_loaded(self, ledger, view):
+        if ledger is not self.ledger:
+            return
+        self.balance, recent = view
+        for kind, records in recent.items():
+            self.recent[kind].clear()
+            self.recent[kind].extend([None] if records is None else records)
+        self.update_balance_label()
+        self.render_history()
+
+    def add_history_entry(self, record):
+        """Übernimmt eine gerade gespeicherte Transaktion in die Anzeige, ohne den Verlauf neu zu lesen."""
+        entries = self.recent[record["type"]]
+        if None in entries:
+            entries.clear()
+        entries.append(record)
+        self.render_history()
+
+    def render_history(self):
+        """Zeigt die zwischengespeicherten Transaktionen in den Listboxen an.
         
-        # Auszahlungen
-        withdraw_transactions = []
-        if os.path.exists(WITHDRAW_HISTORY_FILE):
-            try:
-                tree = ET.parse(WITHDRAW_HISTORY_FILE)
-                root = tree.getroot()
-                transactions = list(root)
-                last_transactions = transactions[-5:]
-                for t in last_transactions:
-                    amount = t.get("amount")
-                    new_balance = t.get("new_balance")
-                    withdraw_transactions.append(f"{amount}{self.currency} → {new_balance}{self.currency}")
-            except Exception:
-                withdraw_transactions.append("Fehler beim Laden")
-        else:
-            withdraw_transactions.append("Keine Auszahlungen")
-        self.withdraw_listbox.delete(0, tk.END)
-        for item in withdraw_transactions:
-            self.withdraw_listbox.insert(tk.END, item)
+        Es werden nur Betrag und neuer Kontostand (ohne Zeit) angezeigt.
+        """
+        for kind, listbox, empty_text in (
+            ("deposit", self.deposit_listbox, "Keine Einzahlungen"),
+            ("withdraw", self.withdraw_listbox, "Keine Auszahlungen")
+        ):
+            entries = self.recent[kind]
+            if None in entries:
+                items = ["Fehler beim Laden"]
+            elif entries:
+                items = [f"{t['amount']}{self.currency} → {t['new_balance']}{self.currency}" for t in entries]
+            else:
+                items = [empty_text]
+            listbox.delete(0, tk.END)
+            for item in items:
+                listbox.insert(tk.END, item)
 
     def deposit(self):
-        """Erhöht den Kontostand um den eingegebenen Betrag, speichert die Transaktion und aktualisiert Anzeige sowie History."""
-        try:
-            input_str = self.amount_entry.get().replace(",", ".")
-            amount = float(input_str)
-            self.balance += amount
-            save_balance(self.balance)
-            self.update_balance_label()
-            record_deposit_transaction(amount, self.balance)
-            self.update_history()
-        except ValueError:
-            messagebox.showerror("Error", self.get_text('error_invalid'))
-        self.amount_entry.delete(0, tk.END)
+        """Bucht den eingegebenen Betrag als Einzahlung im Hintergrund; Anzeige und History folgen nach der Buchung."""
+        self.submit_transaction("deposit")
 
     def withdraw(self):
-        """Verringert den Kontostand um den eingegebenen Betrag (sofern genügend Guthaben vorhanden) und speichert die Transaktion."""
-        try:
-            input_str = self.amount_entry.get().replace(",", ".")
-            amount = float(input_str)
-            if amount > self.balance:
-                messagebox.showerror("Error", self.get_text('error_insufficient'))
-            else:
-                self.balance -= amount
-                save_balance(self.balance)
-                self.update_balance_label()
-                record_withdraw_transaction(amount, self.balance)
-                self.update_history()
-        except ValueError:
-            messagebox.showerror("Error", self.get_text('error_invalid'))
+        """Bucht den eingegebenen Betrag als Auszahlung im Hintergrund (sofern genügend Guthaben vorhanden)."""
+        self.submit_transaction("withdraw")
+
+    def submit_transaction(self, kind):
+        """Übergibt die Buchung des eingegebenen Betrags dem Hintergrund-Thread."""
+        # Der Betrag wird erst beim Buchen (einmal) in Cent umgewandelt; ungültige Eingaben
+        # kommen als ValueError über on_persist_error zurück
+        text = self.amount_entry.get()
+        ledger = self.ledger
+        self.worker.submit(
+            lambda: ledger.post(kind, text),
+            on_done=self.on_transaction_done,
+            on_error=self.on_persist_error
+        )
         self.amount_entry.delete(0, tk.END)
 
+    def on_transaction_done(self, record):
+        """Übernimmt eine gebuchte Transaktion in Kontostand und History-Anzeige."""
+        self.balance = to_cents(record["new_balance"])
+        self.update_balance_label()
+        self.add_history_entry(record)
+
+    def on_persist_error(self, error):
+        """Meldet eine fehlgeschlagene Buchung des Hintergrund-Threads."""
+        if isinstance(error, InsufficientFundsError):
+            messagebox.showerror("Error", self.get_text('error_insufficient'))
+        elif isinstance(error, ValueError):
+            messagebox.showerror("Error", self.get_text('error_invalid'))
+        else:
+            messagebox.showerror("Error", f"{self.get_text('error_save')} {error}")
+
+    def poll_worker(self):
+        """Holt regelmäßig die Rückmeldungen des Hintergrund-Threads in den Tk-Thread."""
+        self.worker.poll()
+        self.master.after(100, self.poll_worker)
+
     def update_balance_label(self):
         """Aktualisiert die Anzeige des aktuellen Kontostands."""
-        self.balance_label.config(text=self.get_text('current_balance') + f" {self.balance:.2f}{self.currency}")
+        self.balance_label.config(text=self.get_text('current_balance') + f" {format_cents(self.balance)}{self.currency}")
 
     def toggle_theme(self):
         """Wechselt zwischen dunklem und hellem Theme, speichert die Einstellung und wendet diese an."""
         self.theme = 'dark' if self.theme == 'light' else 'light'
-        self.settings['theme'] = self.theme
-        save_settings(self.settings)
+        self.settings.set('theme', self.theme)
         self.apply_theme()
 
     def apply_theme(self):
@@ -386,13 +3900,12 @@ class PiggyBankApp:
     def set_language(self, lang):
         """Ändert die Anzeigesprache, speichert die Einstellung und aktualisiert alle UI-Texte."""
         self.language = lang
-        self.settings['language'] = lang
-        save_settings(self.settings)
+        self.settings.set('language', lang)
         self.update_ui_texts()
 
     def update_ui_texts(self):
         """Aktualisiert sämtliche Texte in der Benutzeroberfläche (Fenstertitel, Buttons, Menüs, History-Labels)."""
-        self.master.title(self.get_text('title'))
+        self.update_title()
         self.deposit_button.config(text=self.get_text('deposit'))
         self.withdraw_button.config(text=self.get_text('withdraw'))
         self.update_balance_label()
@@ -406,6 +3919,10 @@ class PiggyBankApp:
         self.window_menu.entryconfig(3, label=self.get_text('minimized'))
         self.deposit_history_label.config(text=self.get_text('deposit_history'))
         self.withdraw_history_label.config(text=self.get_text('withdraw_history'))
+        self.menu.entryconfig(self.account_menu_index, label=self.get_text('account'))
+        self.account_menu.entryconfig(0, label=self.get_text('switch_account'))
+        self.account_menu.entryconfig(1, label=self.get_text('statistics'))
+        self.account_menu.entryconfig(2, label=self.get_text('full_history'))
 
     def change_currency(self):
         """Ermöglicht das Ändern des Währungssymbols, speichert die neue Einstellung und aktualisiert Anzeige und History."""
@@ -413,16 +3930,14 @@ class PiggyBankApp:
         new_currency = simpledialog.askstring("Currency", prompt)
         if new_currency:
             self.currency = new_currency
-            self.settings['currency'] = new_currency
-            save_settings(self.settings)
+            self.settings.set('currency', new_currency)
             self.update_balance_label()
-            self.update_history()
+            self.render_history()
 
     def set_window_mode(self, mode):
         """Setzt den Fenstermodus (normal, fullscreen, maximiert, minimiert), speichert die Einstellung und passt die Anzeige des History-Panels an."""
         self.window_mode = mode
-        self.settings['window_mode'] = mode
-        save_settings(self.settings)
+        self.settings.set('window_mode', mode)
         self.apply_window_mode()
 
     def apply_window_mode(self):
@@ -445,65 +3960,947 @@ class PiggyBankApp:
             self.history_frame.grid_remove()
 
     def on_close(self):
-        """Speichert die aktuellen Einstellungen und schließt die Anwendung."""
-        save_settings(self.settings)
+        """Schreibt ausstehende Transaktionen und Einstellungen und schließt die Anwendung."""
+        if self.schedule_timer is not None:
+            self.schedule_timer.close()
+        self.worker.close()
+        self.worker.poll()
+        self.ledger.close()
+        self.settings.flush()
         self.master.destroy()
 
+def load_tkinter():
+    """Importiert tkinter samt Dialogen für die GUI."""
+    global tk, messagebox, simpledialog
+    import tkinter as tk
+    from tkinter import messagebox, simpledialog
+
 def run_gui():
     """Startet den GUI-Modus der Anwendung."""
+    load_tkinter()
     root = tk.Tk()
-    app = PiggyBankApp(root)
+    try:
+        app = PiggyBankApp(root)
+    except LedgerBusyError as e:
+        root.withdraw()
+        messagebox.showerror("Error", str(e))
+        root.destroy()
+        sys.exit(1)
     root.mainloop()
 
 # --- CLI Mode ---
 
 def run_cli():
     """Startet den CLI-Modus der Anwendung mit einem textbasierten Menü."""
-    balance = load_balance()
+    try:
+        ledger = connect_ledger()
+    except LedgerBusyError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
     while True:
         print("\nPiggy Bank Manager")
         print("1. Deposit Money")
         print("2. Withdraw Money")
         print("3. Show Balance")
         print("4. Exit")
+        print("5. Switch Account")
         choice = input("Choose an option: ")
-        if choice == "1":
-            try:
-                input_str = input("How much do you want to deposit? ").replace(",", ".")
-                amount = float(input_str)
-                balance += amount
-                save_balance(balance)
-                currency = load_settings().get('currency', '€')
-                print(f"{amount:.2f}{currency} deposited. New balance: {balance:.2f}{currency}")
-                record_deposit_transaction(amount, balance)
-            except ValueError:
+        try:
+            if choice == "1":
+                try:
+                    record = ledger.deposit(input("How much do you want to deposit? "))
+                    currency = settings_store.get('currency', '€')
+                    print(f"{record['amount']}{currency} deposited. New balance: {record['new_balance']}{currency}")
+                except ValueError:
+                    print("Invalid input, please try again.")
+            elif choice == "2":
+                try:
+                    record = ledger.withdraw(input("How much do you want to withdraw? "))
+                    currency = settings_store.get('currency', '€')
+                    print(f"{record['amount']}{currency} withdrawn. New balance: {record['new_balance']}{currency}")
+                except InsufficientFundsError:
+                    print("Error: Not enough money in the piggy bank!")
+                except ValueError:
+                    print("Invalid input, please try again.")
+            elif choice == "3":
+                currency = settings_store.get('currency', '€')
+                print(f"Current balance: {format_cents(ledger.current_balance())}{currency}")
+            elif choice == "4":
+                ledger.close()
+                print("Exiting the program.")
+                break
+            elif choice == "5":
+                name = input("Account name: ").strip()
+                try:
+                    open_accounts().account_directory(name)
+                except ValueError:
+                    print("Invalid input, please try again.")
+                    continue
+                new_ledger = connect_ledger(name)
+                ledger.close()
+                ledger = new_ledger
+                currency = settings_store.get('currency', '€')
+                print(f"Active account: {ledger.name}. Current balance: {format_cents(ledger.current_balance())}{currency}")
+            else:
                 print("Invalid input, please try again.")
-        elif choice == "2":
+        except LedgerBusyError as e:
+            # Ein anderer Prozess hält das Konto zu lange gesperrt; das Menü bleibt bedienbar
+            print(f"Error: {e}")
+
+# --- Scripted CLI ---
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+class LedgerSession:
+    """Führt die Befehle der Skriptsteuerung gegen einen Ledger aus.
+
+    open_ledger(name) liefert beim Befehl "account" den Ledger des neuen Kontos.
+    """
+
+    def __init__(self, ledger, open_ledger):
+        self.ledger = ledger
+        self.open_ledger = open_ledger
+        self.currency = settings_store.get('currency', '€')
+
+    def switch_account(self, name):
+        """Schreibt offene Buchungen und wechselt zum angegebenen Konto (bei ungültigem Namen bleibt das alte aktiv)."""
+        ledger = self.open_ledger(name)
+        self.ledger.close()
+        self.ledger = ledger
+
+    def close(self):
+        self.ledger.close()
+
+    def execute(self, line):
+        """Führt einen Protokollbefehl aus und gibt die Antwortzeilen zurück.
+
+        Die letzte Zeile beginnt immer mit "ok" oder "error". Befehle:
+        deposit BETRAG, withdraw BETRAG, balance, history [--last N] [--type deposit|withdraw], flush,
+        account NAME (Konto wechseln), accounts (alle Konten mit Kontostand),
+        schedule add deposit|withdraw BETRAG day|week|month [--every N] [--start DATUM],
+        schedule list, schedule remove NR, schedule run (fällige Daueraufträge buchen).
+        """
+        parts = line.split()
+        if not parts:
+            return []
+        command, args = parts[0].lower(), parts[1:]
+        try:
+            if command in ("deposit", "withdraw"):
+                if len(args) != 1:
+                    raise ValueError(f"usage: {command} AMOUNT")
+                record = self.ledger.post(command, args[0])
+                return [f"ok {record['new_balance']}"]
+            if command == "balance":
+                return [f"ok {format_cents(self.ledger.current_balance())} {self.currency}"]
+            if command == "history":
+                n, kind = 5, None
+                while args:
+                    option = args.pop(0)
+                    if option == "--last" and args:
+                        n = int(args.pop(0))
+                    elif option == "--type" and args and args[0] in ("deposit", "withdraw"):
+                        kind = args.pop(0)
+                    else:
+                        raise ValueError(f"invalid option {option!r}")
+                records = self.ledger.history(n, kind)
+                return [json.dumps(r, separators=(",", ":")) for r in records] + [f"ok {len(records)}"]
+            if command == "account":
+                if not args:
+                    raise ValueError("usage: account NAME")
+                self.switch_account(" ".join(args))
+                return [f"ok {self.ledger.name} {format_cents(self.ledger.current_balance())}"]
+            if command == "accounts":
+                self.ledger.flush()
+                rows = open_accounts().balances()
+                return [f"{name} {format_cents(balance)}" for name, balance in rows] + [f"ok {len(rows)}"]
+            if command == "flush":
+                self.ledger.flush()
+                return ["ok"]
+            if command == "schedule":
+                return self.schedule(args)
+            raise ValueError(f"unknown command {command!r}")
+        except (ValueError, LedgerBusyError, OSError) as e:
+            return [f"error {e}"]
+
+    def schedule(self, args):
+        """Befehl "schedule": Daueraufträge des aktiven Kontos anlegen, auflisten, löschen und buchen."""
+        action = args.pop(0) if args else None
+        if action == "add":
+            if len(args) < 3:
+                raise ValueError("usage: schedule add deposit|withdraw AMOUNT day|week|month [--every N] [--start DATE]")
+            kind, amount, unit = args[:3]
+            options = dict(zip(args[3::2], args[4::2]))
+            unknown = set(options).difference(("--every", "--start")) or len(args[3:]) % 2
+            if unknown:
+                raise ValueError(f"invalid options {' '.join(args[3:])!r}")
+            schedule_id = self.ledger.add_schedule(kind, amount, unit, int(options.get("--every", 1)),
+                                                   options.get("--start"))
+            return [f"ok {schedule_id}"]
+        if action == "list" and not args:
+            schedules = self.ledger.schedules()
+            return [json.dumps(s, separators=(",", ":")) for s in schedules] + [f"ok {len(schedules)}"]
+        if action == "remove" and len(args) == 1:
+            self.ledger.remove_schedule(int(args[0]))
+            return ["ok"]
+        if action == "run" and not args:
+            applied, skipped = self.ledger.apply_schedules()
+            return [f"ok {applied} {skipped}"]
+        raise ValueError("usage: schedule add|list|remove|run")
+
+def run_pipe(flush_interval=DEFAULT_FLUSH_INTERVAL):
+    """Liest Befehle zeilenweise von stdin und beantwortet sie auf stdout, bis "quit" oder EOF.
+
+    Läuft der Dienst, werden die Befehle an ihn weitergereicht. Sonst bucht die Sitzung im
+    Speicher und schreibt alle flush_interval Sekunden gesammelt (mit flush_interval=0 sofort).
+    Gesperrt ist das Konto nur von der ersten Buchung bis zum nächsten Schreiben, andere
+    Prozesse können also zwischendurch buchen.
+    """
+    buffered = flush_interval > 0
+    try:
+        session = LedgerSession(connect_ledger(buffered=buffered), lambda name: connect_ledger(name, buffered=buffered))
+    except LedgerBusyError as e:
+        print(f"error {e}")
+        sys.exit(1)
+    closed = threading.Event()
+
+    def flush_periodically():
+        while not closed.wait(flush_interval):
             try:
-                input_str = input("How much do you want to withdraw? ").replace(",", ".")
-                amount = float(input_str)
-                if amount > balance:
-                    print("Error: Not enough money in the piggy bank!")
+                session.ledger.flush()
+            except Exception as e:
+                print(f"error {e}", file=sys.stderr)
+
+    if buffered:
+        threading.Thread(target=flush_periodically, daemon=True).start()
+    try:
+        for line in sys.stdin:
+            if line.strip().lower() in ("quit", "exit"):
+                break
+            response = session.execute(line)
+            if response:
+                sys.stdout.write("\n".join(response) + "\n")
+                sys.stdout.flush()
+    finally:
+        closed.set()
+        session.close()
+
+def run_command(args):
+    """Führt einen einzelnen Befehl nicht-interaktiv aus, z.B. main.py --cli deposit 12.50."""
+    try:
+        session = LedgerSession(connect_ledger(), connect_ledger)
+    except LedgerBusyError as e:
+        print(f"error {e}")
+        return 1
+    response = session.execute(" ".join(args))
+    session.close()
+    print("\n".join(response))
+    return 0 if response and response[-1].startswith("ok") else 1
+
+def run_list_accounts():
+    """Gibt alle Konten mit Kontostand und die Gesamtsumme aus (aus der Kontenübersicht)."""
+    manager = open_accounts()
+    currency = settings_store.get('currency', '€')
+    for name, balance in manager.balances():
+        print(f"{name}: {format_cents(balance)}{currency}")
+    print(f"Total: {format_cents(manager.total())}{currency}")
+
+def configure_metrics():
+    """Schaltet die Messung ein, wenn die Einstellung "metrics" gesetzt oder --metrics angegeben ist."""
+    if "--metrics" in sys.argv or settings_store.get("metrics", False):
+        metrics.enable(
+            prometheus=settings_store.get("metrics_format", "json") == "prometheus",
+            interval=float(settings_store.get("metrics_interval", 60))
+        )
+
+def bucket_quantile(buckets, quantile):
+    """Schätzt ein Quantil aus einem Histogramm (Obergrenze des Buckets, in dem es liegt)."""
+    target = quantile * sum(buckets)
+    if not target:
+        return 0
+    cumulative = 0
+    for bound, count in zip(METRICS_BUCKETS_MS + (float("inf"),), buckets):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return float("inf")
+
+def run_stats():
+    """Gibt die aufsummierten Messwerte aus (Tabelle oder mit --prometheus im Prometheus-Format)."""
+    metrics.dump()
+    if "--reset" in sys.argv:
+        for path in (METRICS_FILE, os.path.splitext(METRICS_FILE)[0] + ".prom"):
+            if os.path.exists(path):
+                os.remove(path)
+        print("Metrics reset.")
+        return
+    totals = read_metrics()
+    if "--prometheus" in sys.argv:
+        sys.stdout.write(format_prometheus(totals))
+        return
+    if not totals:
+        print('No metrics recorded yet. Enable them with the setting "metrics" or --metrics.')
+        return
+    print(f"{'Path':<30} {'Calls':>9} {'Avg ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'Read':>12} {'Written':>12}")
+    for name, entry in sorted(totals.items()):
+        average = entry["sum_ms"] / entry["count"] if entry["count"] else 0.0
+        print(
+            f"{name:<30} {entry['count']:>9} {average:>9.3f} "
+            f"{bucket_quantile(entry['buckets'], 0.5):>8} {bucket_quantile(entry['buckets'], 0.99):>8} "
+            f"{entry['bytes_read']:>12} {entry['bytes_written']:>12}"
+        )
+
+def read_cached_balance(name=None):
+    """Liest den Kontostand aus dem Snapshot und den danach angehängten Zeilen des Journals.
+
+    Öffnet keine Ablage, nimmt keine Sperre und schreibt nichts. Gibt None zurück, wenn es
+    keinen passenden Snapshot gibt (SQLite-Ablage, neues oder noch nicht übernommenes Konto).
+    """
+    manager = open_accounts()
+    if manager.backend != "file":
+        return None
+    journal = FileStorage(manager.account_directory(name or current_account())).journal
+    snapshot = journal._read_snapshot()
+    if snapshot is None:
+        return None
+    log_size = os.path.getsize(journal.path) if os.path.exists(journal.path) else 0
+    if snapshot[1] > log_size:
+        return None
+    # Ein unvollständiger letzter Eintrag wird beim Nachspielen übersprungen
+    return journal._replay(*snapshot)[0]
+
+def run_balance():
+    """Gibt nur den Kontostand aus; der schnelle Weg für Skripte und cron."""
+    balance = read_cached_balance()
+    if balance is None:
+        try:
+            ledger = connect_ledger()
+            balance = ledger.current_balance()
+        except LedgerBusyError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        ledger.close()
+    print(format_cents(balance))
+
+def run_report(level="month", period=None):
+    """Gibt die Auswertung je Tag, Monat oder Jahr aus den vorberechneten Summen aus."""
+    connection = connect_daemon()
+    if connection is None:
+        # Öffnet das Konto, dabei werden fehlende Einträge in die Auswertungen übernommen
+        statistics = open_storage().statistics
+    else:
+        connection.close()
+        statistics = open_statistics()
+    currency = settings_store.get('currency', '€')
+    print(f"{'Period':<10} {'Deposits':>12} {'#':>6} {'Withdrawals':>12} {'#':>6} {'Net':>12} {'Balance':>12}")
+    for row in statistics.report(level, period):
+        print(
+            f"{row['period']:<10} {format_cents(row['deposits']):>12} {row['deposit_count']:>6} "
+            f"{format_cents(row['withdrawals']):>12} {row['withdraw_count']:>6} {format_cents(row['net']):>12} "
+            f"{format_cents(row['closing_balance']):>12}"
+        )
+    print(f"Amounts in {currency}.")
+
+def run_rebuild_statistics():
+    """Berechnet die Auswertungen des aktiven Kontos mit einem Durchlauf über den Verlauf neu."""
+    try:
+        ledger = Ledger(current_account(), hold_lock=True)
+    except LedgerBusyError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    start = time.perf_counter()
+    try:
+        count = ledger.storage.statistics.rebuild(ledger.storage.backend)
+    finally:
+        ledger.close()
+    print(f"Rebuilt statistics from {count} transactions in {time.perf_counter() - start:.2f}s.")
+
+def prepare_history():
+    """Öffnet das aktive Konto einmal, damit Übernahme und Reparatur vor dem Lesen erledigt sind.
+
+    Läuft der Dienst, hält er das Konto bereits offen und es wird nichts geöffnet.
+    """
+    connection = connect_daemon()
+    if connection is None:
+        open_storage()
+    else:
+        connection.close()
+
+def run_export():
+    """Exportiert den Verlauf des aktiven Kontos als CSV oder JSONL auf stdout oder in eine Datei.
+
+    Gelesen wird ohne Kontosperre (auch während der Dienst läuft); mit --xml stattdessen aus den
+    XML-Dateien älterer Versionen, beide Dateien zu einer Zeitleiste zusammengeführt.
+    """
+    args = strip_options(sys.argv[sys.argv.index("--export") + 1:])
+    fmt = args[0] if args and not args[0].startswith("--") else "csv"
+    start, end, output = get_option("--from"), get_option("--to"), get_option("--output")
+    try:
+        for day in (start, end):
+            if day is not None:
+                datetime.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        fmt = None
+    if fmt not in EXPORT_FORMATS:
+        print("Usage: main.py --export [csv|jsonl] [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--output FILE] [--xml]")
+        sys.exit(2)
+    if "--xml" in sys.argv:
+        xml_files = FileStorage(open_accounts().account_directory(current_account())).xml_files
+        records = (r for r in merge_xml_history(xml_files) if matches_filter(r, start=start, end=end))
+    else:
+        prepare_history()
+        records = open_history().timeline(start, end)
+    out = open(output, "w", encoding="utf-8", newline="", buffering=1 << 20) if output else sys.stdout
+    try:
+        count = export_history(records, out, fmt)
+        out.flush()
+    except BrokenPipeError:
+        # Leser vorzeitig beendet (z.B. "| head"): Rest verwerfen, ohne Fehler beim Beenden
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return
+    finally:
+        if output:
+            out.close()
+    if output:
+        print(f"Exported {count} transactions to {output}.")
+
+def run_verify():
+    """Prüft Hash-Kette und Kontostände des aktiven Kontos und gleicht sie mit der Kontenübersicht ab.
+
+    Ohne --full werden nur die Einträge seit der letzten fehlerfreien Prüfung geprüft (Stand in
+    verify.json im Kontoverzeichnis). --processes N legt die Zahl der Prüfprozesse fest.
+    """
+    try:
+        processes = int(get_option("--processes", 0)) or None
+    except ValueError:
+        print("Usage: main.py --verify [--full] [--processes N]")
+        sys.exit(2)
+    prepare_history()
+    manager = open_accounts()
+    name = current_account()
+    state_file = os.path.join(manager.account_directory(name), VERIFY_FILE)
+    state = None
+    if "--full" not in sys.argv:
+        try:
+            with open(state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+    backend = open_history(name)
+    start = time.perf_counter()
+    try:
+        result = verify_history(backend, state, processes)
+    finally:
+        backend.close()
+    elapsed = time.perf_counter() - start
+    errors = result["errors"]
+    stored = dict(manager.balances()).get(name)
+    if stored is not None and stored != result["balance"]:
+        errors.append(("summary.db", f"stored balance {format_cents(stored)} does not match "
+                                     f"the verified balance {format_cents(result['balance'])}"))
+    currency = settings_store.get('currency', '€')
+    print(f"Verified {result['checked']} of {result['count']} transactions in {result['chunks']} chunks "
+          f"with {result['processes']} processes in {elapsed:.2f}s.")
+    print(f"Chain head: {result['head']}  Balance: {format_cents(result['balance'])}{currency}")
+    if result["unchained"]:
+        print(f"{result['unchained']} transactions were recorded before the hash chain was introduced.")
+    if errors:
+        for position, message in errors:
+            print(f"{position}: {message}", file=sys.stderr)
+        print(f"FAILED: {len(errors)} problems found.")
+        sys.exit(1)
+    if result["state"] is not None:
+        tmp_file = f"{state_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(result["state"], f)
+        os.replace(tmp_file, state_file)
+    print("OK")
+
+def run_rotate():
+    """Archiviert abgeschlossene Monate des aktiven Kontos sofort und listet das Archiv mit Checkpoints auf."""
+    try:
+        ledger = Ledger(current_account(), hold_lock=True)
+    except LedgerBusyError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    try:
+        rotated = ledger.storage.rotate()
+        segments = ledger.storage.archive_segments()
+    finally:
+        ledger.close()
+    currency = settings_store.get('currency', '€')
+    if rotated:
+        print(f"Archived {rotated} transactions.")
+    for segment in segments:
+        print(f"{segment['file']:<22} {segment['count']:>8} transactions  "
+              f"+{format_cents(to_cents(segment['deposits']))}{currency} ({segment['deposit_count']})  "
+              f"-{format_cents(to_cents(segment['withdrawals']))}{currency} ({segment['withdraw_count']})  "
+              f"closing balance {format_cents(to_cents(segment['closing_balance']))}{currency}")
+    print(f"Archive: {sum(segment['count'] for segment in segments)} transactions in {len(segments)} segments.")
+
+# Optionen, die für alle Modi gelten und hinter --cli nicht als Befehl zählen
+GLOBAL_OPTIONS = ("--account", "--storage", "--durability")
+GLOBAL_FLAGS = ("--metrics",)
+
+def strip_options(args):
+    """Entfernt die globalen Optionen samt Wert aus einer Argumentliste."""
+    result = []
+    args = iter(args)
+    for arg in args:
+        if arg in GLOBAL_OPTIONS:
+            next(args, None)
+        elif arg not in GLOBAL_FLAGS:
+            result.append(arg)
+    return result
+
+def get_option(name, default=None):
+    """Gibt den Wert hinter einer Kommandozeilen-Option zurück (z.B. --flush-interval 0.5)."""
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
+
+# --- Ledger daemon ---
+
+SOCKET_FILE = os.path.join(BASE_DIR, "spardose.sock")
+# Nach so vielen Sekunden ohne Zugriff gibt der Dienst ein Konto wieder frei
+DAEMON_IDLE_SECONDS = 300
+
+def connect_daemon(path=SOCKET_FILE):
+    """Verbindet mit dem laufenden Dienst und gibt den Socket zurück, sonst None."""
+    if not os.path.exists(path):
+        return None
+    import socket
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+class RemoteLedger:
+    """Bucht über den Dienst; bietet dieselben Methoden wie Ledger."""
+
+    def __init__(self, name, connection):
+        self.name = name
+        self.connection = connection
+        self.file = connection.makefile("rwb")
+        self.lock = threading.Lock()
+        self.balance = 0
+        self._request(f"account {name}")
+
+    def _request(self, line):
+        """Sendet einen Befehl und gibt (Datenzeilen, letzte Zeile ohne "ok ") zurück."""
+        with self.lock:
+            self.file.write(line.encode("utf-8") + b"\n")
+            self.file.flush()
+            lines = []
+            while True:
+                response = self.file.readline()
+                if not response:
+                    raise OSError("connection to the ledger daemon lost")
+                response = response.decode("utf-8").rstrip("\n")
+                if response.startswith("error"):
+                    message = response[6:]
+                    if message.startswith("not enough money"):
+                        raise InsufficientFundsError(message)
+                    if message.startswith("account is locked"):
+                        raise LedgerBusyError(message)
+                    raise ValueError(message)
+                if response == "ok" or response.startswith("ok "):
+                    return lines, response[3:]
+                lines.append(response)
+
+    def post(self, kind, amount, timestamp=None):
+        amount = parse_amount(amount)
+        with metrics.timer(f"record_{kind}_transaction"):
+            _, new_balance = self._request(f"{kind} {format_cents(amount)}")
+        self.balance = to_cents(new_balance)
+        return make_record(kind, amount, self.balance, timestamp)
+
+    def deposit(self, amount):
+        return self.post("deposit", amount)
+
+    def withdraw(self, amount):
+        return self.post("withdraw", amount)
+
+    def current_balance(self):
+        _, result = self._request("balance")
+        self.balance = to_cents(result.split()[0])
+        return self.balance
+
+    def history(self, n, kind=None):
+        command = f"history --last {n}" + (f" --type {kind}" if kind else "")
+        lines, _ = self._request(command)
+        return [json.loads(line) for line in lines]
+
+    def flush(self):
+        self._request("flush")
+
+    def schedules(self):
+        lines, _ = self._request("schedule list")
+        return [json.loads(line) for line in lines]
+
+    def add_schedule(self, kind, amount, unit, interval=1, start=None):
+        command = f"schedule add {kind} {format_cents(parse_amount(amount))} {unit} --every {int(interval)}"
+        if start is not None:
+            command += f" --start {start.isoformat() if isinstance(start, datetime) else start}"
+        _, schedule_id = self._request(command)
+        return int(schedule_id)
+
+    def remove_schedule(self, schedule_id):
+        self._request(f"schedule remove {int(schedule_id)}")
+
+    def apply_schedules(self):
+        _, result = self._request("schedule run")
+        applied, skipped = result.split()
+        return int(applied), int(skipped)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+            self.connection.close()
+
+
+class LedgerDaemon:
+    """Lokaler Dienst, der alle Konten als einziger Schreiber hält (asyncio über einen Unix-Socket).
+
+    Clients sprechen das Protokoll der Skriptsteuerung. Die Konten werden mit dauerhafter Sperre
+    geöffnet, Buchungen im Speicher nacheinander geprüft und gesammelt geschrieben: Alle
+    Buchungen, die bis zum nächsten Durchlauf der Ereignisschleife (bzw. innerhalb von
+    commit_delay Sekunden) eintreffen, landen in einem gemeinsamen Schreibzugriff. Bestätigt
+    wird eine Buchung erst, wenn dieser Schreibzugriff erledigt ist; jeder Client erhält dabei
+    nur das Ergebnis für das Konto, auf das er gebucht hat.
+
+    Hält ein anderer Prozess (--cli, --pipe) ein Konto gesperrt, wird nicht gewartet: Befehle
+    für dieses Konto werden mit "error" beantwortet, die Ereignisschleife läuft weiter.
+
+    Offen bleiben höchstens max_open Konten wie im AccountManager; das am längsten unbenutzte
+    und jedes, das DAEMON_IDLE_SECONDS lang nicht benutzt wurde, wird geschlossen und seine
+    Sperre freigegeben (bei Bedarf wird es wieder geöffnet).
+
+    Solange der Dienst läuft, bucht er auch die Daueraufträge aller Konten (ScheduleTimer auf
+    der Ereignisschleife); beim Start werden verpasste Termine je Konto gesammelt nachgeholt.
+    """
+
+    def __init__(self, path=SOCKET_FILE, commit_delay=0.0):
+        self.path = path
+        self.commit_delay = commit_delay
+        self.ledgers = OrderedDict()
+        self.last_used = {}
+        # Je Konto die Future des nächsten Schreibzugriffs
+        self.commit_futures = {}
+        self.schedule_timer = None
+        self.idle_handle = None
+
+    def apply_schedules(self, name):
+        """Bucht die fälligen Daueraufträge eines Kontos (vom ScheduleTimer aufgerufen)."""
+        try:
+            applied, skipped = self.open_ledger(name).apply_schedules()
+        except Exception as e:
+            # Kein refresh(): Erneut versucht wird beim nächsten regulären Weckruf
+            print(f"Standing orders of {name} failed: {e}", file=sys.stderr)
+            return
+        else:
+            if applied or skipped:
+                print(f"Standing orders of {name}: {applied} transactions booked, {skipped} skipped.", flush=True)
+        self.schedule_timer.refresh(name)
+
+    def open_ledger(self, name):
+        name = account_name(name)
+        ledger = self.ledgers.get(name)
+        if ledger is None:
+            # Ohne Warten sperren, sonst stünde die Ereignisschleife bis zu LOCK_TIMEOUT still
+            ledger = self.ledgers[name] = Ledger(name, hold_lock=True, lock_timeout=0)
+        self.ledgers.move_to_end(name)
+        self.last_used[name] = time.monotonic()
+        while len(self.ledgers) > open_accounts().max_open:
+            self.close_ledger(next(iter(self.ledgers)))
+        return ledger
+
+    def close_ledger(self, name):
+        """Schreibt offene Buchungen eines Kontos, schließt es und gibt seine Sperre frei."""
+        ledger = self.ledgers.pop(name)
+        self.last_used.pop(name, None)
+        future = self.commit_futures.pop(name, None)
+        try:
+            ledger.close()
+        except Exception as e:
+            print(f"Closing {name} failed: {e}", file=sys.stderr)
+            if future is not None:
+                future.set_exception(e)
+        else:
+            if future is not None:
+                future.set_result(None)
+
+    def close_idle(self):
+        """Schließt alle Konten, die länger als DAEMON_IDLE_SECONDS unbenutzt sind; plant sich neu ein."""
+        import asyncio
+        deadline = time.monotonic() - DAEMON_IDLE_SECONDS
+        for name in [name for name, used in self.last_used.items() if used < deadline]:
+            self.close_ledger(name)
+        self.idle_handle = asyncio.get_running_loop().call_later(DAEMON_IDLE_SECONDS / 2, self.close_idle)
+
+    async def commit(self, name):
+        """Wartet auf den nächsten gemeinsamen Schreibzugriff und gibt dessen Ergebnis für das Konto name weiter."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if not self.commit_futures:
+            loop.call_later(self.commit_delay, self._commit)
+        future = self.commit_futures.get(name)
+        if future is None:
+            future = self.commit_futures[name] = loop.create_future()
+        await asyncio.shield(future)
+
+    def _commit(self):
+        futures, self.commit_futures = self.commit_futures, {}
+        for name, future in futures.items():
+            try:
+                self.ledgers[name].flush()
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+    async def handle_client(self, reader, writer):
+        session = LedgerSession(None, self.open_ledger)
+        account = current_account()
+        # Der Dienst hält die Ledger offen; beim Kontowechsel eines Clients wird nichts geschlossen
+        session.switch_account = lambda name: setattr(session, "ledger", self.open_ledger(name))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8")
+                if line.strip().lower() in ("quit", "exit"):
+                    break
+                # Das Konto der Sitzung kann inzwischen als unbenutzt geschlossen worden sein
+                try:
+                    session.ledger = self.open_ledger(account)
+                except (ValueError, LedgerBusyError, OSError) as e:
+                    response = [f"error {e}"]
                 else:
-                    balance -= amount
-                    save_balance(balance)
-                    currency = load_settings().get('currency', '€')
-                    print(f"{amount:.2f}{currency} withdrawn. New balance: {balance:.2f}{currency}")
-                    record_withdraw_transaction(amount, balance)
-            except ValueError:
-                print("Invalid input, please try again.")
-        elif choice == "3":
-            currency = load_settings().get('currency', '€')
-            print(f"Current balance: {balance:.2f}{currency}")
-        elif choice == "4":
-            print("Exiting the program.")
-            break
+                    response = session.execute(line)
+                    account = session.ledger.name
+                    if line.split()[:1] == ["schedule"]:
+                        self.schedule_timer.watch(account)
+                    if session.ledger.pending:
+                        try:
+                            await self.commit(account)
+                        except Exception as e:
+                            response = [f"error {e}"]
+                if response:
+                    writer.write(("\n".join(response) + "\n").encode("utf-8"))
+                    await writer.drain()
+        except (ConnectionError, UnicodeDecodeError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        import asyncio
+        import signal
+        if connect_daemon(self.path) is not None:
+            raise LedgerBusyError("the ledger daemon is already running")
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        print(f"Ledger daemon listening on {self.path}")
+        self.schedule_timer = ScheduleTimer(loop.call_later, lambda handle: handle.cancel(), self.apply_schedules)
+        manager = open_accounts()
+        for name in {name for name, _ in manager.balances()} | {current_account()}:
+            if os.path.exists(schedule_file(name)):
+                self.schedule_timer.watch(name)
+        self.idle_handle = loop.call_later(DAEMON_IDLE_SECONDS / 2, self.close_idle)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            self.schedule_timer.close()
+            self.idle_handle.cancel()
+            for name in list(self.ledgers):
+                self.close_ledger(name)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+def run_daemon():
+    """Startet den Dienst, bis er mit Strg+C bzw. SIGTERM beendet wird."""
+    import asyncio
+    if not hasattr(asyncio, "start_unix_server"):
+        print("The ledger daemon needs Unix domain sockets, which are not available on this system.")
+        sys.exit(1)
+    commit_delay = float(get_option("--commit-delay", 0)) / 1000
+    try:
+        asyncio.run(LedgerDaemon(commit_delay=commit_delay).serve())
+    except LedgerBusyError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+# --- Import ---
+
+IMPORT_BATCH_SIZE = 10000
+
+def parse_import_rows(path):
+    """Liest die Zeilen einer CSV- oder JSONL-Importdatei nacheinander ein.
+
+    Liefert (Zeilennummer, Typ, Betrag-Text, Zeitstempel) je Zeile. CSV-Dateien brauchen eine
+    Kopfzeile mit den Spalten "type" und "amount", "timestamp" ist optional.
+    """
+    import csv
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith((".jsonl", ".json")):
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = {}
+                if not isinstance(row, dict):
+                    row = {}
+                yield line_no, row.get("type"), row.get("amount"), row.get("timestamp")
         else:
-            print("Invalid input, please try again.")
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row.get("type"), row.get("amount"), row.get("timestamp")
 
-if __name__ == "__main__":
+def import_transactions(ledger, path, batch_size=IMPORT_BATCH_SIZE, on_error=None):
+    """Importiert Ein- und Auszahlungen aus einer Datei in Stapeln.
+
+    Jede Zeile wird geprüft (Typ, positiver Betrag, gültiger Zeitstempel, genug Guthaben für
+    Auszahlungen beim laufenden Kontostand). Fehlerhafte Zeilen werden übersprungen und an
+    on_error(Zeilennummer, Meldung) gemeldet. Der Ledger muss die Kontosperre halten; pro
+    Stapel wird das Journal einmal geschrieben, am Ende ein Snapshot des Kontostands.
+
+    Gibt (importierte Zeilen, abgelehnte Zeilen, neuer Kontostand) zurück.
+    """
+    imported = 0
+    rejected = 0
+    for line_no, kind, amount_str, timestamp in parse_import_rows(path):
+        try:
+            if kind not in ("deposit", "withdraw"):
+                raise ValueError(f"unknown type {kind!r}")
+            if timestamp:
+                datetime.fromisoformat(timestamp)
+            ledger.post(kind, amount_str, timestamp or None)
+        except (TypeError, ValueError) as e:
+            rejected += 1
+            if on_error:
+                on_error(line_no, str(e))
+            continue
+        imported += 1
+        if len(ledger.pending) >= batch_size:
+            ledger.flush()
+    ledger.flush()
+    if imported:
+        ledger.storage.checkpoint(ledger.balance)
+    return imported, rejected, ledger.balance
+
+def run_import(path):
+    """Startet den Bulk-Import und gibt Ergebnis und Durchsatz aus."""
+    try:
+        ledger = Ledger(current_account(), hold_lock=True)
+    except LedgerBusyError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    errors_shown = []
+
+    def report_error(line_no, message):
+        if len(errors_shown) < 10:
+            print(f"Line {line_no}: {message}", file=sys.stderr)
+        errors_shown.append(line_no)
+
+    start = time.perf_counter()
+    try:
+        imported, rejected, balance = import_transactions(ledger, path, on_error=report_error)
+    finally:
+        ledger.close()
+    elapsed = time.perf_counter() - start
+    rate = (imported + rejected) / elapsed if elapsed > 0 else 0.0
+    currency = settings_store.get('currency', '€')
+    print(f"Imported {imported} transactions ({rejected} rejected) in {elapsed:.2f}s ({rate:.0f} rows/s).")
+    print(f"New balance: {format_cents(balance)}{currency}")
+
+def check_global_options():
+    """Prüft die globalen Optionen, bevor ein Modus startet; bei ungültigen Werten Fehlermeldung und Ende."""
+    try:
+        manager = open_accounts()
+    except ValueError as e:
+        print(f"Error: {e} (--storage: {', '.join(STORAGE_BACKENDS)}; --durability: {', '.join(DURABILITY_MODES)})")
+        sys.exit(2)
+    try:
+        manager.account_directory(current_account())
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+
+def main():
+    """Wählt den Modus anhand der Kommandozeile."""
+    configure_metrics()
+    check_global_options()
     # Startet den CLI-Modus, falls "--cli" als Argument übergeben wird, ansonsten den GUI-Modus.
-    if "--cli" in sys.argv:
+    # "--export-xml" schreibt den Verlauf zusätzlich im alten XML-Format.
+    # "--import DATEI" importiert Ein- und Auszahlungen aus einer CSV- oder JSONL-Datei.
+    # "--pipe" liest Befehle zeilenweise von stdin, "--cli BEFEHL ..." führt einen einzelnen Befehl aus.
+    # "--account NAME" wählt das Konto, "--accounts" listet alle Konten mit Kontostand.
+    # "--daemon" startet den lokalen Dienst, über den GUI und CLI dann gemeinsam buchen.
+    # "--cli schedule add|list|remove|run" verwaltet Daueraufträge (gebucht von GUI, Dienst oder "run").
+    # "--report [day|month|year] [ZEITRAUM]" gibt die Auswertung aus, "--rebuild-stats" berechnet sie neu.
+    # "--export [csv|jsonl] [--from DATUM] [--to DATUM] [--output DATEI] [--xml]" exportiert den Verlauf.
+    # "--rotate" archiviert abgeschlossene Monate sofort und listet das Archiv auf.
+    # "--verify [--full] [--processes N]" prüft Hash-Kette und Kontostände des Verlaufs.
+    # "--balance" gibt nur den Kontostand aus (aus dem Snapshot, ohne das Konto zu öffnen).
+    # "--metrics" misst die I/O-Pfade, "--stats [--prometheus|--reset]" zeigt die Messwerte.
+    if "--stats" in sys.argv:
+        run_stats()
+    elif "--balance" in sys.argv:
+        run_balance()
+    elif "--import" in sys.argv:
+        path = get_option("--import")
+        if path is None:
+            print("Usage: main.py --import FILE")
+            sys.exit(2)
+        run_import(path)
+    elif "--export-xml" in sys.argv:
+        export_history_xml()
+    elif "--export" in sys.argv:
+        run_export()
+    elif "--daemon" in sys.argv:
+        run_daemon()
+    elif "--rebuild-stats" in sys.argv:
+        run_rebuild_statistics()
+    elif "--rotate" in sys.argv:
+        run_rotate()
+    elif "--verify" in sys.argv:
+        run_verify()
+    elif "--report" in sys.argv:
+        args = strip_options(sys.argv[sys.argv.index("--report") + 1:])
+        level = args[0] if args else "month"
+        if level not in STATISTICS_LEVELS:
+            print("Usage: main.py --report [day|month|year] [PERIOD]")
+            sys.exit(2)
+        run_report(level, args[1] if len(args) > 1 else None)
+    elif "--accounts" in sys.argv:
+        run_list_accounts()
+    elif "--pipe" in sys.argv:
+        run_pipe(float(get_option("--flush-interval", DEFAULT_FLUSH_INTERVAL)))
+    elif "--cli" in sys.argv:
+        args = strip_options(sys.argv[sys.argv.index("--cli") + 1:])
+        if args:
+            sys.exit(run_command(args))
         run_cli()
     else:
         run_gui()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,547 @@
+"""Regressionstests für die Buchungswege (GUI, Dienst-Client) in einer Kopie von main.py.
+
+Jeder Test lädt main.py aus einem eigenen temporären Verzeichnis, die eigenen Daten bleiben
+unberührt. Aufruf: python -m pytest tests
+"""
+
+import importlib.util
+import os
+import shutil
+import socket
+import sys
+import threading
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    """Lädt main.py als eigenes Modul mit tmp_path als Programmverzeichnis."""
+    shutil.copy(os.path.join(ROOT, "main.py"), tmp_path)
+    monkeypatch.setattr(sys, "argv", [str(tmp_path / "main.py")])
+    spec = importlib.util.spec_from_file_location(f"spardose_{tmp_path.name}", tmp_path / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module
+    if module.accounts is not None:
+        module.accounts.close()
+
+
+class Entry:
+    """Eingabefeld der GUI mit festem Text."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def get(self):
+        return self.text
+
+    def delete(self, *args):
+        self.text = ""
+
+
+class ImmediateWorker:
+    """PersistenceWorker, der Aufträge sofort im aufrufenden Thread ausführt."""
+
+    def submit(self, func, on_done=None, on_error=None):
+        try:
+            result = func()
+        except Exception as e:
+            on_error(e)
+        else:
+            on_done(result)
+
+
+def make_app(main, monkeypatch, ledger, text):
+    """Baut eine PiggyBankApp ohne Fenster, die über ledger bucht."""
+    monkeypatch.setattr(main, "tk", types.SimpleNamespace(END="end"))
+    app = main.PiggyBankApp.__new__(main.PiggyBankApp)
+    app.ledger = ledger
+    app.worker = ImmediateWorker()
+    app.amount_entry = Entry(text)
+    app.booked = []
+    app.errors = []
+    app.on_transaction_done = app.booked.append
+    app.on_persist_error = app.errors.append
+    return app
+
+
+def serve_session(main, connection):
+    """Beantwortet Protokollbefehle auf connection wie der Dienst (in einem eigenen Thread)."""
+    session = main.LedgerSession(main.Ledger(main.DEFAULT_ACCOUNT), main.Ledger)
+
+    def serve():
+        with connection.makefile("rwb") as f:
+            for line in f:
+                f.write(("\n".join(session.execute(line.decode("utf-8"))) + "\n").encode("utf-8"))
+                f.flush()
+        session.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_gui_deposit_books_entered_amount(main, monkeypatch):
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT)
+    app = make_app(main, monkeypatch, ledger, "12.50")
+    app.submit_transaction("deposit")
+    assert app.errors == []
+    assert app.booked[0]["amount"] == "12.50"
+    assert ledger.current_balance() == 1250
+    ledger.close()
+
+
+def test_gui_rejects_invalid_amount(main, monkeypatch):
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT)
+    app = make_app(main, monkeypatch, ledger, "abc")
+    app.submit_transaction("deposit")
+    assert isinstance(app.errors[0], ValueError)
+    assert ledger.current_balance() == 0
+    ledger.close()
+
+
+def test_gui_deposit_through_daemon_client(main, monkeypatch):
+    client, server = socket.socketpair()
+    thread = serve_session(main, server)
+    remote = main.RemoteLedger(main.DEFAULT_ACCOUNT, client)
+    app = make_app(main, monkeypatch, remote, "12,50")
+    app.submit_transaction("deposit")
+    assert app.errors == []
+    assert app.booked[0]["amount"] == "12.50"
+    assert remote.current_balance() == 1250
+    remote.withdraw("0.50")
+    assert remote.current_balance() == 1200
+    remote.close()
+    thread.join(5)
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT)
+    assert ledger.current_balance() == 1200
+    ledger.close()
+
+
+def test_oversized_amount_is_rejected_before_writing(main):
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT)
+    ledger.deposit("10.00")
+    for amount in ("1e20", "1000000000000.01"):
+        with pytest.raises(ValueError):
+            ledger.deposit(amount)
+    ledger.deposit(f"{main.MAX_CENTS // 100 - 10}.00")
+    with pytest.raises(ValueError):
+        ledger.deposit("0.01")
+    assert ledger.current_balance() == main.MAX_CENTS
+    ledger.withdraw("1.00")
+    assert ledger.current_balance() == main.MAX_CENTS - 100
+    ledger.close()
+
+
+def test_invalid_records_are_rejected_before_writing(main):
+    storage = main.open_storage()
+    record = main.make_record("deposit", 100, 100)
+    with pytest.raises(ValueError):
+        storage.append([record, dict(record, type="bonus")])
+    with pytest.raises(ValueError):
+        storage.append([dict(record, amount="abc")])
+    assert storage.count() == 0
+    assert storage.statistics.count() == 0
+
+
+def test_statistics_failure_does_not_break_booking(main, monkeypatch, capsys):
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT)
+    statistics = ledger.storage.statistics
+
+    def broken(records, aggregate=None):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(statistics, "add", broken)
+    ledger.deposit("5.00")
+    assert "behind" in capsys.readouterr().err
+    assert ledger.current_balance() == 500
+    assert statistics.count() == 0
+    monkeypatch.undo()
+    ledger.deposit("1.00")
+    assert statistics.count() == ledger.storage.count() == 2
+    assert statistics.report("year")[0]["deposits"] == 600
+    ledger.close()
+
+
+def filled_storage(main, backend):
+    """Ablage mit 450 Einträgen aus zwei Monaten; bei der Dateiablage liegt der erste im Archiv."""
+    storage = main.STORAGE_BACKENDS[backend](main.open_accounts().account_directory(main.DEFAULT_ACCOUNT))
+    storage.open()
+    balance, records = 0, []
+    for i in range(450):
+        balance += i
+        records.append(main.make_record("deposit", i, balance, f"2024-0{1 + i // 300}-{1 + i % 28:02d}T10:00:00"))
+    storage.append(records)
+    if backend == "file":
+        assert storage.rotate(main.datetime(2024, 2, 15)) == 300
+    return storage, records
+
+
+@pytest.mark.parametrize("backend", ["file", "sqlite"])
+def test_history_filter_pages_from_marks(main, backend):
+    storage, records = filled_storage(main, backend)
+    browser = main.HistoryBrowser.__new__(main.HistoryBrowser)
+    browser.storage = storage
+    browser.first = 0
+    criteria = (100, None, None, None)
+    marks, total = browser.scan(criteria, main.threading.Event())
+    expected = [record for record in records if main.to_cents(record["amount"]) >= 100]
+    assert total == len(expected) == 350
+    assert len(marks) == 4
+    shown = []
+    for number in range(4):
+        page = browser.load_page(number, criteria, marks, total, 0, main.threading.Event())
+        shown.extend((record["amount"], record["timestamp"]) for record in page)
+    assert shown == [(record["amount"], record["timestamp"]) for record in reversed(expected)]
+    cancel = main.threading.Event()
+    cancel.set()
+    assert browser.scan(criteria, cancel) is None
+    storage.close()
+
+
+def test_tail_decompresses_archive_once(main, monkeypatch):
+    storage, records = filled_storage(main, "file")
+    calls = []
+    iter_segment = storage._iter_segment
+    monkeypatch.setattr(storage, "_iter_segment", lambda segment: calls.append(segment) or iter_segment(segment))
+    assert storage.tail("deposit", 200) == records[-200:]
+    assert storage.tail("deposit", 160) == records[-160:]
+    assert storage.tail(None, 200) == records[-200:]
+    assert len(calls) == 2
+    storage.rotate(main.datetime(2024, 3, 15))
+    assert storage.tail("deposit", 200) == records[-200:]
+    storage.close()
+
+
+@pytest.mark.parametrize("backend", ["file", "sqlite"])
+def test_timeline_is_chronological(main, backend):
+    storage, records = filled_storage(main, backend)
+    # Rückdatiert, teils in bereits archivierte Monate, teils mit gleichem Zeitstempel
+    balance = main.to_cents(records[-1]["new_balance"])
+    late = []
+    for timestamp in ("2024-01-03T09:00:00", "2024-02-01T10:00:00", "2023-12-31T23:00:00", "2024-02-10T08:00:00"):
+        balance += 1
+        late.append(main.make_record("deposit", 1, balance, timestamp))
+    storage.append(late)
+    expected = sorted(records + late, key=lambda record: record["timestamp"])
+    key = lambda record: (record["timestamp"], record["new_balance"])
+    assert list(map(key, storage.timeline())) == list(map(key, expected))
+    window = [record for record in expected if "2024-01-28" <= record["timestamp"][:10] <= "2024-02-01"]
+    assert list(map(key, storage.timeline("2024-01-28", "2024-02-01"))) == list(map(key, window))
+    storage.close()
+
+
+def statistics_rows(statistics):
+    db = statistics._db()
+    return (
+        db.execute("SELECT * FROM rollups ORDER BY level, period, type").fetchall(),
+        db.execute("SELECT * FROM closing_balances ORDER BY day").fetchall()
+    )
+
+
+def test_backdated_statistics_match_rebuild(main):
+    storage = main.open_storage()
+    balance = 0
+    for timestamp, kind, amount in (
+        ("2024-03-01T10:00:00", "deposit", 500), ("2024-03-05T10:00:00", "withdraw", 200),
+        ("2024-02-20T10:00:00", "deposit", 1000), ("2024-03-05T09:00:00", "deposit", 50),
+        ("2024-01-01T00:00:00", "withdraw", 100), ("2024-03-09T10:00:00", "deposit", 1),
+    ):
+        balance += amount if kind == "deposit" else -amount
+        storage.append([main.make_record(kind, amount, balance, timestamp)])
+    incremental = statistics_rows(storage.statistics)
+    assert incremental[1] == [("2024-01-01", -100), ("2024-02-20", 900), ("2024-03-01", 1400),
+                              ("2024-03-05", 1250), ("2024-03-09", 1251)]
+    storage.statistics.rebuild(storage.backend)
+    assert statistics_rows(storage.statistics) == incremental
+    assert storage.statistics.report("month", "2024-02")[0]["closing_balance"] == 900
+
+
+def test_schedules_are_not_booked_twice_after_crash(main, monkeypatch):
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT)
+    ledger.add_schedule("deposit", "5", "day", start="2024-01-01")
+    ledger.add_schedule("withdraw", "20", "week", start="2024-01-01")
+    save_schedules = main.save_schedules
+
+    def crash(path, state):
+        if ledger.storage.count():
+            raise KeyboardInterrupt
+        save_schedules(path, state)
+
+    # Abbruch zwischen dem Schreiben der Buchungen und dem Stand der Aufträge
+    monkeypatch.setattr(main, "save_schedules", crash)
+    with pytest.raises(KeyboardInterrupt):
+        ledger.apply_schedules(main.datetime(2024, 1, 10))
+    assert ledger.storage.count() == 11
+    monkeypatch.setattr(main, "save_schedules", save_schedules)
+    ledger.deposit("1.00")
+    assert ledger.apply_schedules(main.datetime(2024, 1, 10)) == (0, 0)
+    assert ledger.apply_schedules(main.datetime(2024, 1, 12)) == (2, 0)
+    assert ledger.storage.count() == 14
+    assert [(s["done"], s["skipped"]) for s in ledger.schedules()] == [(12, 0), (2, 1)]
+    assert ledger.current_balance() == 6100 - 2000
+    ledger.close()
+
+
+def test_schedules_of_older_versions_are_read(main):
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT)
+    schedule = dict(main.make_schedule("deposit", "5", "day", start="2024-01-01"), id=1)
+    main.save_schedules(ledger.schedule_file, [schedule])
+    assert ledger.apply_schedules(main.datetime(2024, 1, 2)) == (2, 0)
+    assert main.load_schedules(ledger.schedule_file)["position"] == 2
+    ledger.close()
+
+
+def test_daemon_reports_each_ledgers_own_commit_result(main, monkeypatch):
+    import asyncio
+    daemon = main.LedgerDaemon()
+
+    def broken_flush():
+        raise OSError("disk full")
+
+    async def run():
+        good, bad = daemon.open_ledger("good"), daemon.open_ledger("bad")
+        good.deposit("1.00")
+        bad.deposit("2.00")
+        monkeypatch.setattr(bad, "flush", broken_flush)
+        return await asyncio.gather(daemon.commit("good"), daemon.commit("bad"), return_exceptions=True)
+
+    good_result, bad_result = asyncio.run(run())
+    assert good_result is None
+    assert isinstance(bad_result, OSError)
+    monkeypatch.undo()
+    for name in list(daemon.ledgers):
+        daemon.close_ledger(name)
+    assert main.Ledger("good").current_balance() == 100
+
+
+def test_daemon_does_not_wait_for_a_locked_account(main):
+    lock = main.FileLock(main.open_accounts().file_lock("kid").path).acquire()
+    daemon = main.LedgerDaemon()
+    start = main.time.monotonic()
+    with pytest.raises(main.LedgerBusyError):
+        daemon.open_ledger("kid")
+    assert main.time.monotonic() - start < 1
+    assert "kid" not in daemon.ledgers
+    lock.release()
+    daemon.open_ledger("kid").deposit("1.00")
+    daemon.close_ledger("kid")
+
+
+def test_account_names_are_normalized_everywhere(main):
+    padded, plain = main.Ledger(" kid "), main.Ledger("kid")
+    assert padded.name == "kid"
+    assert padded.file_lock is plain.file_lock
+    assert padded.schedule_file == plain.schedule_file
+    padded.deposit("1.00")
+    plain.deposit("2.00")
+    assert padded.current_balance() == plain.current_balance() == 300
+    for name in ("", "  ", ".", " .. "):
+        with pytest.raises(ValueError):
+            main.open_accounts().account_directory(name)
+    padded.close()
+    plain.close()
+
+
+class QueuedWorker(ImmediateWorker):
+    """PersistenceWorker, der Aufträge erst bei run() ausführt (wie der Hintergrund-Thread)."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, func, on_done=None, on_error=None):
+        self.jobs.append((func, on_done or (lambda result: None), on_error))
+
+    def run(self):
+        while self.jobs:
+            ImmediateWorker.submit(self, *self.jobs.pop(0))
+
+
+def test_gui_switches_account_and_reloads_in_the_worker(main, monkeypatch):
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT)
+    app = make_app(main, monkeypatch, ledger, "3.00")
+    app.worker = QueuedWorker()
+    app.recent = {"deposit": main.deque(maxlen=5), "withdraw": main.deque(maxlen=5)}
+    app.schedule_timer = None
+    app.language, app.settings = "en", main.settings_store
+    app.master = types.SimpleNamespace(after=lambda delay, callback: None, after_cancel=lambda handle: None)
+    app.update_title = app.update_balance_label = app.render_history = lambda: None
+    monkeypatch.setattr(main, "simpledialog", types.SimpleNamespace(askstring=lambda *args: " kid "), raising=False)
+    app.submit_transaction("deposit")
+    app.switch_account()
+    # Bis der Hintergrund-Thread läuft, bleibt die Oberfläche beim alten Konto
+    assert app.ledger is ledger
+    app.worker.run()
+    assert app.ledger.name == "kid"
+    assert ledger.current_balance() == 300
+    assert app.balance == 0 and list(app.recent["deposit"]) == []
+    app.amount_entry = Entry("3.00")
+    app.submit_transaction("deposit")
+    app.update_history()
+    app.worker.run()
+    assert app.balance == 300
+    assert [record["amount"] for record in app.recent["deposit"]] == ["3.00"]
+    app.ledger.close()
+
+
+def test_history_page_is_requested_again_after_a_read_error(main, monkeypatch):
+    storage, records = filled_storage(main, "sqlite")
+    browser = main.HistoryBrowser.__new__(main.HistoryBrowser)
+    browser.app = types.SimpleNamespace(get_text=lambda key: key)
+    browser.storage, browser.reader = storage, QueuedWorker()
+    browser.pages, browser.requested = main.OrderedDict(), set()
+    browser.generation, browser.first, browser.total = 0, 0, len(records)
+    browser.criteria = browser.marks = None
+    browser.cancel = main.threading.Event()
+    browser.status_label = types.SimpleNamespace(config=lambda text: setattr(browser, "status", text))
+    browser.render = lambda: None
+    page = storage.page
+
+    def broken(start, n):
+        raise OSError("read failed")
+
+    monkeypatch.setattr(storage, "page", broken)
+    browser.request_page(0)
+    browser.reader.run()
+    assert browser.requested == set() and "read failed" in browser.status
+    monkeypatch.setattr(storage, "page", page)
+    browser.request_page(0)
+    browser.reader.run()
+    assert browser.pages[0][0]["amount"] == records[-1]["amount"]
+    storage.close()
+
+
+def book(main, *amounts, name=None):
+    """Bucht Einzahlungen (positiv) und Auszahlungen (negativ) auf ein Konto."""
+    ledger = main.Ledger(name or main.DEFAULT_ACCOUNT)
+    for amount in amounts:
+        ledger.post("deposit" if amount > 0 else "withdraw", f"{abs(amount)}.00")
+    ledger.close()
+
+
+def test_verify_detects_a_changed_record(main):
+    book(main, 10, 20, -5, 7)
+    storage = main.open_history()
+    result = main.verify_history(storage, processes=1)
+    assert result["errors"] == [] and result["count"] == 4 and result["balance"] == 3200
+    with open(storage.history_file, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    lines[1] = lines[1].replace('"amount":"20.00"', '"amount":"200.00"')
+    with open(storage.history_file, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    assert main.verify_history(storage, processes=1)["errors"]
+    storage.close()
+
+
+def test_verify_checks_only_new_records_after_a_clean_run(main, monkeypatch, capsys):
+    book(main, 10, 20, 30)
+    monkeypatch.setattr(main.sys, "argv", ["main.py", "--verify"])
+    main.run_verify()
+    assert "Verified 3 of 3" in capsys.readouterr().out
+    assert os.path.exists(os.path.join(main.BASE_DIR, main.VERIFY_FILE))
+    book(main, 1, -2)
+    main.run_verify()
+    output = capsys.readouterr().out
+    assert "Verified 2 of 5" in output and output.rstrip().endswith("OK")
+
+
+def test_torn_last_record_is_removed_on_open(main):
+    book(main, 10, 20)
+    storage = main.open_history()
+    with open(storage.history_file, "ab") as f:
+        f.write(b'{"type":"deposit","amount":"5')
+    storage.open()
+    with open(storage.history_file, "rb") as f:
+        assert f.read().endswith(b"\n")
+    assert storage.count() == 2
+    assert storage.load_balance() == 3000
+    storage.close()
+    book(main, 1)
+    storage = main.open_history()
+    result = main.verify_history(storage, processes=1)
+    assert result["errors"] == [] and result["balance"] == 3100
+    storage.close()
+
+
+def test_xml_history_of_older_versions_is_migrated(main):
+    for name, rows in (("deposit_history.xml", [("10.00", "10.00", "01"), ("5.00", "12.00", "03")]),
+                       ("withdraw_history.xml", [("3.00", "7.00", "02")])):
+        with open(os.path.join(main.BASE_DIR, name), "w", encoding="utf-8") as f:
+            f.write("<History>\n")
+            for amount, balance, day in rows:
+                f.write(f'  <Transaction amount="{amount}" new_balance="{balance}" timestamp="2024-01-{day}T10:00:00" />\n')
+            f.write("</History>\n")
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT)
+    assert ledger.current_balance() == 1200
+    assert [(r["type"], r["amount"]) for r in ledger.storage.iter_transactions()] == [
+        ("deposit", "10.00"), ("withdraw", "3.00"), ("deposit", "5.00")
+    ]
+    ledger.close()
+    assert main.verify_history(main.open_history(), processes=1)["errors"] == []
+
+
+def test_import_skips_invalid_rows(main, tmp_path):
+    path = tmp_path / "import.csv"
+    path.write_text(
+        "type,amount,timestamp\n"
+        "deposit,10.00,2024-01-01T10:00:00\n"
+        "bonus,1.00,\n"
+        "deposit,-1,\n"
+        "withdraw,50.00,\n"
+        "deposit,abc,\n"
+        "deposit,1.00,not a date\n"
+        "withdraw,2.50,2024-01-02T10:00:00\n",
+        encoding="utf-8"
+    )
+    ledger = main.Ledger(main.DEFAULT_ACCOUNT, hold_lock=True)
+    errors = []
+    imported, rejected, balance = main.import_transactions(ledger, str(path), on_error=lambda *e: errors.append(e))
+    ledger.close()
+    assert (imported, rejected, balance) == (2, 5, 750)
+    assert [line for line, _ in errors] == [3, 4, 5, 6, 7]
+
+
+def test_pipe_protocol_commands(main):
+    session = main.LedgerSession(main.Ledger(main.DEFAULT_ACCOUNT), main.Ledger)
+    assert session.execute("deposit 12,50") == ["ok 12.50"]
+    assert session.execute("withdraw 100")[0].startswith("error not enough money")
+    assert session.execute("withdraw 2.50") == ["ok 10.00"]
+    assert session.execute("balance")[-1].startswith("ok 10.00")
+    history = session.execute("history --last 1 --type withdraw")
+    assert history[-1] == "ok 1" and '"amount":"2.50"' in history[0]
+    assert session.execute("bogus")[0].startswith("error unknown command")
+    assert session.execute("account kid") == ["ok kid 0.00"]
+    assert session.execute("accounts")[-1] == "ok 2"
+    session.close()
+
+
+def test_settings_store_debounces_writes_and_sees_external_changes(main, tmp_path):
+    path = tmp_path / "store.json"
+    store = main.SettingsStore(str(path), flush_delay=60)
+    store.set("theme", "dark")
+    store.set("language", "en")
+    assert not path.exists()
+    store.flush()
+    assert main.json.loads(path.read_text()) == dict(main.DEFAULT_SETTINGS, theme="dark", language="en")
+    path.write_text(main.json.dumps({"theme": "light", "currency": "$", "padding": "x" * 10}))
+    assert store.get("currency") == "$" and store.get("theme") == "light"
+
+
+def test_metrics_dump_adds_up_across_dumps(main, tmp_path):
+    path = str(tmp_path / "metrics.json")
+    for _ in range(2):
+        metrics = main.Metrics(path)
+        metrics.enabled = True
+        with metrics.timer("load_balance"):
+            pass
+        metrics.add_bytes("load_balance", read=100)
+        metrics.dump()
+    totals = main.read_metrics(path)
+    assert totals["load_balance"]["count"] == 2
+    assert totals["load_balance"]["bytes_read"] == 200
+    assert sum(totals["load_balance"]["buckets"]) == 2
+    assert 'spardose_io_duration_seconds_count{path="load_balance"} 2' in main.format_prometheus(totals)